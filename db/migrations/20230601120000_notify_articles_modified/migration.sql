@@ -0,0 +1,21 @@
+-- Notify listeners when articles are modified, so the similarity checker does not
+-- have to poll. Notifications with the same payload within a transaction are
+-- delivered once.
+CREATE OR REPLACE FUNCTION "notify_articles_modified"() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('articles_modified', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- CreateTrigger
+CREATE TRIGGER "NewsArticles_notify_articles_modified"
+AFTER INSERT OR UPDATE OR DELETE ON "NewsArticles"
+FOR EACH STATEMENT EXECUTE FUNCTION "notify_articles_modified"();
+
+-- CreateTrigger
+CREATE TRIGGER "Flags_notify_articles_modified"
+AFTER INSERT OR UPDATE ON "Flags"
+FOR EACH ROW
+WHEN (NEW."value" AND NEW."name" IN ('articles_modified', 'similarity_full_rebuild'))
+EXECUTE FUNCTION "notify_articles_modified"();
@@ -0,0 +1,18 @@
+-- AlterTable
+ALTER TABLE "NewsArticles" ADD COLUMN     "cluster_id" INTEGER,
+ADD COLUMN     "latest_in_cluster" BOOLEAN NOT NULL DEFAULT true;
+
+-- CreateIndex
+CREATE INDEX "NewsArticles_cluster_id_idx" ON "NewsArticles"("cluster_id");
+
+-- CreateIndex
+CREATE INDEX "NewsArticles_latest_in_cluster_publication_date_idx" ON "NewsArticles"("latest_in_cluster", "publication_date");
+
+-- The similarity checker writes the clusters after every run, which must not
+-- notify itself again. Only changes to the scraped columns notify it.
+DROP TRIGGER "NewsArticles_notify_articles_modified" ON "NewsArticles";
+
+-- CreateTrigger
+CREATE TRIGGER "NewsArticles_notify_articles_modified"
+AFTER INSERT OR DELETE OR UPDATE OF "source_id", "url", "title", "description", "photo", "publication_date", "language" ON "NewsArticles"
+FOR EACH STATEMENT EXECUTE FUNCTION "notify_articles_modified"();
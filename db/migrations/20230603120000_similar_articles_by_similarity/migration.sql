@@ -0,0 +1,2 @@
+-- CreateIndex
+CREATE INDEX "SimilarArticles_id1_similarity_idx" ON "SimilarArticles"("id1", "similarity" DESC);
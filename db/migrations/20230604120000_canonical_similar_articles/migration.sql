@@ -0,0 +1,13 @@
+-- Every pair was stored in both directions. Only the row with the lowest id first
+-- is kept, pairs that were only stored the other way around are turned around.
+INSERT INTO "SimilarArticles" ("id1", "id2", "similarity")
+SELECT "id2", "id1", "similarity" FROM "SimilarArticles" WHERE "id1" > "id2"
+ON CONFLICT ("id1", "id2") DO NOTHING;
+
+DELETE FROM "SimilarArticles" WHERE "id1" >= "id2";
+
+-- AddCheckConstraint
+ALTER TABLE "SimilarArticles" ADD CONSTRAINT "SimilarArticles_id1_id2_check" CHECK ("id1" < "id2");
+
+-- CreateIndex
+CREATE INDEX "SimilarArticles_id2_similarity_idx" ON "SimilarArticles"("id2", "similarity" DESC);
@@ -26,43 +26,6 @@ article_bp = Blueprint("article", __name__, url_prefix="/article")
 CORS(article_bp, supports_credentials=True)
 
 
-def remove_updated(articles: List[NewsArticles]) -> List[NewsArticles]:
-    result: List[NewsArticles] = []
-
-    for article in articles:
-        # Remove old versions that have been updated
-        if article.similar_articles is not None:
-            # article id -> datatime timestamp
-            similar_article_sources: Dict[int, float] = {}
-
-            for sim in article.similar_articles:
-                assert (
-                    sim.similar is not None
-                ), "similar for similar articles cannot be none"
-                assert (
-                    sim.similar.source is not None
-                ), "similar.similar_source for similar article cannot be none"
-
-                if sim.similar.publication_date is None:
-                    continue
-
-                similar_article_sources[sim.similar.source.id] = max(
-                    similar_article_sources.get(sim.similar.source_id, 0),
-                    sim.similar.publication_date.timestamp(),
-                )
-
-            if (
-                article.publication_date is not None
-                and similar_article_sources.get(article.source_id, 0)
-                > article.publication_date.timestamp()
-            ):
-                continue
-
-        result.append(article)
-
-    return result
-
-
 @dataclass
 class NewsArticlesFindParams:
     take: int
@@ -82,7 +45,6 @@ class NewsArticlesFindParams:
         self.include = {**self.include, **include}
 
 
-
 @article_bp.get("/")
 async def get_articles() -> Response:
     """
@@ -146,18 +108,13 @@ async def get_articles() -> Response:
 
     db = await get_db()
 
+    # Older versions of an article are marked by the similarity checker, as articles of
+    # the same source in a story cluster that are not the latest
     article_find_params = NewsArticlesFindParams(
         take=amount,
         skip=offset,
-        include=NewsArticlesInclude(
-            {
-                "source": True,
-                "similar_articles": {
-                    "include": {"similar": {"include": {"source": True}}}
-                },
-            }
-        ),
-        where=None,
+        include=NewsArticlesInclude({"source": True}),
+        where={"latest_in_cluster": True},
         order=[],
     )
 
@@ -203,9 +160,6 @@ async def get_articles() -> Response:
             ErrorKind.ServerError,
         )
 
-    # Remove older version of article that has newer entry in list.
-    articles = remove_updated(articles)
-
     response: Dict[str, List[Dict[str, str | Dict[str, str | float | None]]]] = {
         "articles": []
     }
@@ -266,6 +220,15 @@ async def get_articles() -> Response:
 async def get_similar_articles() -> Response:
     article_link = str(request.args.get("url"))
 
+    try:
+        amount = int(request.args.get("amount") or 10)
+    except ValueError as e:
+        return make_response_from_error(
+            HTTPStatus.BAD_REQUEST,
+            ErrorKind.IncorrectParameters,
+            str(e),
+        )
+
     db = await get_db()
 
     try:
@@ -279,10 +242,17 @@ async def get_similar_articles() -> Response:
 
         assert current_article.id is not None, "article should always have an id"
 
+        # Every pair is stored once, with the lowest article id as `id1`
         similar_articles = await db.similararticles.find_many(
             where={
-                "id1": current_article.id,
-            }
+                "OR": [
+                    {"id1": current_article.id},
+                    {"id2": current_article.id},
+                ],
+            },
+            # Ties are ordered by id, so the same neighbours are returned every time
+            order=[{"similarity": "desc"}, {"id1": "asc"}, {"id2": "asc"}],
+            take=amount,
         )
     except Exception as e:
         print(e.with_traceback(None), file=sys.stderr)
@@ -303,7 +273,7 @@ async def get_similar_articles() -> Response:
 
         similar_article = await db.newsarticles.find_unique(
             where={
-                "id": pair.id2,
+                "id": pair.id2 if pair.id1 == current_article.id else pair.id1,
             },
             include={"source": True},
         )
@@ -31,11 +31,19 @@ async def test_get_articles_with_updated_version(client: Flask.testing):
         }
     )
 
+    # Pairs are stored once, with the lowest id first
     await db.similararticles.create(
         data={"id1": article1.id, "id2": article2.id, "similarity": 0.9}
     )
-    await db.similararticles.create(
-        data={"id1": article2.id, "id2": article1.id, "similarity": 0.9}
+
+    # Story cluster as written by the similarity checker
+    await db.newsarticles.update(
+        where={"id": article1.id},
+        data={"cluster_id": article1.id, "latest_in_cluster": False},
+    )
+    await db.newsarticles.update(
+        where={"id": article2.id},
+        data={"cluster_id": article1.id, "latest_in_cluster": True},
     )
 
     await db.disconnect()
@@ -165,6 +173,7 @@ async def test_get_similar_articles(client: Flask.testing):
         }
     )
 
+    # Pairs are stored once, with the lowest id first
     await db.similararticles.create(
         data={
             "id1": article1.id,
@@ -173,14 +182,6 @@ async def test_get_similar_articles(client: Flask.testing):
         }
     )
 
-    await db.similararticles.create(
-        data={
-            "id1": article2.id,
-            "id2": article1.id,
-            "similarity": 0.9,
-        }
-    )
-
     await db.disconnect()
 
     def sync_part():
@@ -202,5 +203,18 @@ async def test_get_similar_articles(client: Flask.testing):
         assert len(articles) == 1
         assert articles[0]["link"] == "https://example.com/article1"
 
+        response = client.get(
+            "/article/similar/?",
+            query_string={"url": "https://example.com/article1", "amount": 0},
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert len(response.get_json()["data"]["articles"]) == 0
+
+        response = client.get(
+            "/article/similar/?",
+            query_string={"url": "https://example.com/article1", "amount": "many"},
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
     loop = asyncio.get_running_loop()
     await loop.run_in_executor(None, sync_part)
@@ -0,0 +1,194 @@
+#! /usr/bin/env python3
+
+"""
+Generates synthetic article corpora as JSONL fixtures and loads them as stand-ins for
+the `NewsArticles` rows of the database.
+
+Every generated story is a sentence of one of the example articles, published by a
+few sources with some words dropped or replaced, so the corpus contains similar
+articles in English and Dutch. The language of an example article is detected from
+its stopwords.
+
+Usage: python3 benchmarks/corpus.py [--sizes 1000 10000 100000] [--dutch 0.3]
+"""
+
+import os
+import sys
+import re
+import json
+import random
+import argparse
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../similarity_checker")
+)
+
+from prisma.enums import Language
+
+from utils import stop_words
+
+ARTICLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../articles")
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+SOURCES = 20
+# Publication dates are spread over this many days, a few articles have none
+PUBLICATION_DAYS = 30
+UNDATED_RATIO = 0.05
+
+
+@dataclass
+class Source:
+    id: int
+    name: str
+
+
+@dataclass
+class Article:
+    """
+    Has the fields of `NewsArticles` that are used by the similarity checker.
+    """
+
+    id: int
+    title: str
+    description: Optional[str]
+    language: Language
+    source_id: int
+    source: Source
+    publication_date: Optional[datetime]
+    cluster_id: Optional[int] = None
+    latest_in_cluster: bool = True
+
+
+def detect_language(text: str) -> Language:
+    words = text.lower().split()
+    return max(
+        Language,
+        key=lambda language: sum(word in stop_words[language] for word in words),
+    )
+
+
+def load_sentences() -> Dict[Language, List[str]]:
+    sentences: Dict[Language, List[str]] = {language: [] for language in Language}
+
+    for file_name in sorted(os.listdir(ARTICLES_DIR)):
+        with open(os.path.join(ARTICLES_DIR, file_name), "r") as article:
+            text = article.read()
+
+        sentences[detect_language(text)].extend(
+            sentence.strip()
+            for sentence in re.split(r"[.\n]", text)
+            if len(sentence.split()) > 3
+        )
+
+    return sentences
+
+
+def generate_corpus(
+    size: int, dutch_ratio: float, seed: int
+) -> List[Dict[str, object]]:
+    """
+    Returns `size` article rows. Articles are generated in stories of one to five
+    articles, published within half a day, that are variations of the same sentence.
+    """
+
+    generator = random.Random(seed)
+    sentences = load_sentences()
+    start_date = datetime(2023, 5, 1, tzinfo=timezone.utc)
+
+    rows: List[Dict[str, object]] = []
+    while len(rows) < size:
+        language = (
+            Language.Dutch if generator.random() < dutch_ratio else Language.English
+        )
+        story = generator.choice(sentences[language]).split()
+        story_date = start_date + timedelta(
+            hours=generator.uniform(0, PUBLICATION_DAYS * 24)
+        )
+
+        for _ in range(min(generator.randint(1, 5), size - len(rows))):
+            words = list(story)
+            for _ in range(generator.randint(0, 2)):
+                words.pop(generator.randrange(len(words)))
+            for _ in range(generator.randint(0, 3)):
+                words[generator.randrange(len(words))] = generator.choice(
+                    generator.choice(sentences[language]).split()
+                )
+
+            publication_date = story_date + timedelta(hours=generator.uniform(0, 12))
+            rows.append(
+                {
+                    "id": len(rows) + 1,
+                    "title": " ".join(words[: generator.randint(5, 12)]),
+                    "description": (
+                        " ".join(words) if generator.random() > 0.2 else None
+                    ),
+                    "language": language.value,
+                    "source_id": generator.randint(1, SOURCES),
+                    "publication_date": (
+                        None
+                        if generator.random() < UNDATED_RATIO
+                        else publication_date.isoformat()
+                    ),
+                }
+            )
+
+    return rows
+
+
+def fixture_path(size: int) -> str:
+    return os.path.join(FIXTURES_DIR, f"corpus-{size}.jsonl")
+
+
+def save_corpus(rows: List[Dict[str, object]], path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, "w") as fixture:
+        fixture.writelines(json.dumps(row) + "\n" for row in rows)
+
+
+def load_rows(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r") as fixture:
+        return [json.loads(line) for line in fixture]
+
+
+def load_corpus(path: str) -> List[Article]:
+    articles: List[Article] = []
+
+    for row in load_rows(path):
+        articles.append(
+            Article(
+                row["id"],
+                row["title"],
+                row["description"],
+                Language(row["language"]),
+                row["source_id"],
+                Source(row["source_id"], f"source {row['source_id']}"),
+                (
+                    None
+                    if row["publication_date"] is None
+                    else datetime.fromisoformat(row["publication_date"])
+                ),
+            )
+        )
+
+    return articles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dutch", type=float, default=0.3, help="ratio of Dutch")
+    parser.add_argument("--seed", type=int, default=0)
+    arguments = parser.parse_args()
+
+    for size in arguments.sizes:
+        path = fixture_path(size)
+        save_corpus(generate_corpus(size, arguments.dutch, arguments.seed), path)
+        print(f"Wrote `{size}` articles to `{os.path.relpath(path)}`.")
+
+
+if __name__ == "__main__":
+    main()
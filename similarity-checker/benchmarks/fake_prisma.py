@@ -0,0 +1,63 @@
+"""
+Stand-in for the Prisma client, so the similarity checker can be benchmarked without
+a database. Statements are not executed, only the rows they would write are counted.
+Article pages are served from the given rows, ordered by id. Every transaction can
+wait a fixed latency, like a round trip to the database.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import asyncio
+
+
+class FakeBatch:
+    def __init__(self, client: "FakePrisma"):
+        self.client = client
+
+    async def __aenter__(self) -> "FakeBatch":
+        return self
+
+    async def __aexit__(self, *_: Any):
+        self.client.transactions += 1
+        await asyncio.sleep(self.client.latency)
+
+    def execute_raw(self, query: str, *arguments: Any):
+        self.client.record(query, list(arguments))
+
+
+class FakePrisma:
+    def __init__(
+        self, articles: Optional[List[Dict[str, Any]]] = None, latency: float = 0.0
+    ):
+        self.latency = latency
+        self.articles = [
+            {"cluster_id": None, "latest_in_cluster": True, **row}
+            for row in sorted(articles or [], key=lambda row: row["id"])
+        ]
+        self.statements = 0
+        self.transactions = 0
+        # Parameters of every statement, e.g. three per upserted row
+        self.parameters = 0
+
+    def record(self, query: str, arguments: List[Any]):
+        self.statements += 1
+        self.parameters += len(arguments)
+
+    def batch_(self) -> FakeBatch:
+        return FakeBatch(self)
+
+    async def execute_raw(self, query: str, *arguments: Any) -> int:
+        self.record(query, list(arguments))
+        self.transactions += 1
+        await asyncio.sleep(self.latency)
+        return 0
+
+    async def query_raw(self, query: str, *arguments: Any) -> List[Any]:
+        self.record(query, list(arguments))
+
+        if '"NewsArticles"' not in query:
+            return []
+
+        # Page of the streaming loader: articles after the id, up to the limit
+        [last_id, limit] = arguments
+        return [row for row in self.articles if row["id"] > last_id][:limit]
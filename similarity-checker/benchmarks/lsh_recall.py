@@ -0,0 +1,154 @@
+#! /usr/bin/env python3
+
+"""
+Measures the recall of the locality-sensitive hashing candidate mode against the
+exhaustive mode on a fixed corpus, and lists the similar pairs that were missed.
+
+The corpus is built from sentences of the example articles. Every article is a
+sentence with a few words dropped or swapped, so that near-duplicates exist.
+
+Usage: python3 benchmarks/lsh_recall.py [--bands 32] [--rows 4] [--size 2000]
+"""
+
+import os
+import sys
+import re
+import random
+import time
+import argparse
+from typing import List, Set, Tuple
+
+import numpy as np
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../similarity_checker")
+)
+
+from prisma.enums import Language
+
+from main import THRESHOLD, calc_tf_idf
+from tokenizer import tokenize
+from blocks import iter_block_similar_pairs
+from lsh import iter_lsh_similar_pairs
+
+ARTICLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../articles")
+
+
+def load_sentences() -> List[str]:
+    sentences: List[str] = []
+
+    for file_name in sorted(os.listdir(ARTICLES_DIR)):
+        with open(os.path.join(ARTICLES_DIR, file_name), "r") as article:
+            sentences.extend(
+                sentence.strip()
+                for sentence in re.split(r"[.\n]", article.read())
+                if len(sentence.split()) > 3
+            )
+
+    return sentences
+
+
+def build_corpus(size: int, seed: int) -> Tuple[List[str], List[str]]:
+    """
+    Returns the titles and descriptions of the corpus.
+    """
+
+    generator = random.Random(seed)
+    sentences = load_sentences()
+
+    titles: List[str] = []
+    descriptions: List[str] = []
+    for _ in range(size):
+        words = generator.choice(sentences).split()
+
+        for _ in range(generator.randint(0, 2)):
+            words.pop(generator.randrange(len(words)))
+        for _ in range(generator.randint(0, 2)):
+            words[generator.randrange(len(words))] = generator.choice(
+                generator.choice(sentences).split()
+            )
+
+        titles.append(" ".join(words[: generator.randint(5, 12)]))
+        descriptions.append(" ".join(words) if generator.random() > 0.2 else "")
+
+    return titles, descriptions
+
+
+def collect_pairs(batches) -> Set[Tuple[int, int]]:  # type: ignore
+    pairs: Set[Tuple[int, int]] = set()
+    for [lhs, rhs, _, _] in batches:  # type: ignore
+        pairs.update(zip(lhs.tolist(), rhs.tolist()))  # type: ignore
+
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--bands", type=int, default=32)
+    parser.add_argument("--rows", type=int, default=4)
+    parser.add_argument("--shingle-size", type=int, default=1)
+    parser.add_argument("--size", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--show", type=int, default=10, help="missed pairs to list")
+    arguments = parser.parse_args()
+
+    [raw_titles, raw_descriptions] = build_corpus(arguments.size, arguments.seed)
+    titles = [tokenize(title, Language.English) for title in raw_titles]
+    descriptions = [tokenize(text, Language.English) for text in raw_descriptions]
+
+    title_table = calc_tf_idf(titles)
+    description_table = calc_tf_idf(descriptions)
+    scored = np.ones(len(titles), dtype=bool)
+    has_description = np.array([len(text) > 0 for text in descriptions], dtype=bool)
+
+    start = time.perf_counter()
+    exhaustive = collect_pairs(
+        iter_block_similar_pairs(
+            title_table,
+            description_table,
+            scored,
+            has_description,
+            THRESHOLD,
+            256 * 1024 * 1024,
+        )
+    )
+    exhaustive_duration = time.perf_counter() - start
+
+    start = time.perf_counter()
+    candidates = collect_pairs(
+        iter_lsh_similar_pairs(
+            titles,
+            descriptions,
+            title_table,
+            description_table,
+            scored,
+            has_description,
+            THRESHOLD,
+            arguments.bands,
+            arguments.rows,
+            arguments.shingle_size,
+            arguments.seed,
+        )
+    )
+    lsh_duration = time.perf_counter() - start
+
+    missed = sorted(exhaustive - candidates)
+    recall = 1 - len(missed) / len(exhaustive) if len(exhaustive) > 0 else 1.0
+
+    print()
+    print(f"articles:         {len(titles)}")
+    print(f"bands x rows:     {arguments.bands} x {arguments.rows}")
+    print(f"exhaustive pairs: {len(exhaustive)} ({exhaustive_duration:.3f}s)")
+    print(f"lsh pairs:        {len(candidates)} ({lsh_duration:.3f}s)")
+    print(f"missed pairs:     {len(missed)}")
+    print(f"recall:           {recall:.4f}")
+
+    for [lhs, rhs] in missed[: arguments.show]:
+        similarity = title_table.multiply_row_pairs(
+            title_table, np.array([lhs]), np.array([rhs])
+        )[0]
+        print(f"\n`{raw_titles[lhs]}`\n== `{raw_titles[rhs]}`\ntitle: {similarity:.3f}")
+
+
+if __name__ == "__main__":
+    main()
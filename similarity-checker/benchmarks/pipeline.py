@@ -0,0 +1,392 @@
+#! /usr/bin/env python3
+
+"""
+Times every stage of the similarity checker on the JSONL corpus fixtures, without a
+database. Missing fixtures are generated with `corpus.py`.
+
+Every stage runs in a fresh process, so its peak RSS is not influenced by other
+stages. The inputs of a stage are prepared before it is timed. Memory used by the
+tokenizer worker processes is not included.
+
+Stages:
+
+- `tokenize`: tokenize the titles and descriptions
+- `tf_idf`: build the vocabularies and tf-idf tables of the tokenized articles
+- `store`: sync an in-memory term store and build the tf-idf tables from it
+- `exhaustive`: compare every pair of articles in memory-budgeted blocks
+- `window`: compare articles within the publication-date window
+- `lsh`: compare the MinHash candidate pairs
+- `inverted`: compare the pairs whose titles share a term
+- `write`: write the similar pairs of the exhaustive mode with a fake client
+- `load`: stream the articles page by page from a fake client into a term store
+- `total`: `calc_article_similarity` from start to end with a fake client
+
+Usage: python3 benchmarks/pipeline.py [--sizes 1000 10000] [--stages tokenize ...]
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import asyncio
+import argparse
+import resource
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../similarity_checker")
+)
+
+from corpus import (
+    Article,
+    fixture_path,
+    generate_corpus,
+    load_corpus,
+    load_rows,
+    save_corpus,
+)
+from fake_prisma import FakePrisma
+
+STAGES = [
+    "tokenize",
+    "tf_idf",
+    "store",
+    "exhaustive",
+    "window",
+    "lsh",
+    "inverted",
+    "write",
+    "load",
+    "total",
+]
+
+# Result of a stage: amount of similar pairs it found or rows it wrote, if any
+Stage = Callable[[], Optional[int]]
+
+
+def current_rss() -> int:
+    with open("/proc/self/statm", "r") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def count_pairs(batches: Iterator[Tuple[np.ndarray, ...]]) -> int:  # type: ignore
+    return sum(len(batch[0]) for batch in batches)  # type: ignore
+
+
+def prepare_stage(
+    name: str, path: str, articles: List[Article], options: Dict[str, float]
+) -> Stage:
+    """
+    Prepares the inputs of the stage and returns the function that runs it.
+    """
+
+    from prisma.enums import Language
+
+    from config import (
+        SIMILARITY_LSH_BANDS,
+        SIMILARITY_LSH_ROWS,
+        SIMILARITY_LSH_SEED,
+        SIMILARITY_PAGE_SIZE,
+        SIMILARITY_LSH_SHINGLE_SIZE,
+        SIMILARITY_TOKENIZER_CHUNK_SIZE,
+        SIMILARITY_TOKENIZER_WORKERS,
+        SIMILARITY_WRITE_BATCH_SIZE,
+        SIMILARITY_WRITE_FLUSH_INTERVAL,
+    )
+    from main import THRESHOLD, calc_article_similarity, calc_store_tf_idf, calc_tf_idf
+    from tokenizer import Tokenizer, tokenize_corpus
+    from store import Corpus
+    from blocks import iter_block_similar_pairs
+    from lsh import iter_lsh_similar_pairs
+    from inverted import iter_inverted_similar_pairs
+    from window import calc_publication_times, iter_window_similar_pairs
+    from writer import SimilarArticlesWriter
+    from loader import iter_article_pages
+
+    memory_budget = int(options["memory_budget_mb"] * 1024 * 1024)
+    titles = [article.title for article in articles]
+    descriptions = [article.description or "" for article in articles]
+    languages: List[Language] = [article.language for article in articles]
+
+    def tokenize(texts: List[str]) -> List[List[str]]:
+        return tokenize_corpus(
+            texts,
+            languages,
+            SIMILARITY_TOKENIZER_WORKERS,
+            SIMILARITY_TOKENIZER_CHUNK_SIZE,
+        )
+
+    if name == "tokenize":
+
+        def tokenize_all():
+            tokenize(titles)
+            tokenize(descriptions)
+
+        return tokenize_all
+
+    if name in ["load", "total"]:
+        # Only the JSON rows are kept, like the rows returned by the database
+        client = FakePrisma(load_rows(path), options["write_latency_ms"] / 1000)
+        articles.clear()
+
+    if name == "load":
+
+        async def load_all():
+            corpus = Corpus()
+            with Tokenizer(
+                SIMILARITY_TOKENIZER_WORKERS, SIMILARITY_TOKENIZER_CHUNK_SIZE
+            ) as tokenizer:
+                async for page in iter_article_pages(
+                    client, SIMILARITY_PAGE_SIZE  # type: ignore
+                ):
+                    page_languages = [article.language for article in page]
+                    for [store, texts] in [
+                        (corpus.titles, [article.title for article in page]),
+                        (
+                            corpus.descriptions,
+                            [article.description or "" for article in page],
+                        ),
+                    ]:
+                        store.add(
+                            [article.id for article in page],
+                            texts,
+                            page_languages,
+                            tokenizer,
+                        )
+
+        return lambda: asyncio.run(load_all())
+
+    if name == "total":
+
+        def calc_all() -> int:
+            similar = asyncio.run(
+                calc_article_similarity(
+                    iter_article_pages(client, SIMILARITY_PAGE_SIZE),  # type: ignore
+                    client,  # type: ignore
+                )
+            )
+            return sum(len(indices) for indices in similar.values()) // 2
+
+        return calc_all
+
+    tokenized_titles, tokenized_descriptions = tokenize(titles), tokenize(descriptions)
+
+    if name == "tf_idf":
+
+        def calc_tables():
+            calc_tf_idf(tokenized_titles)
+            calc_tf_idf(tokenized_descriptions)
+
+        return calc_tables
+
+    if name == "store":
+
+        def sync_store():
+            corpus = Corpus()
+            ids = [article.id for article in articles]
+            with Tokenizer(
+                SIMILARITY_TOKENIZER_WORKERS, SIMILARITY_TOKENIZER_CHUNK_SIZE
+            ) as tokenizer:
+                for [store, texts] in [
+                    (corpus.titles, titles),
+                    (corpus.descriptions, descriptions),
+                ]:
+                    store.sync(ids, texts, languages, tokenizer)
+                    calc_store_tf_idf(store, store.positions(ids))
+
+        return sync_store
+
+    title_table = calc_tf_idf(tokenized_titles)
+    description_table = calc_tf_idf(tokenized_descriptions)
+    scored = np.ones(len(articles), dtype=bool)
+    has_description = description_table.row_lengths() > 0
+
+    if name == "exhaustive":
+        return lambda: count_pairs(
+            iter_block_similar_pairs(
+                title_table,
+                description_table,
+                scored,
+                has_description,
+                THRESHOLD,
+                memory_budget,
+            )
+        )
+
+    if name == "window":
+        publication_times = calc_publication_times(
+            [article.publication_date for article in articles]
+        )
+        return lambda: count_pairs(
+            iter_window_similar_pairs(
+                title_table,
+                description_table,
+                scored,
+                has_description,
+                publication_times,
+                options["window_hours"] * 60 * 60,
+                "compare",
+                THRESHOLD,
+                memory_budget,
+            )
+        )
+
+    if name == "inverted":
+        return lambda: count_pairs(
+            iter_inverted_similar_pairs(
+                title_table,
+                description_table,
+                scored,
+                has_description,
+                THRESHOLD,
+                memory_budget,
+            )
+        )
+
+    if name == "lsh":
+        return lambda: count_pairs(
+            iter_lsh_similar_pairs(
+                tokenized_titles,
+                tokenized_descriptions,
+                title_table,
+                description_table,
+                scored,
+                has_description,
+                THRESHOLD,
+                SIMILARITY_LSH_BANDS,
+                SIMILARITY_LSH_ROWS,
+                SIMILARITY_LSH_SHINGLE_SIZE,
+                SIMILARITY_LSH_SEED,
+            )
+        )
+
+    if name == "write":
+        article_ids = np.array([article.id for article in articles], dtype=np.int64)
+        pairs = [
+            (id1, id2, similarity)
+            for [lhs_indices, rhs_indices, similarities, _] in iter_block_similar_pairs(
+                title_table,
+                description_table,
+                scored,
+                has_description,
+                THRESHOLD,
+                memory_budget,
+            )
+            for [id1, id2, similarity] in zip(
+                article_ids[lhs_indices].tolist(),
+                article_ids[rhs_indices].tolist(),
+                similarities.tolist(),
+            )
+        ]
+
+        async def write() -> int:
+            writer = SimilarArticlesWriter(
+                FakePrisma(),  # type: ignore
+                SIMILARITY_WRITE_BATCH_SIZE,
+                SIMILARITY_WRITE_FLUSH_INTERVAL,
+            )
+            for [id1, id2, similarity] in pairs:
+                await writer.add(id1, id2, similarity)
+            await writer.close()
+
+            return writer.rows_written
+
+        return lambda: asyncio.run(write())
+
+    raise ValueError(f"unknown stage `{name}`")
+
+
+def run_stage(name: str, path: str, options: Dict[str, float]) -> Dict[str, object]:
+    """
+    Runs a single stage in the current process and returns its measurements. Output of
+    the similarity checker itself is discarded.
+    """
+
+    os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+    articles = load_corpus(path)
+    size = len(articles)
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(
+        io.StringIO()
+    ):
+        stage = prepare_stage(name, path, articles, options)
+
+        rss_before = current_rss()
+        start = time.perf_counter()
+        pairs = stage()
+        duration = time.perf_counter() - start
+
+    # Kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    return {
+        "stage": name,
+        "articles": size,
+        "seconds": duration,
+        "peak_rss_mb": peak_rss / 1024 / 1024,
+        "rss_increase_mb": max(peak_rss - rss_before, 0) / 1024 / 1024,
+        "pairs": pairs,
+        "pairs_per_second": None if pairs is None else pairs / max(duration, 1e-9),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--memory-budget-mb", type=float, default=256)
+    parser.add_argument("--window-hours", type=float, default=48)
+    parser.add_argument("--dutch", type=float, default=0.3, help="ratio of Dutch")
+    parser.add_argument(
+        "--write-latency-ms",
+        type=float,
+        default=0,
+        help="round trip of every write transaction of the `total` stage",
+    )
+    parser.add_argument("--json", help="append the results as JSON lines to a file")
+    arguments = parser.parse_args()
+
+    options = {
+        "memory_budget_mb": arguments.memory_budget_mb,
+        "window_hours": arguments.window_hours,
+        "write_latency_ms": arguments.write_latency_ms,
+    }
+
+    print(
+        f"{'stage':<12} {'articles':>9} {'seconds':>9} {'peak rss (MB)':>14} "
+        + f"{'pairs':>10} {'pairs/s':>12}"
+    )
+    for size in arguments.sizes:
+        path = fixture_path(size)
+        if not os.path.exists(path):
+            save_corpus(generate_corpus(size, arguments.dutch, 0), path)
+
+        for name in arguments.stages:
+            # A fresh process per stage keeps the peak RSS of the stages apart
+            with ProcessPoolExecutor(
+                1, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                result = executor.submit(run_stage, name, path, options).result()
+
+            pairs = result["pairs"]
+            pairs_per_second = result["pairs_per_second"]
+            print(
+                f"{name:<12} {size:>9} {result['seconds']:>9.3f} "
+                + f"{result['peak_rss_mb']:>14.1f} "
+                + f"{'-' if pairs is None else pairs:>10} "
+                + f"{'-' if pairs_per_second is None else f'{pairs_per_second:.0f}':>12}"
+            )
+
+            if arguments.json is not None:
+                with open(arguments.json, "a") as output:
+                    output.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#! /usr/bin/env python3
+
+"""
+Measures how the exhaustive similarity product scales with the amount of worker
+processes of the parallel mode, on a JSONL corpus fixture. Missing fixtures are
+generated with `corpus.py`.
+
+The tf-idf tables are built once. Every worker count is then timed from sharing the
+tables to the last similar pair, including the start of the process pool. The
+speedup is relative to the first worker count. A single worker uses no pool at all.
+
+Usage: python3 benchmarks/scaling.py [--size 20000] [--workers 1 2 4 8]
+"""
+
+import os
+import sys
+import io
+import time
+import argparse
+import contextlib
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../similarity_checker")
+)
+
+from prisma.enums import Language
+
+from corpus import fixture_path, generate_corpus, load_corpus, save_corpus
+from main import THRESHOLD, calc_tf_idf
+from tokenizer import tokenize_corpus
+from parallel import iter_parallel_similar_pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--memory-budget-mb", type=float, default=256)
+    parser.add_argument("--dutch", type=float, default=0.3, help="ratio of Dutch")
+    arguments = parser.parse_args()
+
+    os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+    path = fixture_path(arguments.size)
+    if not os.path.exists(path):
+        save_corpus(generate_corpus(arguments.size, arguments.dutch, 0), path)
+
+    articles = load_corpus(path)
+    languages: List[Language] = [article.language for article in articles]
+    [title_table, description_table] = [
+        calc_tf_idf(tokenize_corpus(texts, languages, os.cpu_count() or 1, 5000))
+        for texts in [
+            [article.title for article in articles],
+            [article.description or "" for article in articles],
+        ]
+    ]
+    scored = np.ones(len(articles), dtype=bool)
+    has_description = description_table.row_lengths() > 0
+
+    print(
+        f"{'workers':>7} {'seconds':>9} {'pairs':>10} {'speedup':>8} {'efficiency':>11}"
+    )
+    baseline: Optional[Tuple[int, float]] = None
+    for workers in arguments.workers:
+        with contextlib.redirect_stderr(io.StringIO()):
+            start = time.perf_counter()
+            pairs = sum(
+                len(similar_pairs[0])
+                for similar_pairs in iter_parallel_similar_pairs(
+                    title_table,
+                    description_table,
+                    scored,
+                    has_description,
+                    THRESHOLD,
+                    int(arguments.memory_budget_mb * 1024 * 1024),
+                    workers,
+                )
+            )
+            duration = time.perf_counter() - start
+
+        if baseline is None:
+            baseline = (workers, duration)
+
+        # Speedup relative to the first worker count, efficiency per added worker
+        speedup = baseline[1] / duration
+        efficiency = speedup / (workers / baseline[0])
+        print(
+            f"{workers:>7} {duration:>9.3f} {pairs:>10} {speedup:>8.2f} "
+            + f"{efficiency:>11.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#! /usr/bin/env python3
+
+"""
+Compares building the term frequency table with the vocabulary index against the
+previous implementation that scanned the vocabulary with `np.where` for every term,
+and against hashing the terms into a fixed amount of columns.
+
+The documents are sentences taken from the example articles and sampled until the
+requested corpus size is reached.
+
+Usage: python3 benchmarks/term_frequency.py [sizes...]
+"""
+
+import os
+import sys
+import re
+import string
+import random
+import time
+from typing import List
+
+import numpy as np
+from numpy.typing import NDArray
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../similarity_checker")
+)
+
+from vocabulary import Vocabulary, build_term_frequency_table
+from hashing import build_hashed_term_frequency_table
+
+# Columns of the hashed table
+FEATURES = 1 << 20
+
+ARTICLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../articles")
+
+
+def load_sentences() -> List[List[str]]:
+    sentences: List[List[str]] = []
+
+    for file_name in sorted(os.listdir(ARTICLES_DIR)):
+        with open(os.path.join(ARTICLES_DIR, file_name), "r") as article:
+            for sentence in re.split(r"[.\n]", article.read()):
+                words = (
+                    sentence.translate(str.maketrans("", "", string.punctuation))
+                    .lower()
+                    .split()
+                )
+                if len(words) > 0:
+                    sentences.append(words)
+
+    return sentences
+
+
+def build_corpus(sentences: List[List[str]], size: int) -> List[List[str]]:
+    generator = random.Random(size)
+    return [generator.choice(sentences) for _ in range(size)]
+
+
+def legacy_term_frequency_table(documents: List[List[str]]) -> NDArray[np.float64]:
+    words: NDArray[np.str_] = np.unique(  # type: ignore
+        [word for document in documents for word in document]
+    )
+
+    tf_table = np.zeros([len(documents), len(words)])
+    for [i, document] in enumerate(documents):
+        unique_words, word_count = np.unique(document, return_counts=True)  # type: ignore
+        for [j, word] in enumerate(unique_words):
+            tf_table[i][np.where(words == word)[0][0]] = word_count[j]  # type: ignore
+        tf_table[i] /= np.sum(tf_table[i])  # type: ignore
+
+    return tf_table
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [1000, 10000, 50000]
+    sentences = load_sentences()
+
+    print(
+        f"{'documents':>10} {'vocabulary':>10} {'before (s)':>12} {'after (s)':>12} "
+        + f"{'hashed (s)':>12}"
+    )
+    for size in sizes:
+        documents = build_corpus(sentences, size)
+
+        start = time.perf_counter()
+        legacy_term_frequency_table(documents)
+        before = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vocabulary = Vocabulary()
+        build_term_frequency_table(documents, vocabulary)
+        after = time.perf_counter() - start
+
+        start = time.perf_counter()
+        build_hashed_term_frequency_table(documents, FEATURES)
+        hashed = time.perf_counter() - start
+
+        print(
+            f"{size:>10} {len(vocabulary):>10} {before:>12.3f} {after:>12.3f} "
+            + f"{hashed:>12.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
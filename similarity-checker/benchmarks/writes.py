@@ -0,0 +1,140 @@
+#! /usr/bin/env python3
+
+"""
+Compares the write throughput of the similar pairs of the exhaustive mode when every
+pair is stored as a single row (`id1 < id2`) and when it is stored in both
+directions, like before. Missing fixtures are generated with `corpus.py`.
+
+The pairs are written with a fake client, so only the work of the checker is timed:
+building the statements and their parameters. The rows and parameters sent per
+layout show the difference in work for the database.
+
+Usage: python3 benchmarks/writes.py [--sizes 1000 10000] [--repeat 3]
+"""
+
+import os
+import sys
+import io
+import time
+import asyncio
+import argparse
+import contextlib
+from typing import List, Tuple
+
+import numpy as np
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../similarity_checker")
+)
+
+from prisma.enums import Language
+
+from corpus import fixture_path, generate_corpus, load_corpus, save_corpus
+from fake_prisma import FakePrisma
+from config import SIMILARITY_WRITE_BATCH_SIZE, SIMILARITY_WRITE_FLUSH_INTERVAL
+from main import THRESHOLD, calc_tf_idf
+from tokenizer import tokenize_corpus
+from blocks import iter_block_similar_pairs
+from writer import SimilarArticlesWriter
+
+
+class BothDirectionsWriter(SimilarArticlesWriter):
+    """
+    Writer of the previous layout, which stored every pair in both directions.
+    """
+
+    def pending_rows(self) -> List[Tuple[int, int, float]]:
+        return [
+            row
+            for [id1, id2, similarity] in super().pending_rows()
+            for row in [(id1, id2, similarity), (id2, id1, similarity)]
+        ]
+
+
+def calc_pairs(size: int, dutch: float) -> List[Tuple[int, int, float]]:
+    path = fixture_path(size)
+    if not os.path.exists(path):
+        save_corpus(generate_corpus(size, dutch, 0), path)
+
+    articles = load_corpus(path)
+    languages: List[Language] = [article.language for article in articles]
+    [title_table, description_table] = [
+        calc_tf_idf(tokenize_corpus(texts, languages, os.cpu_count() or 1, 5000))
+        for texts in [
+            [article.title for article in articles],
+            [article.description or "" for article in articles],
+        ]
+    ]
+    article_ids = np.array([article.id for article in articles], dtype=np.int64)
+
+    return [
+        (id1, id2, similarity)
+        for [lhs_indices, rhs_indices, similarities, _] in iter_block_similar_pairs(
+            title_table,
+            description_table,
+            np.ones(len(articles), dtype=bool),
+            description_table.row_lengths() > 0,
+            THRESHOLD,
+            256 * 1024 * 1024,
+        )
+        for [id1, id2, similarity] in zip(
+            article_ids[lhs_indices].tolist(),
+            article_ids[rhs_indices].tolist(),
+            similarities.tolist(),
+        )
+    ]
+
+
+async def write_pairs(
+    writer_type: type, pairs: List[Tuple[int, int, float]]
+) -> Tuple[float, FakePrisma]:
+    client = FakePrisma()
+    writer: SimilarArticlesWriter = writer_type(
+        client, SIMILARITY_WRITE_BATCH_SIZE, SIMILARITY_WRITE_FLUSH_INTERVAL
+    )
+
+    start = time.perf_counter()
+    for [id1, id2, similarity] in pairs:
+        await writer.add(id1, id2, similarity)
+    await writer.close()
+
+    return time.perf_counter() - start, client
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3, help="best of the runs")
+    parser.add_argument("--dutch", type=float, default=0.3, help="ratio of Dutch")
+    arguments = parser.parse_args()
+
+    os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+    print(
+        f"{'layout':<15} {'articles':>9} {'pairs':>10} {'seconds':>9} "
+        + f"{'statements':>11} {'parameters':>11} {'pairs/s':>12}"
+    )
+    for size in arguments.sizes:
+        with contextlib.redirect_stderr(io.StringIO()):
+            pairs = calc_pairs(size, arguments.dutch)
+
+        for [layout, writer_type] in [
+            ("both directions", BothDirectionsWriter),
+            ("single row", SimilarArticlesWriter),
+        ]:
+            with contextlib.redirect_stderr(io.StringIO()):
+                runs = [
+                    asyncio.run(write_pairs(writer_type, pairs))
+                    for _ in range(arguments.repeat)
+                ]
+            duration, client = min(runs, key=lambda run: run[0])
+
+            print(
+                f"{layout:<15} {size:>9} {len(pairs):>10} {duration:>9.3f} "
+                + f"{client.statements:>11} {client.parameters:>11} "
+                + f"{len(pairs) / max(duration, 1e-9):>12.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
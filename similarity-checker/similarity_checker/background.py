@@ -0,0 +1,84 @@
+"""
+Overlaps the computation of the similar pairs with writing them to the database.
+
+The blocking iterator that computes the pairs runs in a thread of the default
+executor and pushes its items into a bounded `asyncio.Queue`. The event loop drains
+the queue, so awaited database round trips no longer keep the computation waiting,
+and a full queue blocks the thread until the writes caught up.
+"""
+
+from typing import AsyncGenerator, Iterator, Optional, Tuple, TypeVar
+
+import asyncio
+import threading
+import concurrent.futures
+
+T = TypeVar("T")
+
+# Seconds between checks whether the consumer stopped while the queue is full
+PUT_TIMEOUT = 0.1
+
+
+async def iter_in_thread(items: Iterator[T], depth: int) -> AsyncGenerator[T, None]:
+    """
+    Yields the items of a blocking iterator, computed ahead by a separate thread. At
+    most `depth` items wait in the queue. A depth of zero iterates in the event loop
+    itself, without overlap.
+
+    Exceptions of the iterator are raised by the consumer. When the consumer stops
+    early, the iterator is closed by its thread, so the generator should be closed
+    with `aclose()`. Process pools started by the iterator run next to other
+    threads, so they should not use the `fork` start method.
+    """
+
+    if depth <= 0:
+        for item in items:
+            yield item
+        return
+
+    loop = asyncio.get_running_loop()
+    # The item, or `None` with the exception of the iterator once it is done
+    queue: "asyncio.Queue[Tuple[bool, Optional[T], Optional[BaseException]]]" = (
+        asyncio.Queue(maxsize=depth)
+    )
+    stopped = threading.Event()
+
+    def put(entry: Tuple[bool, Optional[T], Optional[BaseException]]) -> bool:
+        future = asyncio.run_coroutine_threadsafe(queue.put(entry), loop)
+        while True:
+            try:
+                future.result(PUT_TIMEOUT)
+                return True
+            except concurrent.futures.TimeoutError:
+                if stopped.is_set():
+                    future.cancel()
+                    return False
+
+    def produce():
+        try:
+            for item in items:
+                if stopped.is_set() or not put((False, item, None)):
+                    return
+        except BaseException as error:
+            put((True, None, error))
+        else:
+            put((True, None, None))
+        finally:
+            close = getattr(items, "close", None)
+            if close is not None:
+                close()
+
+    producer = loop.run_in_executor(None, produce)
+
+    try:
+        while True:
+            [done, item, error] = await queue.get()
+            if error is not None:
+                raise error
+            if done:
+                break
+
+            yield item  # type: ignore
+    finally:
+        stopped.set()
+        await producer
@@ -0,0 +1,239 @@
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from sparse import CsrMatrix
+from pairs import SimilarPairs, match_similar, select_top_k
+from metrics import count, stage
+from progress import update
+
+# Bytes per cell of a block: every table is stored as a float32 tile, and the tile in
+# progress is accumulated in float64 first
+ACCUMULATOR_CELL_SIZE = 8
+TILE_CELL_SIZE = 4
+
+# Bytes per cell of the masks and ranked scores of `select_similar_pairs`, measured
+# with a top-k limit, which needs the most
+SELECTION_CELL_SIZE = 20
+
+# Bytes per product of `multiply_transposed_rows`, measured including its int64
+# owners, positions and cells and its float64 products
+PRODUCT_SIZE = 40
+
+
+def calc_block_bytes(
+    cells: int, products: int, tables: int, selection_cell_size: int
+) -> int:
+    """
+    Returns the bytes needed to compute a block of `cells` cells of every table, with
+    at most `products` products per table, and to select its similar pairs. The tiles
+    of all tables are kept at once, while the products of one table and the selection
+    come and go.
+    """
+
+    return cells * tables * TILE_CELL_SIZE + max(
+        cells * ACCUMULATOR_CELL_SIZE + products * PRODUCT_SIZE,
+        cells * selection_cell_size,
+    )
+
+
+def calc_row_products(
+    lhs_tables: List[CsrMatrix], transposed_tables: List[CsrMatrix]
+) -> NDArray[np.int64]:
+    """
+    Returns the most products any table accumulates for every row of `lhs @ rhs.T`,
+    given the transposed right tables.
+    """
+
+    return np.max(
+        [
+            np.bincount(
+                lhs_table.row_owners(),
+                weights=transposed_table.row_lengths()[lhs_table.indices],
+                minlength=lhs_table.shape[0],
+            )
+            for [lhs_table, transposed_table] in zip(lhs_tables, transposed_tables)
+        ],
+        axis=0,
+    ).astype(np.int64)
+
+
+def calc_block_ranges(
+    lhs_tables: List[CsrMatrix],
+    transposed_tables: List[CsrMatrix],
+    memory_budget: int,
+) -> List[Tuple[int, int]]:
+    """
+    Splits the rows of `lhs @ rhs.T` into blocks `(start, end)` that fit in the memory
+    budget (in bytes), given the transposed right tables. Blocks contain at least one
+    row, even if it exceeds the budget.
+    """
+
+    columns = transposed_tables[0].shape[1]
+    row_sizes = np.array(
+        [
+            calc_block_bytes(columns, products, len(lhs_tables), SELECTION_CELL_SIZE)
+            for products in calc_row_products(lhs_tables, transposed_tables).tolist()
+        ],
+        dtype=np.int64,
+    )
+    cumulative_sizes = np.cumsum(row_sizes)
+
+    ranges: List[Tuple[int, int]] = []
+    start = 0
+    while start < len(row_sizes):
+        offset = cumulative_sizes[start - 1] if start > 0 else 0
+        end = max(
+            int(
+                np.searchsorted(cumulative_sizes, offset + memory_budget, side="right")
+            ),
+            start + 1,
+        )
+        ranges.append((start, end))
+        start = end
+
+    return ranges
+
+
+def iter_similarity_blocks(
+    lhs_tables: List[CsrMatrix], rhs_tables: List[CsrMatrix], memory_budget: int
+) -> Iterator[Tuple[int, int, List[NDArray[np.float32]]]]:
+    """
+    Yields the cosine similarity tables `lhs @ rhs.T` of every pair of tables as row
+    blocks `(start, end, tiles)` that fit in the memory budget (in bytes).
+
+    The next block is only computed once the consumer asks for it, so at most one block
+    is kept in memory.
+    """
+
+    assert len(lhs_tables) == len(rhs_tables) and len(lhs_tables) > 0
+
+    columns = rhs_tables[0].shape[0]
+    transposed_tables = [table.transpose() for table in rhs_tables]
+
+    for [start, end] in calc_block_ranges(lhs_tables, transposed_tables, memory_budget):
+        with stage("multiply"):
+            tiles = [
+                lhs_table.multiply_transposed_rows(start, end, transposed_table)
+                for [lhs_table, transposed_table] in zip(lhs_tables, transposed_tables)
+            ]
+        count("candidate_pairs", (end - start) * columns)
+
+        yield start, end, tiles
+
+
+def select_similar_pairs(
+    lhs_indices: NDArray[np.int64],
+    rhs_indices: NDArray[np.int64],
+    title_tile: NDArray[np.float32],
+    description_tile: NDArray[np.float32],
+    scored: NDArray[np.bool_],
+    has_description: NDArray[np.bool_],
+    threshold: float,
+    top_k: int = 0,
+    candidates: Optional[NDArray[np.bool_]] = None,
+) -> SimilarPairs:
+    """
+    Selects the similar article pairs of a block of the similarity tables.
+
+    `lhs_indices` and `rhs_indices` are the article indices of the rows and columns of
+    the block. Pairs of two scored articles are only selected once, from the row of
+    the article with the lowest index. Only the cells in `candidates` are selected
+    when given. With a positive `top_k`, only the `top_k` most similar cells of every
+    row and the similar cells of articles that are not scored are selected, see
+    `select_top_k`, and a pair of two scored articles is selected by every row that
+    ranks it. These are all pairs needed to rank the neighbours of the articles, see
+    `neighbours.py`.
+    """
+
+    # Only check a pair of two scored articles once, unless every row ranks all of its
+    # neighbours
+    if top_k > 0:
+        checked = rhs_indices[None, :] != lhs_indices[:, None]
+    else:
+        checked = ~(
+            scored[rhs_indices][None, :]
+            & (rhs_indices[None, :] <= lhs_indices[:, None])
+        )
+
+    [similar, title_match] = match_similar(
+        title_tile,
+        description_tile,
+        has_description[lhs_indices][:, None],
+        has_description[rhs_indices][None, :],
+        threshold,
+    )
+
+    if candidates is not None:
+        similar &= candidates
+
+    # The neighbours of a row are ranked among all other articles. Articles that are
+    # not scored are only ranked with the pairs of the scored rows, so all of their
+    # pairs are kept.
+    if top_k > 0:
+        similar = select_top_k(
+            np.where(title_match, title_tile, description_tile),
+            similar & checked,
+            top_k,
+        ) | (similar & ~scored[rhs_indices][None, :])
+
+    [rows, columns] = np.nonzero(checked & similar)
+    via_title = title_match[rows, columns]
+    similarities = np.where(
+        via_title,
+        title_tile[rows, columns],
+        description_tile[rows, columns],
+    )
+
+    return lhs_indices[rows], rhs_indices[columns], similarities, via_title
+
+
+def iter_block_similar_pairs(
+    title_tf_idf_table: CsrMatrix,
+    description_tf_idf_table: CsrMatrix,
+    scored: NDArray[np.bool_],
+    has_description: NDArray[np.bool_],
+    threshold: float,
+    memory_budget: int,
+    lhs_indices: Optional[NDArray[np.int64]] = None,
+    top_k: int = 0,
+) -> Iterator[SimilarPairs]:
+    """
+    Checks every scored article against every other article and yields the similar
+    pairs of one block of the similarity tables at a time.
+
+    Only the articles in `lhs_indices` are checked when given, instead of all scored
+    articles. Every checked article keeps at most `top_k` neighbours when positive.
+    """
+
+    scored_indices = np.flatnonzero(scored) if lhs_indices is None else lhs_indices
+    all_indices = np.arange(title_tf_idf_table.shape[0], dtype=np.int64)
+
+    for [
+        block_start,
+        block_end,
+        [title_tile, description_tile],
+    ] in iter_similarity_blocks(
+        [
+            title_tf_idf_table.take_rows(scored_indices),
+            description_tf_idf_table.take_rows(scored_indices),
+        ],
+        [title_tf_idf_table, description_tf_idf_table],
+        memory_budget,
+    ):
+        update("Checked articles", block_end, len(scored_indices))
+
+        with stage("extract_pairs"):
+            similar_pairs = select_similar_pairs(
+                scored_indices[block_start:block_end],
+                all_indices,
+                title_tile,
+                description_tile,
+                scored,
+                has_description,
+                threshold,
+                top_k,
+            )
+
+        yield similar_pairs
@@ -0,0 +1,150 @@
+"""
+Checkpoints of long similarity runs.
+
+The scored articles of every partition are split into units of at most
+`unit_size` rows. A unit owns the pairs of its articles with articles that are not
+scored or belong to the same or a later unit, and writes and deletes them before it
+is marked as completed. A checker that restarts during a run skips the completed
+units, as long as the settings and scored articles of the run did not change.
+
+The checkpoint is written when the run starts and records the last article id of
+the run. Articles inserted later are only scored by the next run, so inserts do not
+change the units of a run that is resumed.
+"""
+
+from typing import Dict, List, Optional, Set, Tuple
+
+import os
+import json
+import hashlib
+
+import numpy as np
+from numpy.typing import NDArray
+
+from store import replace_file
+from progress import status
+
+# Unit of articles that are not scored
+NO_UNIT = np.iinfo(np.int64).max
+
+
+def assign_units(
+    partitions: List[NDArray[np.int64]], scored: NDArray[np.bool_], unit_size: int
+) -> Tuple[NDArray[np.int64], int]:
+    """
+    Returns the unit of every article and the amount of units. Units are numbered in
+    order of the partitions and the article indices within them. A unit size of zero
+    puts all scored articles of a partition in a single unit.
+    """
+
+    article_units = np.full(len(scored), NO_UNIT, dtype=np.int64)
+    units = 0
+
+    for partition in partitions:
+        scored_indices = partition[scored[partition]]
+        size = unit_size if unit_size > 0 else max(len(scored_indices), 1)
+
+        for offset in range(0, len(scored_indices), size):
+            article_units[scored_indices[offset : offset + size]] = units
+            units += 1
+
+    return article_units, units
+
+
+def calc_run_fingerprint(
+    scored_range: Tuple[Optional[int], Optional[int]],
+    scored_articles: int,
+    settings: Dict[str, object],
+) -> str:
+    """
+    Returns a hash of everything that decides which articles the units of a run
+    score: the exclusive lower and inclusive upper bound of the scored article ids
+    (`None` when unbounded), the amount of scored articles and the settings. The
+    amount changes when a scored article is removed, which shifts the units.
+    """
+
+    fingerprint = hashlib.sha256()
+    fingerprint.update(
+        json.dumps(
+            {
+                "scored_range": scored_range,
+                "scored_articles": scored_articles,
+                "settings": settings,
+            },
+            sort_keys=True,
+        ).encode()
+    )
+
+    return fingerprint.hexdigest()
+
+
+def load_last_article_id(path: Optional[str]) -> Optional[int]:
+    """
+    Returns the last article id of the run that wrote the checkpoint, or `None`
+    without a checkpoint.
+    """
+
+    if path is None or not os.path.exists(path):
+        return None
+
+    with open(path, "r") as file:
+        return json.load(file).get("last_article_id")
+
+
+class RunCheckpoint:
+    """
+    Units completed by the run with the fingerprint, stored as a JSON file. Without a
+    path, or when the file belongs to another run, no units are completed.
+    """
+
+    def __init__(
+        self, path: Optional[str], fingerprint: str, last_article_id: Optional[int]
+    ):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.last_article_id = last_article_id
+        self.completed: Set[int] = set()
+
+        if path is None or not os.path.exists(path):
+            return
+
+        with open(path, "r") as file:
+            checkpoint = json.load(file)
+
+        if checkpoint["fingerprint"] == fingerprint:
+            self.completed = set(checkpoint["completed_units"])
+        else:
+            status("Discarding the checkpoint of a different run.")
+
+    def complete(self, unit: int):
+        self.completed.add(unit)
+        self.save()
+
+    def save(self):
+        """
+        Writes the checkpoint, so a restarted run finds the articles of the run even
+        before its first unit is completed.
+        """
+
+        if self.path is None:
+            return
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        checkpoint = {
+            "fingerprint": self.fingerprint,
+            "last_article_id": self.last_article_id,
+            "completed_units": sorted(self.completed),
+        }
+        replace_file(
+            self.path, lambda file: file.write(json.dumps(checkpoint).encode())
+        )
+
+    def finish(self):
+        """
+        Removes the checkpoint once the run is completed and its state is saved.
+        """
+
+        self.completed = set()
+
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,184 @@
+"""
+Story clusters: the connected components of the similar article pairs.
+
+Every article is stored with the id of its cluster, the smallest article id in the
+component, and whether it is the latest article of its source in the cluster. Older
+articles of a source are considered updated versions. Undated articles are always
+the latest, like the server treated them before.
+"""
+
+from typing import Optional, Sequence
+
+import numpy as np
+from numpy.typing import NDArray
+
+from prisma import Prisma
+
+from metrics import count, stage
+from loader import iter_similar_pair_pages
+
+# Postgres accepts at most 65535 parameters per statement, every row uses three
+MAX_ROWS_PER_STATEMENT = 65535 // 3
+
+
+class UnionFind:
+    """
+    Disjoint sets of the elements `0..size` with path halving and union by size.
+    """
+
+    def __init__(self, size: int):
+        self.parents = list(range(size))
+        self.sizes = [1] * size
+
+    def find(self, element: int) -> int:
+        parents = self.parents
+        while parents[element] != element:
+            parents[element] = parents[parents[element]]
+            element = parents[element]
+
+        return element
+
+    def union(self, lhs: int, rhs: int):
+        lhs, rhs = self.find(lhs), self.find(rhs)
+        if lhs == rhs:
+            return
+
+        if self.sizes[lhs] < self.sizes[rhs]:
+            lhs, rhs = rhs, lhs
+        self.parents[rhs] = lhs
+        self.sizes[lhs] += self.sizes[rhs]
+
+    def roots(self) -> NDArray[np.int64]:
+        return np.array(
+            [self.find(element) for element in range(len(self.parents))],
+            dtype=np.int64,
+        )
+
+
+def calc_cluster_ids(
+    ids: NDArray[np.int64], roots: NDArray[np.int64]
+) -> NDArray[np.int64]:
+    """
+    Returns the smallest article id of the cluster of every article.
+    """
+
+    cluster_ids = np.full(len(ids), np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(cluster_ids, roots, ids)  # type: ignore
+
+    return cluster_ids[roots]
+
+
+def calc_latest_in_cluster(
+    cluster_ids: NDArray[np.int64],
+    source_ids: NDArray[np.int64],
+    publication_times: NDArray[np.float64],
+) -> NDArray[np.bool_]:
+    """
+    Returns whether no article of the same source in the cluster is published later.
+    """
+
+    _, groups = np.unique(
+        np.stack([cluster_ids, source_ids]), axis=1, return_inverse=True
+    )
+    groups = groups.reshape(-1)
+
+    latest_times = np.full(int(groups.max(initial=-1)) + 1, -np.inf)
+    np.fmax.at(latest_times, groups, publication_times)  # type: ignore
+
+    return np.isnan(publication_times) | (publication_times >= latest_times[groups])
+
+
+async def update_clusters(
+    client: Prisma,
+    article_ids: Sequence[int],
+    source_ids: Sequence[int],
+    publication_times: NDArray[np.float64],
+    previous_cluster_ids: Sequence[Optional[int]],
+    previous_latest: Sequence[bool],
+    page_size: int,
+) -> int:
+    """
+    Computes the clusters of all similar pairs in the database and writes the
+    cluster id and latest marker of every article that changed. Returns the amount
+    of articles that were updated.
+    """
+
+    if len(article_ids) == 0:
+        return 0
+
+    ids = np.array(article_ids, dtype=np.int64)
+    order = np.argsort(ids, kind="stable")
+    sorted_ids = ids[order]
+
+    sets = UnionFind(len(ids))
+    async for rows in iter_similar_pair_pages(client, page_size):
+        with stage("cluster"):
+            lhs_ids = np.array([row["id1"] for row in rows], dtype=np.int64)
+            rhs_ids = np.array([row["id2"] for row in rows], dtype=np.int64)
+
+            # Pairs of articles removed since the similarities were loaded are skipped
+            lhs_sorted = np.minimum(np.searchsorted(sorted_ids, lhs_ids), len(ids) - 1)
+            rhs_sorted = np.minimum(np.searchsorted(sorted_ids, rhs_ids), len(ids) - 1)
+            known = (sorted_ids[lhs_sorted] == lhs_ids) & (
+                sorted_ids[rhs_sorted] == rhs_ids
+            )
+
+            for [lhs, rhs] in zip(
+                order[lhs_sorted[known]].tolist(), order[rhs_sorted[known]].tolist()
+            ):
+                sets.union(lhs, rhs)
+
+    with stage("cluster"):
+        cluster_ids = calc_cluster_ids(ids, sets.roots())
+        latest = calc_latest_in_cluster(
+            cluster_ids, np.array(source_ids, dtype=np.int64), publication_times
+        )
+
+        previous = np.array(
+            [
+                -1 if cluster_id is None else cluster_id
+                for cluster_id in previous_cluster_ids
+            ],
+            dtype=np.int64,
+        )
+        changed = np.flatnonzero(
+            (cluster_ids != previous)
+            | (latest != np.array(previous_latest, dtype=bool))
+        )
+
+    count("clusters", len(np.unique(cluster_ids)))
+    count("cluster_updates", len(changed))
+
+    rows = list(
+        zip(
+            ids[changed].tolist(),
+            cluster_ids[changed].tolist(),
+            latest[changed].tolist(),
+        )
+    )
+    if len(rows) > 0:
+        with stage("write"):
+            async with client.batch_() as batch:
+                for offset in range(0, len(rows), MAX_ROWS_PER_STATEMENT):
+                    statement_rows = rows[offset : offset + MAX_ROWS_PER_STATEMENT]
+                    batch.execute_raw(
+                        build_update_query(len(statement_rows)),  # type: ignore
+                        *[value for row in statement_rows for value in row],
+                    )
+
+    return len(rows)
+
+
+def build_update_query(rows: int) -> str:
+    values = ", ".join(
+        f"(${3 * row + 1}::integer, ${3 * row + 2}::integer, ${3 * row + 3}::boolean)"
+        for row in range(rows)
+    )
+
+    return f"""
+        UPDATE "NewsArticles" AS "article"
+        SET "cluster_id" = "cluster"."cluster_id",
+            "latest_in_cluster" = "cluster"."latest_in_cluster"
+        FROM (VALUES {values}) AS "cluster" ("id", "cluster_id", "latest_in_cluster")
+        WHERE "article"."id" = "cluster"."id"
+    """
@@ -0,0 +1,131 @@
+"""
+Settings of the similarity checker. Every setting can be overridden with the
+environment variable of the same name.
+"""
+
+import os
+
+
+def env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return default if value is None else int(value)
+
+
+def env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return default if value is None else float(value)
+
+
+# Only score articles added since the previous run against the existing corpus.
+SIMILARITY_INCREMENTAL = env_bool("SIMILARITY_INCREMENTAL", True)
+
+# Relative change of the idf weights since the last full run after which all article
+# pairs are scored again.
+SIMILARITY_IDF_DRIFT_BOUND = env_float("SIMILARITY_IDF_DRIFT_BOUND", 0.25)
+
+# Memory available for a block of the similarity tables in megabytes.
+SIMILARITY_MEMORY_BUDGET_MB = env_int("SIMILARITY_MEMORY_BUDGET_MB", 256)
+
+# Amount of similar pairs written to the database in one transaction.
+SIMILARITY_WRITE_BATCH_SIZE = env_int("SIMILARITY_WRITE_BATCH_SIZE", 1000)
+
+# Seconds after which pending similar pairs are written, even if the batch is not full.
+SIMILARITY_WRITE_FLUSH_INTERVAL = env_float("SIMILARITY_WRITE_FLUSH_INTERVAL", 5.0)
+
+# Processes used to tokenize corpora larger than one chunk.
+SIMILARITY_TOKENIZER_WORKERS = env_int(
+    "SIMILARITY_TOKENIZER_WORKERS", os.cpu_count() or 1
+)
+
+# Amount of texts tokenized per process pool task. Pages of articles of at most one
+# chunk are tokenized without the pool, see `SIMILARITY_PAGE_SIZE`.
+SIMILARITY_TOKENIZER_CHUNK_SIZE = env_int("SIMILARITY_TOKENIZER_CHUNK_SIZE", 1000)
+
+# How pairs of articles are selected for comparison: `exhaustive` compares every pair,
+# `lsh` only compares candidate pairs found with MinHash and locality-sensitive
+# hashing and `inverted` only compares pairs whose titles share a term.
+SIMILARITY_CANDIDATES = os.environ.get("SIMILARITY_CANDIDATES", "exhaustive")
+
+# Minimum idf `log(N / df)` of the title terms shared by the `inverted` candidates,
+# `0` keeps every term and finds exactly the pairs of the exhaustive mode.
+SIMILARITY_IDF_CUTOFF = env_float("SIMILARITY_IDF_CUTOFF", 0.0)
+
+# Amount of bands and signature rows per band used for locality-sensitive hashing.
+SIMILARITY_LSH_BANDS = env_int("SIMILARITY_LSH_BANDS", 32)
+SIMILARITY_LSH_ROWS = env_int("SIMILARITY_LSH_ROWS", 4)
+
+# Amount of consecutive terms in a shingle.
+SIMILARITY_LSH_SHINGLE_SIZE = env_int("SIMILARITY_LSH_SHINGLE_SIZE", 1)
+
+# Seed of the MinHash hash functions.
+SIMILARITY_LSH_SEED = env_int("SIMILARITY_LSH_SEED", 0)
+
+# Directory of the persistent vocabulary, document frequency and term store. An empty
+# value keeps the store in memory only.
+SIMILARITY_STORE_PATH = os.environ.get("SIMILARITY_STORE_PATH", "store")
+
+# Wake up on notifications of modified articles, see `trigger.py`.
+SIMILARITY_NOTIFY = env_bool("SIMILARITY_NOTIFY", True)
+
+# Seconds without a new notification after which a burst of modifications is scored,
+# and the longest a run is postponed by a burst.
+SIMILARITY_TRIGGER_DEBOUNCE = env_float("SIMILARITY_TRIGGER_DEBOUNCE", 2.0)
+SIMILARITY_TRIGGER_MAX_DELAY = env_float("SIMILARITY_TRIGGER_MAX_DELAY", 30.0)
+
+# Seconds between checks of the `articles_modified` flag when no notification arrives.
+SIMILARITY_POLL_INTERVAL = env_float("SIMILARITY_POLL_INTERVAL", 60.0)
+
+# Only compare articles published at most this many hours apart, 0 compares all
+# articles. Articles without a publication date are compared with every article
+# (`compare`) or never (`skip`).
+SIMILARITY_WINDOW_HOURS = env_float("SIMILARITY_WINDOW_HOURS", 0.0)
+SIMILARITY_UNDATED_POLICY = os.environ.get("SIMILARITY_UNDATED_POLICY", "compare")
+
+# Port of the Prometheus metrics endpoint, 0 disables it.
+SIMILARITY_METRICS_PORT = env_int("SIMILARITY_METRICS_PORT", 9108)
+
+# File the metrics of every run are appended to as a JSON line, stderr when empty.
+SIMILARITY_METRICS_LOG = os.environ.get("SIMILARITY_METRICS_LOG", "")
+
+# Amount of progress output: `quiet`, `summary` or `verbose`, which also logs every
+# similar pair. Progress of long stages is reported at most once per interval.
+SIMILARITY_PROGRESS = os.environ.get("SIMILARITY_PROGRESS", "summary")
+SIMILARITY_PROGRESS_INTERVAL = env_float("SIMILARITY_PROGRESS_INTERVAL", 10.0)
+
+# Amount of articles loaded and tokenized at once.
+SIMILARITY_PAGE_SIZE = env_int("SIMILARITY_PAGE_SIZE", 5000)
+
+# Processes that compute the blocks of the exhaustive similarity tables in parallel.
+SIMILARITY_PRODUCT_WORKERS = env_int("SIMILARITY_PRODUCT_WORKERS", os.cpu_count() or 1)
+
+# Compare articles of different languages. By default every language is compared
+# separately, with its own vocabulary and idf weights.
+SIMILARITY_CROSS_LANGUAGE = env_bool("SIMILARITY_CROSS_LANGUAGE", False)
+
+# Change of similarity below which a stored pair is not written again.
+SIMILARITY_SYNC_EPSILON = env_float("SIMILARITY_SYNC_EPSILON", 1e-4)
+
+# Scored articles per checkpointed unit of a run, `0` checks every language as a
+# single unit.
+SIMILARITY_CHECKPOINT_ROWS = env_int("SIMILARITY_CHECKPOINT_ROWS", 5000)
+
+# Most similar articles kept for every article, a pair is kept when it is among them
+# for both of its articles. `0` keeps every similar pair.
+SIMILARITY_TOP_K = env_int("SIMILARITY_TOP_K", 0)
+
+# Width of the feature space the terms of the tf-idf tables are hashed into, `0` uses
+# the vocabulary of the term store as columns. Only the tables are bounded, the term
+# store keeps growing its vocabulary either way.
+SIMILARITY_HASH_FEATURES = env_int("SIMILARITY_HASH_FEATURES", 0)
+
+# Batches of similar pairs computed ahead while the previous ones are written, `0`
+# computes and writes them in turn.
+SIMILARITY_PIPELINE_DEPTH = env_int("SIMILARITY_PIPELINE_DEPTH", 4)
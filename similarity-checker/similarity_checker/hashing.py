@@ -0,0 +1,102 @@
+"""
+Feature hashing of terms: every term is mapped to one of a fixed amount of columns
+with the CRC-32 of the term, instead of an id of a growing vocabulary. The highest
+bit of the hash decides the sign of the value, so terms that collide in a column
+cancel out on average instead of adding up.
+
+The column of a term only depends on the term itself, so the rows of a table can be
+built for every article independently. Only the width of the tables is fixed, the
+term store still keeps every term, see `TermStore.hashed_term_frequency_table`.
+"""
+
+from typing import List, Tuple
+
+import zlib
+
+import numpy as np
+from numpy.typing import NDArray
+
+from sparse import CsrMatrix
+
+SIGN_BIT = 1 << 31
+
+
+def hash_terms(
+    terms: List[str], features: int
+) -> Tuple[NDArray[np.int64], NDArray[np.float64]]:
+    """
+    Returns the column and sign of every term in a table of `features` columns.
+    """
+
+    assert 0 < features <= SIGN_BIT, "features should fit in the bits below the sign"
+
+    hashes = np.fromiter(
+        (zlib.crc32(term.encode("utf-8")) for term in terms),
+        dtype=np.int64,
+        count=len(terms),
+    )
+
+    return (hashes & (SIGN_BIT - 1)) % features, np.where(hashes & SIGN_BIT, -1.0, 1.0)
+
+
+def build_hashed_term_frequency_table(
+    documents: List[List[str]], features: int
+) -> CsrMatrix:
+    """
+    Builds the normalized term frequency table of the documents, with the terms
+    hashed into `features` signed columns.
+    """
+
+    lengths = np.array([len(document) for document in documents], dtype=np.int64)
+    columns, signs = hash_terms(
+        [term for document in documents for term in document], features
+    )
+    owners = np.repeat(np.arange(len(documents), dtype=np.int64), lengths)
+
+    return sum_cells(owners, columns, signs / lengths[owners], len(documents), features)
+
+
+def hash_columns(
+    table: CsrMatrix,
+    columns: NDArray[np.int64],
+    signs: NDArray[np.float64],
+    features: int,
+) -> CsrMatrix:
+    """
+    Returns the table with every column moved to its hashed column, given the hashed
+    column and sign of every original column.
+    """
+
+    return sum_cells(
+        table.row_owners(),
+        columns[table.indices],
+        signs[table.indices] * table.data,
+        table.shape[0],
+        features,
+    )
+
+
+def sum_cells(
+    owners: NDArray[np.int64],
+    columns: NDArray[np.int64],
+    values: NDArray[np.float64],
+    rows: int,
+    features: int,
+) -> CsrMatrix:
+    """
+    Returns the table of the sum of the values of every cell. Cells whose values
+    cancel out are not stored.
+    """
+
+    cells, inverse = np.unique(owners * features + columns, return_inverse=True)
+    data: NDArray[np.float64] = np.bincount(  # type: ignore
+        inverse.reshape(-1), weights=values, minlength=len(cells)
+    )
+
+    stored = data != 0
+    cells, data = cells[stored], data[stored]
+
+    indptr = np.zeros(rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cells // features, minlength=rows), out=indptr[1:])
+
+    return CsrMatrix(data, cells % features, indptr, (rows, features))
@@ -0,0 +1,99 @@
+from typing import Dict, Optional
+from dataclasses import dataclass, field
+
+import numpy as np
+from numpy.typing import NDArray
+
+from vocabulary import Vocabulary
+from progress import status
+
+
+@dataclass
+class CorpusState:
+    """
+    State of the corpus after the previous similarity run.
+
+    Incremental runs only score articles with an id above `last_article_id`. The
+    document frequencies are a snapshot taken at the last full run and are used to
+    measure how far the idf weights drifted since.
+    """
+
+    last_article_id: Optional[int] = None
+    documents: int = 0
+    title_document_frequencies: Dict[str, int] = field(default_factory=dict)
+    description_document_frequencies: Dict[str, int] = field(default_factory=dict)
+
+
+def calc_document_frequencies(
+    document_frequencies: NDArray[np.int64], vocabulary: Vocabulary
+) -> Dict[str, int]:
+    return {
+        vocabulary.terms[term_id]: count
+        for [term_id, count] in enumerate(document_frequencies.tolist())
+        if count > 0
+    }
+
+
+def calc_idf_drift(
+    old_document_frequencies: Dict[str, int],
+    old_documents: int,
+    new_document_frequencies: Dict[str, int],
+    new_documents: int,
+) -> float:
+    """
+    Returns how much the relative idf weights of the terms in both snapshots changed,
+    between 0 (unchanged) and 2. Both weight vectors are normalized to sum to one, so
+    a corpus that grows without changing the term distribution does not drift.
+    """
+
+    shared_terms = [
+        term for term in old_document_frequencies if term in new_document_frequencies
+    ]
+    if len(shared_terms) == 0:
+        return 0.0
+
+    old_idf = [old_documents / old_document_frequencies[term] for term in shared_terms]
+    new_idf = [new_documents / new_document_frequencies[term] for term in shared_terms]
+    old_total, new_total = sum(old_idf), sum(new_idf)
+
+    return sum(
+        abs(new_weight / new_total - old_weight / old_total)
+        for [old_weight, new_weight] in zip(old_idf, new_idf)
+    )
+
+
+def should_rebuild(
+    state: CorpusState,
+    documents: int,
+    title_document_frequencies: Dict[str, int],
+    description_document_frequencies: Dict[str, int],
+    drift_bound: float,
+) -> bool:
+    """
+    Returns whether all article pairs have to be scored again instead of only the
+    pairs containing a new article.
+    """
+
+    if state.last_article_id is None:
+        return True
+
+    drift = max(
+        calc_idf_drift(
+            state.title_document_frequencies,
+            state.documents,
+            title_document_frequencies,
+            documents,
+        ),
+        calc_idf_drift(
+            state.description_document_frequencies,
+            state.documents,
+            description_document_frequencies,
+            documents,
+        ),
+    )
+
+    if drift > drift_bound:
+        status(f"Idf drift `{drift:.3f}` exceeds bound `{drift_bound}`. Rebuilding.")
+        return True
+
+    return False
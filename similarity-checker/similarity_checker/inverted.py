@@ -0,0 +1,243 @@
+"""
+Candidate pruning with an inverted index of the title terms.
+
+A pair of articles can only be similar when their titles share a term, see
+`match_similar`. The transposed title table maps every term to the articles using
+it, so the title similarities of a block of articles are accumulated over the
+posting lists of their terms, only for the pairs sharing a term. The work grows
+with the sum of the posting list lengths instead of the amount of articles squared.
+The description similarities are accumulated the same way, and only looked up for
+the pairs whose titles share a term.
+
+Terms with an idf below a cutoff can be left out of the index. Their posting lists
+are the longest, but pairs that only share such terms are no longer found.
+"""
+
+from typing import Iterator, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from sparse import CsrMatrix, segment_positions
+from pairs import SimilarPairs, match_similar, select_pair_top_k
+from metrics import count, stage
+from progress import update
+
+# Bytes per accumulated product, measured including the temporary arrays of the
+# accumulation
+PRODUCT_SIZE = 128
+
+# Cells of a block per accumulated product below which the block is accumulated densely
+DENSE_CELLS_PER_PRODUCT = 4
+
+
+def calc_term_idf(table: CsrMatrix) -> NDArray[np.float64]:
+    """
+    Returns the inverse document frequency `log(N / df)` of every column.
+    """
+
+    return np.log(max(table.shape[0], 1) / np.maximum(table.count_nonzero_columns(), 1))
+
+
+def accumulate_postings(
+    lhs_table: CsrMatrix,
+    index: CsrMatrix,
+    indexed: NDArray[np.bool_],
+    start: int,
+    end: int,
+) -> Tuple[NDArray[np.int64], NDArray[np.int64], NDArray[np.float32]]:
+    """
+    Returns the rows `start` up to `end` of `lhs_table @ index.T` as the row within
+    the block, column and value of every cell sharing an indexed term. Values are
+    accumulated in the same order as `multiply_transposed_rows`.
+    """
+
+    lower, upper = lhs_table.indptr[start], lhs_table.indptr[end]
+
+    entry_rows = np.repeat(
+        np.arange(end - start, dtype=np.int64), lhs_table.row_lengths()[start:end]
+    )
+    entry_columns = lhs_table.indices[lower:upper]
+    entry_values = lhs_table.data[lower:upper]
+
+    kept = indexed[entry_columns]
+    entry_rows, entry_columns, entry_values = (
+        entry_rows[kept],
+        entry_columns[kept],
+        entry_values[kept],
+    )
+
+    owners, positions = segment_positions(
+        index.indptr[entry_columns], index.row_lengths()[entry_columns]
+    )
+    output_columns = index.shape[1]
+    products = entry_values[owners] * index.data[positions]
+    cells = entry_rows[owners] * output_columns + index.indices[positions]
+
+    # Accumulating into a dense tile is cheaper than sorting the cells when most cells
+    # of the block share a term. Cells whose products cancel out are never similar.
+    values: NDArray[np.float64]
+    if (end - start) * output_columns <= DENSE_CELLS_PER_PRODUCT * len(cells):
+        tile: NDArray[np.float64] = np.bincount(  # type: ignore
+            cells, weights=products, minlength=(end - start) * output_columns
+        )
+        cells = np.flatnonzero(tile)
+        values = tile[cells]
+    else:
+        cells, inverse = np.unique(cells, return_inverse=True)
+        values = np.bincount(  # type: ignore
+            inverse.reshape(-1), weights=products, minlength=len(cells)
+        )
+
+    return (
+        cells // output_columns,
+        cells % output_columns,
+        values.astype(np.float32),
+    )
+
+
+def iter_inverted_similar_pairs(
+    title_tf_idf_table: CsrMatrix,
+    description_tf_idf_table: CsrMatrix,
+    scored: NDArray[np.bool_],
+    has_description: NDArray[np.bool_],
+    threshold: float,
+    memory_budget: int,
+    idf_cutoff: float = 0.0,
+    top_k: int = 0,
+) -> Iterator[SimilarPairs]:
+    """
+    Yields the same similar pairs as `iter_block_similar_pairs`, only scoring the
+    pairs whose titles share a term. With a positive `idf_cutoff` only terms with at
+    least that idf are shared. Blocks of scored articles are sized so their
+    accumulated products fit in the memory budget (in bytes).
+    """
+
+    scored_indices = np.flatnonzero(scored)
+    if len(scored_indices) == 0:
+        return
+
+    with stage("multiply"):
+        lhs_table = title_tf_idf_table.take_rows(scored_indices)
+        index = title_tf_idf_table.transpose()
+        description_lhs_table = description_tf_idf_table.take_rows(scored_indices)
+        description_index = description_tf_idf_table.transpose()
+
+        indexed = (
+            calc_term_idf(title_tf_idf_table) >= idf_cutoff
+            if idf_cutoff > 0
+            else np.ones(title_tf_idf_table.shape[1], dtype=bool)
+        )
+
+        # Products accumulated by every scored article, to split the blocks
+        entry_products = np.where(
+            indexed[lhs_table.indices], index.row_lengths()[lhs_table.indices], 0
+        )
+        cumulative_products = np.cumsum(
+            np.bincount(
+                lhs_table.row_owners(),
+                weights=entry_products,
+                minlength=len(scored_indices),
+            )
+            + np.bincount(
+                description_lhs_table.row_owners(),
+                weights=description_index.row_lengths()[description_lhs_table.indices],
+                minlength=len(scored_indices),
+            )
+        )
+
+    block_products = max(memory_budget // PRODUCT_SIZE, 1)
+
+    start = 0
+    while start < len(scored_indices):
+        offset = cumulative_products[start - 1] if start > 0 else 0
+        end = max(
+            int(
+                np.searchsorted(
+                    cumulative_products, offset + block_products, side="right"
+                )
+            ),
+            start + 1,
+        )
+
+        with stage("multiply"):
+            [rows, rhs, title_similarities] = accumulate_postings(
+                lhs_table, index, indexed, start, end
+            )
+            lhs = scored_indices[start:end][rows]
+
+            # Title terms left out of the index still count for the similarity
+            if idf_cutoff > 0:
+                title_similarities = title_tf_idf_table.multiply_row_pairs(
+                    title_tf_idf_table, lhs, rhs
+                )
+
+            # Descriptions only decide pairs whose titles are not similar themselves
+            needed = np.flatnonzero(
+                (title_similarities <= threshold)
+                & (title_similarities > np.finfo(float).eps)
+                & has_description[lhs]
+                & has_description[rhs]
+            )
+            [description_rows, description_rhs, description_values] = (
+                accumulate_postings(
+                    description_lhs_table,
+                    description_index,
+                    np.ones(description_tf_idf_table.shape[1], dtype=bool),
+                    start,
+                    end,
+                )
+            )
+            columns = len(scored)
+            description_cells = description_rows * columns + description_rhs
+            needed_cells = rows[needed] * columns + rhs[needed]
+            positions = np.minimum(
+                np.searchsorted(description_cells, needed_cells),
+                max(len(description_cells) - 1, 0),
+            )
+            description_similarities = np.zeros(len(lhs), dtype=np.float32)
+            if len(description_cells) > 0:
+                description_similarities[needed] = np.where(
+                    description_cells[positions] == needed_cells,
+                    description_values[positions],
+                    0,
+                )
+
+        count("candidate_pairs", len(lhs))
+        update("Checked articles", end, len(scored_indices))
+
+        with stage("extract_pairs"):
+            [similar, title_match] = match_similar(
+                title_similarities,
+                description_similarities,
+                has_description[lhs],
+                has_description[rhs],
+                threshold,
+            )
+            similarities = np.where(
+                title_match, title_similarities, description_similarities
+            )
+
+            # The neighbours of an article are ranked among all other articles, and
+            # every article yields its own neighbours and all pairs with articles
+            # that are not scored, like `select_similar_pairs`
+            if top_k > 0:
+                ranked = np.flatnonzero(similar & (lhs != rhs))
+                selected = np.zeros(len(lhs), dtype=bool)
+                selected[
+                    ranked[select_pair_top_k(lhs[ranked], similarities[ranked], top_k)]
+                ] = True
+                selected[ranked[~scored[rhs[ranked]]]] = True
+            else:
+                # Only check a pair of two scored articles once
+                selected = similar & ~(scored[rhs] & (rhs <= lhs))
+
+        similar_pairs = (
+            lhs[selected],
+            rhs[selected],
+            similarities[selected],
+            title_match[selected],
+        )
+        yield similar_pairs
+
+        start = end
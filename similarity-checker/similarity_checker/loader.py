@@ -0,0 +1,144 @@
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Union,
+)
+
+from dataclasses import dataclass
+from datetime import datetime
+
+from prisma import Prisma
+from prisma.enums import Language
+
+from metrics import stage
+
+# Only the columns used by the similarity checker are selected. Pages are selected
+# with a cursor on the id instead of an offset, so every page is an index range scan.
+PAGE_QUERY = """
+    SELECT "id", "title", "description", "language", "source_id", "publication_date",
+        "cluster_id", "latest_in_cluster"
+    FROM "NewsArticles"
+    WHERE "id" > $1
+    ORDER BY "id"
+    LIMIT $2
+"""
+
+
+# Every pair is stored once with `id1 < id2`. Rows of the layout that stored both
+# directions are skipped, in case the migration to a single row did not run yet.
+SIMILAR_PAIRS_QUERY = """
+    SELECT "id1", "id2", "similarity"
+    FROM "SimilarArticles"
+    WHERE "id1" < "id2" AND ("id1", "id2") > ($1, $2)
+    ORDER BY "id1", "id2"
+    LIMIT $3
+"""
+
+
+@dataclass
+class ArticleRow:
+    """
+    Columns of a `NewsArticles` row used by the similarity checker.
+    """
+
+    id: int
+    title: str
+    description: Optional[str]
+    language: Language
+    source_id: int
+    publication_date: Optional[datetime]
+    # Story cluster of the previous run, see `cluster.py`
+    cluster_id: Optional[int] = None
+    latest_in_cluster: bool = True
+
+
+def parse_datetime(value: Any) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+
+    # Older Python versions do not accept the `Z` suffix
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+
+def parse_article_row(row: Dict[str, Any]) -> ArticleRow:
+    return ArticleRow(
+        int(row["id"]),
+        row["title"],
+        row["description"],
+        Language(row["language"]),
+        int(row["source_id"]),
+        parse_datetime(row["publication_date"]),
+        row["cluster_id"],
+        row["latest_in_cluster"],
+    )
+
+
+async def iter_article_pages(
+    client: Prisma, page_size: int
+) -> AsyncIterator[List[ArticleRow]]:
+    """
+    Yields all articles ordered by id, one page of at most `page_size` articles at a
+    time. Only a single page is kept in memory by this function.
+    """
+
+    last_id = -1
+    while True:
+        with stage("fetch"):
+            rows: List[Dict[str, Any]] = await client.query_raw(  # type: ignore
+                PAGE_QUERY, last_id, page_size
+            )
+
+        if len(rows) == 0:
+            return
+
+        page = [parse_article_row(row) for row in rows]
+        yield page
+
+        if len(rows) < page_size:
+            return
+        last_id = page[-1].id
+
+
+async def iter_similar_pair_pages(
+    client: Prisma, page_size: int
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Yields all similar pairs as `id1`, `id2` and `similarity` rows with `id1 < id2`,
+    one page of at most `page_size` pairs at a time.
+    """
+
+    last_pair = (-1, -1)
+    while True:
+        with stage("fetch"):
+            rows: List[Dict[str, Any]] = await client.query_raw(  # type: ignore
+                SIMILAR_PAIRS_QUERY, *last_pair, page_size
+            )
+
+        if len(rows) == 0:
+            return
+
+        yield rows
+
+        if len(rows) < page_size:
+            return
+        last_pair = (int(rows[-1]["id1"]), int(rows[-1]["id2"]))
+
+
+async def iter_pages(
+    articles: Union[Sequence[ArticleRow], AsyncIterable[List[ArticleRow]]],
+) -> AsyncIterator[Sequence[ArticleRow]]:
+    """
+    Yields the pages of a page iterator, or a list of articles as a single page.
+    """
+
+    if isinstance(articles, Sequence):
+        yield articles
+        return
+
+    async for page in articles:
+        yield page
@@ -0,0 +1,196 @@
+"""
+Candidate generation with MinHash signatures and locality-sensitive hashing (LSH).
+
+Articles whose shingle sets have a high Jaccard similarity are likely to share all
+rows of at least one band of their signatures, which puts them in the same bucket.
+Only pairs sharing a bucket are compared with the exact tf-idf cosine similarity.
+"""
+
+from typing import Iterator, List, Set, Tuple
+
+import zlib
+
+import numpy as np
+from numpy.typing import NDArray
+
+from sparse import CsrMatrix
+from pairs import SimilarPairs, match_similar
+from metrics import count, stage
+from progress import status
+
+# Prime above 2^32 used by the universal hash functions
+PRIME = 4294967311
+
+# Documents hashed per step while calculating signatures
+SIGNATURE_CHUNK_SIZE = 4096
+
+# Candidate pairs scored per step
+CANDIDATE_CHUNK_SIZE = 1 << 20
+
+
+def calc_shingles(document: List[str], size: int) -> Set[str]:
+    """
+    Returns the sets of `size` consecutive terms of the document. Documents shorter
+    than a shingle form a single shingle.
+    """
+
+    if len(document) <= size:
+        return {" ".join(document)} if len(document) > 0 else set()
+
+    return {
+        " ".join(document[offset : offset + size])
+        for offset in range(len(document) - size + 1)
+    }
+
+
+def calc_minhash_signatures(
+    documents: List[List[str]], permutations: int, shingle_size: int, seed: int
+) -> Tuple[NDArray[np.uint64], NDArray[np.bool_]]:
+    """
+    Calculates the MinHash signature of every document. Shingles are hashed with
+    crc32, so signatures are the same in every process and run.
+
+    Returns the signatures and which documents have at least one shingle. The
+    signatures of empty documents are meaningless.
+    """
+
+    generator = np.random.default_rng(seed)
+    a = generator.integers(1, 1 << 32, size=permutations, dtype=np.uint64)
+    b = generator.integers(0, PRIME, size=permutations, dtype=np.uint64)
+
+    signatures = np.zeros((len(documents), permutations), dtype=np.uint64)
+    has_shingles = np.zeros(len(documents), dtype=bool)
+
+    for chunk_start in range(0, len(documents), SIGNATURE_CHUNK_SIZE):
+        chunk = documents[chunk_start : chunk_start + SIGNATURE_CHUNK_SIZE]
+
+        hashes: List[int] = []
+        lengths: List[int] = []
+        for document in chunk:
+            shingles = calc_shingles(document, shingle_size)
+            hashes.extend(zlib.crc32(shingle.encode()) for shingle in shingles)
+            lengths.append(len(shingles))
+
+        if len(hashes) == 0:
+            continue
+
+        chunk_lengths = np.array(lengths, dtype=np.int64)
+        non_empty = np.flatnonzero(chunk_lengths)
+        starts = (np.cumsum(chunk_lengths) - chunk_lengths)[non_empty]
+
+        # (a * x + b) mod p for every shingle hash and permutation, reduced to the
+        # minimum per document
+        values = (np.array(hashes, dtype=np.uint64)[:, None] * a + b) % PRIME
+        signatures[chunk_start + non_empty] = np.minimum.reduceat(
+            values, starts, axis=0
+        )
+        has_shingles[chunk_start + non_empty] = True
+
+    return signatures, has_shingles
+
+
+def find_candidate_pairs(
+    signatures: NDArray[np.uint64],
+    has_shingles: NDArray[np.bool_],
+    bands: int,
+    rows: int,
+) -> Tuple[NDArray[np.int64], NDArray[np.int64]]:
+    """
+    Buckets the documents on every band of `rows` signature values and returns every
+    pair of documents sharing a bucket, with the lowest index first.
+    """
+
+    assert signatures.shape[1] >= bands * rows, "signatures are too short"
+
+    documents = np.flatnonzero(has_shingles)
+    pair_keys: List[NDArray[np.int64]] = []
+
+    for band in range(bands):
+        band_values = signatures[documents, band * rows : (band + 1) * rows]
+        [_, buckets] = np.unique(band_values, axis=0, return_inverse=True)
+        buckets = buckets.ravel()
+
+        order = np.argsort(buckets, kind="stable")
+        [_, bucket_starts, bucket_sizes] = np.unique(
+            buckets[order], return_index=True, return_counts=True
+        )
+
+        for [start, size] in zip(bucket_starts.tolist(), bucket_sizes.tolist()):
+            if size < 2:
+                continue
+
+            members = documents[order[start : start + size]]
+            [lhs, rhs] = np.triu_indices(size, 1)
+            pair_keys.append(members[lhs] * len(signatures) + members[rhs])
+
+    keys = np.unique(np.concatenate([np.zeros(0, dtype=np.int64), *pair_keys]))
+
+    return keys // len(signatures), keys % len(signatures)
+
+
+def iter_lsh_similar_pairs(
+    titles: List[List[str]],
+    descriptions: List[List[str]],
+    title_tf_idf_table: CsrMatrix,
+    description_tf_idf_table: CsrMatrix,
+    scored: NDArray[np.bool_],
+    has_description: NDArray[np.bool_],
+    threshold: float,
+    bands: int,
+    rows: int,
+    shingle_size: int,
+    seed: int,
+) -> Iterator[SimilarPairs]:
+    """
+    Yields the similar article pairs among the candidate pairs of the titles and
+    descriptions. Only pairs containing a scored article are checked.
+    """
+
+    with stage("candidates"):
+        lhs_candidates: List[NDArray[np.int64]] = []
+        rhs_candidates: List[NDArray[np.int64]] = []
+        for documents in [titles, descriptions]:
+            [signatures, has_shingles] = calc_minhash_signatures(
+                documents, bands * rows, shingle_size, seed
+            )
+            [lhs, rhs] = find_candidate_pairs(signatures, has_shingles, bands, rows)
+            lhs_candidates.append(lhs)
+            rhs_candidates.append(rhs)
+
+        keys = np.unique(
+            np.concatenate(lhs_candidates) * len(titles)
+            + np.concatenate(rhs_candidates)
+        )
+        lhs_indices, rhs_indices = keys // len(titles), keys % len(titles)
+
+        checked = scored[lhs_indices] | scored[rhs_indices]
+        lhs_indices, rhs_indices = lhs_indices[checked], rhs_indices[checked]
+    count("candidate_pairs", len(lhs_indices))
+
+    status(f"Checking `{len(lhs_indices)}` candidate pairs.")
+
+    for chunk_start in range(0, len(lhs_indices), CANDIDATE_CHUNK_SIZE):
+        lhs = lhs_indices[chunk_start : chunk_start + CANDIDATE_CHUNK_SIZE]
+        rhs = rhs_indices[chunk_start : chunk_start + CANDIDATE_CHUNK_SIZE]
+
+        with stage("multiply"):
+            title_similarities = title_tf_idf_table.multiply_row_pairs(
+                title_tf_idf_table, lhs, rhs
+            )
+            description_similarities = description_tf_idf_table.multiply_row_pairs(
+                description_tf_idf_table, lhs, rhs
+            )
+
+        with stage("extract_pairs"):
+            [similar, title_match] = match_similar(
+                title_similarities,
+                description_similarities,
+                has_description[lhs],
+                has_description[rhs],
+                threshold,
+            )
+            similarities = np.where(
+                title_match, title_similarities, description_similarities
+            )
+
+        yield lhs[similar], rhs[similar], similarities[similar], title_match[similar]
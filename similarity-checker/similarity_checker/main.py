@@ -3,367 +3,809 @@
 
 import asyncio
 
-import sys
-import re
-import math
-import string
+import os
+import logging
 from datetime import datetime
-import time
-from typing import List, Dict, Tuple, Set
+from typing import (
+    AsyncIterable,
+    Iterator,
+    List,
+    Dict,
+    Tuple,
+    Sequence,
+    Set,
+    Optional,
+    Union,
+)
 
-from prisma.models import NewsArticles
 from prisma import Prisma
+from prisma.enums import Language
 
 import numpy as np
 from numpy.typing import NDArray
 
-from utils import filter_stop_words, filter_numerics
+from sparse import CsrMatrix
+from pairs import SimilarPairs, collect_similar_pairs
+from vocabulary import Vocabulary, build_term_frequency_table
+from hashing import build_hashed_term_frequency_table
+from incremental import CorpusState, calc_document_frequencies, should_rebuild
+from store import Corpus, TermStore
+from tokenizer import Tokenizer
+from loader import ArticleRow, iter_article_pages, iter_pages
+from cluster import update_clusters
+from neighbours import PrunedPairs, StoredPairs, select_neighbours
+from lsh import iter_lsh_similar_pairs
+from background import iter_in_thread
+from inverted import iter_inverted_similar_pairs
+from parallel import iter_parallel_similar_pairs
+from window import (
+    calc_publication_times,
+    filter_window_pairs,
+    iter_window_similar_pairs,
+)
+from writer import SimilarArticlesWriter, load_existing_pairs
+from checkpoint import (
+    NO_UNIT,
+    RunCheckpoint,
+    assign_units,
+    calc_run_fingerprint,
+    load_last_article_id,
+)
+from trigger import ArticlesModifiedTrigger
+from metrics import count, registry, serve_metrics, stage
+from progress import configure, logger, status, update
+from config import (
+    SIMILARITY_INCREMENTAL,
+    SIMILARITY_IDF_DRIFT_BOUND,
+    SIMILARITY_MEMORY_BUDGET_MB,
+    SIMILARITY_WRITE_BATCH_SIZE,
+    SIMILARITY_WRITE_FLUSH_INTERVAL,
+    SIMILARITY_TOKENIZER_WORKERS,
+    SIMILARITY_TOKENIZER_CHUNK_SIZE,
+    SIMILARITY_CANDIDATES,
+    SIMILARITY_LSH_BANDS,
+    SIMILARITY_LSH_ROWS,
+    SIMILARITY_LSH_SHINGLE_SIZE,
+    SIMILARITY_LSH_SEED,
+    SIMILARITY_STORE_PATH,
+    SIMILARITY_NOTIFY,
+    SIMILARITY_TRIGGER_DEBOUNCE,
+    SIMILARITY_TRIGGER_MAX_DELAY,
+    SIMILARITY_POLL_INTERVAL,
+    SIMILARITY_WINDOW_HOURS,
+    SIMILARITY_UNDATED_POLICY,
+    SIMILARITY_METRICS_PORT,
+    SIMILARITY_METRICS_LOG,
+    SIMILARITY_PROGRESS,
+    SIMILARITY_PROGRESS_INTERVAL,
+    SIMILARITY_PAGE_SIZE,
+    SIMILARITY_PRODUCT_WORKERS,
+    SIMILARITY_CROSS_LANGUAGE,
+    SIMILARITY_SYNC_EPSILON,
+    SIMILARITY_CHECKPOINT_ROWS,
+    SIMILARITY_TOP_K,
+    SIMILARITY_HASH_FEATURES,
+    SIMILARITY_IDF_CUTOFF,
+    SIMILARITY_PIPELINE_DEPTH,
+)
 
 THRESHOLD = 0.65
 
 
 async def main():
+    configure(SIMILARITY_PROGRESS, SIMILARITY_PROGRESS_INTERVAL)
+
     db = Prisma()
     await db.connect()
 
-    # interval in milliseconds
-    interval = 4.0e6
+    update_override = True
 
-    delta = 0.0
-    last_time = datetime.now()
+    # Kept between runs and restarts to only tokenize and score new articles
+    corpus = Corpus(SIMILARITY_STORE_PATH or None)
 
-    update_override = True
+    # Wakes up on modified articles, the flags are only polled as a fallback
+    trigger = ArticlesModifiedTrigger(
+        os.environ.get("DATABASE_URL") if SIMILARITY_NOTIFY else None,
+        SIMILARITY_TRIGGER_DEBOUNCE,
+        SIMILARITY_TRIGGER_MAX_DELAY,
+        SIMILARITY_POLL_INTERVAL,
+    )
+    trigger.start()
+
+    if SIMILARITY_METRICS_PORT > 0:
+        serve_metrics(SIMILARITY_METRICS_PORT)
 
     while True:
-        now = datetime.now()
-        delta += (now - last_time).total_seconds() * 1e6 / interval
-        last_time = now
-
-        if delta >= 1:
-            delta -= 1
-
-            retry_count = 0
-            while not db.is_connected():
-                if retry_count >= 4:
-                    raise Exception(
-                        "Connecting to database failed 4 times. Aborting application!"
-                    )
+        notified = False
+        if not update_override:
+            notified = await trigger.wait()
+
+        retry_count = 0
+        while not db.is_connected():
+            if retry_count >= 4:
+                raise Exception(
+                    "Connecting to database failed 4 times. Aborting application!"
+                )
 
-                try:
-                    await db.connect()
-                except Exception:
-                    retry_count += 1
+            try:
+                await db.connect()
+            except Exception:
+                retry_count += 1
+                await asyncio.sleep(retry_count)
 
-            should_check = await db.flags.find_unique(
-                where={"name": "articles_modified"}
-            )
+        should_check = await db.flags.find_unique(where={"name": "articles_modified"})
+        full_rebuild = await db.flags.find_unique(
+            where={"name": "similarity_full_rebuild"}
+        )
 
-            if should_check is None:
-                await db.flags.create({"name": "articles_modified", "value": False})
-            elif should_check.value is False and not update_override:
-                print(
-                    "Nothing modified. Not running similarity checker.", file=sys.stderr
-                )
-                time.sleep(2)
-                continue
+        if full_rebuild is None:
+            await db.flags.create({"name": "similarity_full_rebuild", "value": False})
+        elif full_rebuild.value is True:
+            update_override = True
+            corpus.clear()
 
-            raw_articles = await db.newsarticles.find_many(include={"source": True})
+        if should_check is None:
+            await db.flags.create({"name": "articles_modified", "value": False})
+        elif should_check.value is False and not update_override and not notified:
+            status("Nothing modified. Not running similarity checker.")
+            continue
 
-            await calc_article_similarity(raw_articles, db)
+        registry.start_run()
 
-            await db.flags.update(
-                where={"name": "articles_modified"}, data={"value": False}
-            )
+        if not SIMILARITY_INCREMENTAL:
+            corpus.state = CorpusState()
+
+        await calc_article_similarity(
+            iter_article_pages(db, SIMILARITY_PAGE_SIZE), db, corpus
+        )
+        registry.finish_run(SIMILARITY_METRICS_LOG or None)
+
+        await db.flags.update(
+            where={"name": "articles_modified"}, data={"value": False}
+        )
+        await db.flags.update(
+            where={"name": "similarity_full_rebuild"}, data={"value": False}
+        )
 
-            update_override = False
+        update_override = False
 
 
 async def calc_article_similarity(
-    database_articles: List[NewsArticles], client: Prisma
+    database_articles: Union[Sequence[ArticleRow], AsyncIterable[List[ArticleRow]]],
+    client: Prisma,
+    corpus: Optional[Corpus] = None,
 ) -> Dict[int, Set[int]]:
     """
     Calculates the similarity between articles using tf-idf to vectorize text and uses
-    cosine similarity.
-
-    Due to performance reasons (for 1000 articles it takes about 15 minutes) it inserts
-    the similar markers immediately into the database.
+    cosine similarity. The articles are given as a list or as pages of articles, only
+    one page of titles and descriptions is kept in memory.
+
+    The term stores of the corpus are synced with the given articles, so only articles
+    that were not tokenized by a previous run are tokenized. Only articles added since
+    the previous run are scored against the corpus, unless the idf weights drifted too
+    far. Without a corpus all articles are tokenized and scored. Articles are only
+    compared within their language, unless `SIMILARITY_CROSS_LANGUAGE` is set.
+
+    Similar pairs that differ from the stored pairs are written to the database in
+    batches while the similarity tables are still being computed. Stored pairs of
+    scored articles that were not found again are deleted afterwards.
     """
 
-    raw_articles: List[str] = [article.title for article in database_articles]
-    raw_descriptions: List[str] = [
-        article.description or "" for article in database_articles
-    ]
+    if corpus is None:
+        corpus = Corpus()
+
+    article_ids: List[int] = []
+    source_ids: List[int] = []
+    languages: List[Language] = []
+    publication_dates: List[Optional[datetime]] = []
+    cluster_ids: List[Optional[int]] = []
+    latest_in_cluster: List[bool] = []
+
+    # A single pool of tokenizer processes is shared by every page
+    with Tokenizer(
+        SIMILARITY_TOKENIZER_WORKERS, SIMILARITY_TOKENIZER_CHUNK_SIZE
+    ) as tokenizer:
+        async for page in iter_pages(database_articles):
+            page_ids = [article.id for article in page]
+            page_languages = [article.language for article in page]
+
+            # Remove punctuation, convert to lowercase, split on whitespace and remove
+            # numbers and stopwords. Only articles that are not stored yet are
+            # tokenized.
+            with stage("tokenize"):
+                for [store, texts] in [
+                    (corpus.titles, [article.title for article in page]),
+                    (
+                        corpus.descriptions,
+                        [article.description or "" for article in page],
+                    ),
+                ]:
+                    store.add(page_ids, texts, page_languages, tokenizer)
+
+            article_ids.extend(page_ids)
+            source_ids.extend(article.source_id for article in page)
+            languages.extend(page_languages)
+            publication_dates.extend(article.publication_date for article in page)
+            cluster_ids.extend(article.cluster_id for article in page)
+            latest_in_cluster.extend(article.latest_in_cluster for article in page)
+
+    # Articles removed from the database are dropped from the stores
+    with stage("tokenize"):
+        corpus.titles.retain(article_ids)
+        corpus.descriptions.retain(article_ids)
+
+    status(f"Starting similarity checker on list of `{len(article_ids)}` articles.")
+
+    # Both stores contain the same articles, sorted by id
+    positions = corpus.titles.positions(article_ids)
+
+    count("articles", len(article_ids))
+    count("title_vocabulary", len(corpus.titles.vocabulary))
+    count("description_vocabulary", len(corpus.descriptions.vocabulary))
+
+    title_document_frequencies = calc_document_frequencies(
+        np.asarray(corpus.titles.document_frequencies), corpus.titles.vocabulary
+    )
+    description_document_frequencies = calc_document_frequencies(
+        np.asarray(corpus.descriptions.document_frequencies),
+        corpus.descriptions.vocabulary,
+    )
 
-    print(
-        f"Starting similarity checker on list of `{len(raw_articles)}` articles.",
-        file=sys.stderr,
+    corpus_state = corpus.state
+    full_run = should_rebuild(
+        corpus_state,
+        len(article_ids),
+        title_document_frequencies,
+        description_document_frequencies,
+        SIMILARITY_IDF_DRIFT_BOUND,
     )
 
-    # Remove whitespace, punctuation and convert to lowercase
-    cleaned_articles: List[str] = [
-        re.sub(r"\s+", " ", article)
-        .translate(str.maketrans("", "", string.punctuation))
-        .lower()
-        for article in raw_articles
-    ]
-    cleaned_description: List[str] = [
-        re.sub(r"\s+", " ", article)
-        .translate(str.maketrans("", "", string.punctuation))
-        .lower()
-        for article in raw_descriptions
-    ]
-    # Split articles by whitespace and remove stopwords
-    articles = [article.split() for article in cleaned_articles]
-    articles = [filter_numerics(article) for article in articles]
-    articles = [
-        filter_stop_words(article, database_articles[idx].language)
-        for [idx, article] in enumerate(articles)
-    ]
-    descriptions = [description.split() for description in cleaned_description]
-    descriptions = [filter_numerics(description) for description in descriptions]
-    descriptions = [
-        filter_stop_words(description, database_articles[idx].language)
-        for [idx, description] in enumerate(descriptions)
-    ]
-
-    article_tf_idf_table = calc_tf_idf(articles)
-    description_tf_idf_table = calc_tf_idf(descriptions)
+    # Articles inserted after an interrupted run started are left for the next run,
+    # so the resumed run scores the same articles. A checkpoint that does not end
+    # after the saved state belongs to a run that already saved its state.
+    checkpoint_path = (
+        os.path.join(corpus.path, "checkpoint.json") if corpus.path else None
+    )
+    last_article_id = load_last_article_id(checkpoint_path)
+    if last_article_id is None or (
+        corpus_state.last_article_id is not None
+        and last_article_id <= corpus_state.last_article_id
+    ):
+        last_article_id = max(article_ids) if len(article_ids) > 0 else None
+
+    # Articles that are scored against all other articles
+    ids = np.array(article_ids, dtype=np.int64)
+    scored = np.full(len(ids), full_run, dtype=bool)
+    if corpus_state.last_article_id is not None:
+        scored |= ids > corpus_state.last_article_id
+    if last_article_id is not None:
+        scored &= ids <= last_article_id
+    scored_indices = np.flatnonzero(scored)
+    count("scored_articles", len(scored_indices))
+
+    if not full_run:
+        status(f"Scoring `{len(scored_indices)}` new articles against the corpus.")
+
+    # Only the difference with the pairs stored by previous runs is written
+    existing_pairs = await load_existing_pairs(client, SIMILARITY_PAGE_SIZE)
+    count("existing_pairs", len(existing_pairs))
+
+    # Stored pairs of articles that are not scored, to rank their neighbours
+    stored_pairs: StoredPairs = (
+        np.zeros(0, dtype=np.int64),
+        np.zeros(0, dtype=np.int64),
+        np.zeros(0, dtype=np.float64),
+    )
+    if SIMILARITY_TOP_K > 0:
+        known, lhs_indices, rhs_indices = existing_pairs.article_indices(ids)
+        stored = np.flatnonzero(known & ~scored[lhs_indices] & ~scored[rhs_indices])
+        stored_pairs = (
+            lhs_indices[stored],
+            rhs_indices[stored],
+            existing_pairs.similarities[stored],
+        )
 
     similar: Dict[int, Set[int]] = {}
+    writer = SimilarArticlesWriter(
+        client,
+        SIMILARITY_WRITE_BATCH_SIZE,
+        SIMILARITY_WRITE_FLUSH_INTERVAL,
+        existing_pairs,
+        SIMILARITY_SYNC_EPSILON,
+    )
 
-    title_cosine_similarity_table = np.matmul(
-        article_tf_idf_table, article_tf_idf_table.T
+    publication_times = calc_publication_times(publication_dates)
+
+    # Articles are only compared within their language, unless cross-language
+    # comparison is enabled. Every language has its own vocabulary and idf weights.
+    if SIMILARITY_CROSS_LANGUAGE:
+        partitions = [np.arange(len(article_ids), dtype=np.int64)]
+    else:
+        partitions = [
+            np.flatnonzero([language == partition for language in languages])
+            for partition in Language
+        ]
+
+    # Scored articles are split into units that are checked, written and
+    # checkpointed one at a time, so a restarted run continues where it stopped
+    article_units, units = assign_units(partitions, scored, SIMILARITY_CHECKPOINT_ROWS)
+    checkpoint = RunCheckpoint(
+        checkpoint_path,
+        calc_run_fingerprint(
+            (None if full_run else corpus_state.last_article_id, last_article_id),
+            len(scored_indices),
+            {
+                "threshold": THRESHOLD,
+                "candidates": SIMILARITY_CANDIDATES,
+                "lsh": [
+                    SIMILARITY_LSH_BANDS,
+                    SIMILARITY_LSH_ROWS,
+                    SIMILARITY_LSH_SHINGLE_SIZE,
+                    SIMILARITY_LSH_SEED,
+                ],
+                "window_hours": SIMILARITY_WINDOW_HOURS,
+                "undated_policy": SIMILARITY_UNDATED_POLICY,
+                "cross_language": SIMILARITY_CROSS_LANGUAGE,
+                "unit_size": SIMILARITY_CHECKPOINT_ROWS,
+                "top_k": SIMILARITY_TOP_K,
+                "idf_cutoff": SIMILARITY_IDF_CUTOFF,
+                "hash_features": SIMILARITY_HASH_FEATURES,
+            },
+        ),
+        last_article_id,
     )
-    description_cosine_similarity_table = np.matmul(
-        description_tf_idf_table, description_tf_idf_table.T
+    # Written before any pair, so an interrupted run always leaves its checkpoint
+    checkpoint.save()
+    if len(checkpoint.completed) > 0:
+        status(
+            f"Resuming the run, `{len(checkpoint.completed)}` of `{units}` units "
+            + "were completed."
+        )
+
+    status("Checking cosine similarities...")
+    possible_updates = 0
+    # The pairs are computed in a separate thread while the previous ones are written
+    unit_similar_pairs = iter_in_thread(
+        iter_units_similar_pairs(
+            corpus,
+            positions,
+            partitions,
+            article_units,
+            set(checkpoint.completed),
+            publication_times,
+            stored_pairs,
+        ),
+        SIMILARITY_PIPELINE_DEPTH,
     )
+    try:
+        async for [unit, similar_pairs] in unit_similar_pairs:
+            if similar_pairs is None:
+                # Every pair of the unit is written, the stored pairs it did not find
+                # again are deleted before the unit is completed
+                await writer.flush()
+                await writer.delete_missing(ids, article_units, unit)
+                checkpoint.complete(unit)
+                update("Completed units", len(checkpoint.completed), units)
+                continue
 
-    # Check every article against every other article
-    print("Checking cosine similarities...", file=sys.stderr)
-    for lhs_article_idx in range(len(articles)):
-        for rhs_article_idx in range(lhs_article_idx + 1, len(articles)):
-            article1, article2 = (
-                database_articles[lhs_article_idx],
-                database_articles[rhs_article_idx],
-            )
-            assert article1.source is not None and article2.source is not None
+            if isinstance(similar_pairs, PrunedPairs):
+                await writer.delete(
+                    list(
+                        zip(
+                            ids[similar_pairs.lhs_indices].tolist(),
+                            ids[similar_pairs.rhs_indices].tolist(),
+                        )
+                    )
+                )
+                count("pairs_pruned", len(similar_pairs.lhs_indices))
+                continue
 
-            title_similarity = title_cosine_similarity_table[lhs_article_idx][
-                rhs_article_idx
-            ]
-            description_similarity = description_cosine_similarity_table[
-                lhs_article_idx
-            ][rhs_article_idx]
-
-            sys.stdout.write(
-                "\r"
-                + "\033[2K"
-                + f"Article `{lhs_article_idx}` == Article `{rhs_article_idx}`: "
-                + f"{title_similarity}".expandtabs(2)
-                + f"/{description_similarity}".expandtabs(2)
-                + "\r"
+            count("similar_pairs", len(similar_pairs[0]))
+
+            # Only the similar pairs are visited
+            pairs: List[Tuple[int, int, float, bool]] = list(
+                zip(*[values.tolist() for values in similar_pairs])  # type: ignore
             )
+            for [lhs_article_idx, rhs_article_idx, similarity, title_match] in pairs:
+                [lhs_source_id, rhs_source_id] = [
+                    source_ids[lhs_article_idx],
+                    source_ids[rhs_article_idx],
+                ]
+
+                # Formatting the details is only worth it when they are logged
+                if logger.isEnabledFor(logging.DEBUG):
+                    [lhs_terms, rhs_terms] = corpus.titles.documents(
+                        positions[[lhs_article_idx, rhs_article_idx]]
+                    )
+                    logger.debug(
+                        "Found:\n\t`%s`\n\t%s\n\t==\n\t`%s`\n\t%s\n%s: %s",
+                        " ".join(lhs_terms),
+                        f"source {lhs_source_id}",
+                        " ".join(rhs_terms),
+                        f"source {rhs_source_id}",
+                        "similarity" if title_match else "description similarity",
+                        similarity,
+                    )
 
-            if title_similarity > THRESHOLD:
-                sys.stdout.write(
-                    "\n"
-                    + f"Found:\n\t`{' '.join(articles[lhs_article_idx])}`\n"
-                    + "\t"
-                    + article1.source.name
-                    + "\n\t=="
-                    + f"\n\t`{' '.join(articles[rhs_article_idx])}\n"
-                    + "\t"
-                    + article2.source.name
-                    + f"\nsimilarity: {title_similarity}`"
-                    + "\n"
-                )
+                if lhs_source_id == rhs_source_id:
+                    possible_updates += 1
+                    logger.debug("Found a possible update! (source %s)", lhs_source_id)
 
-                if article1.source.id == article2.source.id:
-                    print(
-                        f"Found a possible update! ({article1.source.name})",
-                        file=sys.stderr,
-                    )
+                similar.setdefault(lhs_article_idx, set()).add(rhs_article_idx)
+                similar.setdefault(rhs_article_idx, set()).add(lhs_article_idx)
 
-                similar[lhs_article_idx] = set(
-                    [*similar.get(lhs_article_idx, []), rhs_article_idx]
-                )
-                similar[rhs_article_idx] = set(
-                    [*similar.get(rhs_article_idx, []), lhs_article_idx]
+                await writer.add(
+                    article_ids[lhs_article_idx],
+                    article_ids[rhs_article_idx],
+                    similarity,
                 )
 
-                # Insert into database
-                await insert_similar_article_pair_into_db(
-                    article1,
-                    article2,
-                    title_similarity,
-                    client,
-                )
-            elif (
-                title_similarity > np.finfo(float).eps
-                and description_similarity > THRESHOLD
-                and not (
-                    descriptions[lhs_article_idx] == []
-                    or descriptions[rhs_article_idx] == []
+            await writer.flush_if_due()
+    finally:
+        # Stops the thread when the run fails before all pairs are consumed
+        await unit_similar_pairs.aclose()
+
+    await writer.close()
+
+    status(
+        f"Found `{sum(len(indices) for indices in similar.values()) // 2}` similar "
+        + f"pairs, `{possible_updates}` of which are possible updates."
+    )
+
+    # Clusters are computed from all pairs in the database, including the pairs of
+    # previous runs
+    cluster_updates = await update_clusters(
+        client,
+        article_ids,
+        source_ids,
+        publication_times,
+        cluster_ids,
+        latest_in_cluster,
+        SIMILARITY_PAGE_SIZE,
+    )
+    status(f"Updated the story cluster of `{cluster_updates}` articles.")
+
+    if last_article_id is not None:
+        corpus_state.last_article_id = last_article_id
+
+    if full_run:
+        corpus_state.documents = len(article_ids)
+        corpus_state.title_document_frequencies = title_document_frequencies
+        corpus_state.description_document_frequencies = description_document_frequencies
+
+    with stage("save"):
+        corpus.save()
+        checkpoint.finish()
+
+    return similar
+
+
+def iter_units_similar_pairs(
+    corpus: Corpus,
+    positions: NDArray[np.int64],
+    partitions: List[NDArray[np.int64]],
+    article_units: NDArray[np.int64],
+    completed_units: Set[int],
+    publication_times: NDArray[np.float64],
+    stored_pairs: StoredPairs,
+) -> Iterator[Tuple[int, Union[SimilarPairs, PrunedPairs, None]]]:
+    """
+    Yields the similar pairs of every unit that is not completed yet, followed by
+    `None` once all pairs of the unit are yielded. Pairs are owned by the earliest
+    unit of their articles, so every pair is yielded by a single unit.
+
+    With a top-k limit, the neighbours are ranked over all scored articles of a
+    partition first, together with the `stored_pairs` of the articles that are not
+    scored. The stored pairs that drop out are yielded by the last unit of the
+    partition.
+
+    The tables of a partition are only built when one of its units is not completed.
+    """
+
+    for partition in partitions:
+        units = article_units[partition]
+        remaining_units = [
+            unit
+            for unit in np.unique(units[units != NO_UNIT]).tolist()
+            if unit not in completed_units
+        ]
+        if len(remaining_units) == 0:
+            continue
+
+        partition_positions = positions[partition]
+        partitioned = len(partition) < len(positions)
+
+        with stage("tf_idf"):
+            [title_table, description_table] = [
+                (
+                    calc_hashed_tf_idf(
+                        store, partition_positions, SIMILARITY_HASH_FEATURES
+                    )
+                    if SIMILARITY_HASH_FEATURES > 0
+                    else (
+                        calc_partition_tf_idf(store, partition_positions)
+                        if partitioned
+                        else calc_store_tf_idf(store, partition_positions)
+                    )
                 )
-            ):
-                sys.stdout.write(
-                    "\n"
-                    f"Found:\n\t`{' '.join(articles[lhs_article_idx])}`\n"
-                    + "\t"
-                    + article1.source.name
-                    + "\n\t=="
-                    + f"\n\t`{' '.join(articles[rhs_article_idx])}\n"
-                    + "\t"
-                    + article2.source.name
-                    + f"\ndescription similarity: {description_similarity}`"
-                    + "\n"
+                for store in [corpus.titles, corpus.descriptions]
+            ]
+
+        if SIMILARITY_TOP_K > 0:
+            # Neighbours are ranked over all pairs of the partition before they are
+            # split into units, so the kept pairs do not depend on the unit size
+            partition_indices = np.full(len(positions), -1, dtype=np.int64)
+            partition_indices[partition] = np.arange(len(partition), dtype=np.int64)
+            stored_lhs, stored_rhs, stored_similarities = (
+                partition_indices[stored_pairs[0]],
+                partition_indices[stored_pairs[1]],
+                stored_pairs[2],
+            )
+            inside = (stored_lhs >= 0) & (stored_rhs >= 0)
+
+            [similar_pairs, pruned] = select_neighbours(
+                collect_similar_pairs(
+                    iter_similar_pairs(
+                        corpus,
+                        partition_positions,
+                        title_table,
+                        description_table,
+                        units != NO_UNIT,
+                        publication_times[partition],
+                    )
+                ),
+                (
+                    stored_lhs[inside],
+                    stored_rhs[inside],
+                    stored_similarities[inside],
+                ),
+                SIMILARITY_TOP_K,
+            )
+            owners = np.minimum(units[similar_pairs[0]], units[similar_pairs[1]])
+
+            for unit in remaining_units:
+                owned = owners == unit
+                yield unit, (
+                    partition[similar_pairs[0][owned]],
+                    partition[similar_pairs[1][owned]],
+                    similar_pairs[2][owned],
+                    similar_pairs[3][owned],
                 )
 
-                if article1.source.id == article2.source.id:
-                    print(
-                        f"Found a possible update! ({article1.source.name})",
-                        file=sys.stderr,
+                if unit == remaining_units[-1]:
+                    yield unit, PrunedPairs(
+                        partition[pruned.lhs_indices], partition[pruned.rhs_indices]
                     )
 
-                similar[lhs_article_idx] = set(
-                    [*similar.get(lhs_article_idx, []), rhs_article_idx]
-                )
-                similar[rhs_article_idx] = set(
-                    [*similar.get(rhs_article_idx, []), lhs_article_idx]
+                yield unit, None
+
+            continue
+
+        for unit in remaining_units:
+            earlier = units < unit
+            for [
+                lhs_indices,
+                rhs_indices,
+                similarities,
+                via_title,
+            ] in iter_similar_pairs(
+                corpus,
+                partition_positions,
+                title_table,
+                description_table,
+                units == unit,
+                publication_times[partition],
+            ):
+                # Pairs with an article of an earlier unit were found by that unit
+                kept = ~(earlier[lhs_indices] | earlier[rhs_indices])
+
+                # Indices within the partition are mapped back to all articles
+                yield unit, (
+                    partition[lhs_indices[kept]],
+                    partition[rhs_indices[kept]],
+                    similarities[kept],
+                    via_title[kept],
                 )
 
-                # Insert into database
-                await insert_similar_article_pair_into_db(
-                    article1,
-                    article2,
-                    description_similarity,
-                    client,
-                )
-    return similar
+            yield unit, None
 
 
-async def insert_similar_article_pair_into_db(
-    article1: NewsArticles, article2: NewsArticles, similarity: float, client: Prisma
-):
-    await client.similararticles.upsert(
-        where={
-            "id1_id2": {
-                "id1": article1.id,
-                "id2": article2.id,
-            }
-        },
-        data={
-            "create": {
-                "id1": article1.id,
-                "id2": article2.id,
-                "similarity": similarity,
-            },
-            "update": {"similarity": similarity},
-        },
-    )
+def iter_similar_pairs(
+    corpus: Corpus,
+    positions: NDArray[np.int64],
+    article_tf_idf_table: CsrMatrix,
+    description_tf_idf_table: CsrMatrix,
+    scored: NDArray[np.bool_],
+    publication_times: NDArray[np.float64],
+) -> Iterator[SimilarPairs]:
+    """
+    Yields the similar pairs of the scored articles in the tables with the configured
+    candidate mode. `positions` are the store positions of the rows of the tables.
+    With a top-k limit, the pairs still have to be ranked, see `select_neighbours`.
+    """
 
-    await client.similararticles.upsert(
-        where={
-            "id1_id2": {
-                "id1": article2.id,
-                "id2": article1.id,
-            }
-        },
-        data={
-            "create": {
-                "id1": article2.id,
-                "id2": article1.id,
-                "similarity": similarity,
-            },
-            "update": {"similarity": similarity},
-        },
-    )
+    has_description = description_tf_idf_table.row_lengths() > 0
+
+    window = SIMILARITY_WINDOW_HOURS * 60 * 60
+
+    if SIMILARITY_CANDIDATES == "lsh":
+        # Only check candidate pairs found with locality-sensitive hashing
+        similar_pair_batches = iter_lsh_similar_pairs(
+            corpus.titles.documents(positions),
+            corpus.descriptions.documents(positions),
+            article_tf_idf_table,
+            description_tf_idf_table,
+            scored,
+            has_description,
+            THRESHOLD,
+            SIMILARITY_LSH_BANDS,
+            SIMILARITY_LSH_ROWS,
+            SIMILARITY_LSH_SHINGLE_SIZE,
+            SIMILARITY_LSH_SEED,
+        )
+
+        if window > 0:
+            similar_pair_batches = (
+                filter_window_pairs(
+                    similar_pairs,
+                    publication_times,
+                    window,
+                    SIMILARITY_UNDATED_POLICY,
+                )
+                for similar_pairs in similar_pair_batches
+            )
+    elif SIMILARITY_CANDIDATES == "inverted":
+        # Only check pairs whose titles share a term, found with the posting lists of
+        # the title terms. Rows are only limited to their neighbours without a window,
+        # as the window drops pairs after they are ranked.
+        similar_pair_batches = iter_inverted_similar_pairs(
+            article_tf_idf_table,
+            description_tf_idf_table,
+            scored,
+            has_description,
+            THRESHOLD,
+            SIMILARITY_MEMORY_BUDGET_MB * 1024 * 1024,
+            SIMILARITY_IDF_CUTOFF,
+            SIMILARITY_TOP_K if window <= 0 else 0,
+        )
+
+        if window > 0:
+            similar_pair_batches = (
+                filter_window_pairs(
+                    similar_pairs,
+                    publication_times,
+                    window,
+                    SIMILARITY_UNDATED_POLICY,
+                )
+                for similar_pairs in similar_pair_batches
+            )
+    elif window > 0:
+        # Only check articles published within the window of every scored article
+        similar_pair_batches = iter_window_similar_pairs(
+            article_tf_idf_table,
+            description_tf_idf_table,
+            scored,
+            has_description,
+            publication_times,
+            window,
+            SIMILARITY_UNDATED_POLICY,
+            THRESHOLD,
+            SIMILARITY_MEMORY_BUDGET_MB * 1024 * 1024,
+            SIMILARITY_TOP_K,
+        )
+    else:
+        # Check every scored article against every other article. The similarity
+        # tables are computed in blocks of rows by a pool of workers, so only a few
+        # blocks are kept in memory.
+        similar_pair_batches = iter_parallel_similar_pairs(
+            article_tf_idf_table,
+            description_tf_idf_table,
+            scored,
+            has_description,
+            THRESHOLD,
+            SIMILARITY_MEMORY_BUDGET_MB * 1024 * 1024,
+            SIMILARITY_PRODUCT_WORKERS,
+            SIMILARITY_TOP_K,
+        )
+
+    return similar_pair_batches
 
 
 def calc_tf_idf(
     documents: List[List[str]],
-) -> NDArray[np.float32]:
-    words: NDArray[np.str_] = np.unique(  # type: ignore
-        [word for document in documents for word in document]
-    )
-    words.sort()
-
-    # Term frequencies per document
-    tf_table = np.zeros([len(documents), len(words)])
+    vocabulary: Optional[Vocabulary] = None,
+    features: int = 0,
+) -> CsrMatrix:
+    """
+    Calculates the row normalized tf-idf table of the documents. The table is sparse,
+    its memory usage grows with the amount of terms in the documents instead of the
+    amount of documents times the vocabulary size.
 
-    for [i, document] in enumerate(documents):
-        document_tf_array = calc_norm_term_freq(document, words)
-        tf_table[i] = document_tf_array
+    The columns of the table are the term ids of the vocabulary, or the `features`
+    hashed columns of the terms when it is positive.
+    """
 
-    # Amount of documents containing the word
-    df_counts = np.count_nonzero(tf_table, axis=0)  # type: ignore
+    if vocabulary is None:
+        vocabulary = Vocabulary()
 
-    idf_counts = len(words) / df_counts
+    # Term frequencies per document
+    tf_table = (
+        build_hashed_term_frequency_table(documents, features)
+        if features > 0
+        else build_term_frequency_table(documents, vocabulary)
+    )
 
-    # Muliply every row element-wise with the idf_counts col vector
-    tf_table *= idf_counts.T
+    # Amount of documents containing the word. Empty documents are counted for every
+    # word, matching the dense table where their rows were filled with NaN.
+    df_counts = tf_table.count_nonzero_columns() + np.count_nonzero(
+        tf_table.row_lengths() == 0
+    )
 
-    # Normalize rows
-    tf_table /= np.linalg.norm(tf_table, axis=1, keepdims=True)  # type: ignore
+    apply_idf(tf_table, df_counts)
 
     return tf_table
 
 
-def calc_norm_term_freq(
-    document: List[str], words: NDArray[np.str_]
-) -> NDArray[np.float32]:
-    tf_array = np.zeros(len(words), dtype=float)
+def calc_partition_tf_idf(store: TermStore, positions: NDArray[np.int64]) -> CsrMatrix:
+    """
+    Calculates the row normalized tf-idf table of a partition of the stored articles.
+    Only the terms used by the partition are columns, and their document frequencies
+    are counted within the partition.
+    """
+
+    tf_table, _ = store.term_frequency_table(positions).compact_columns()
+    df_counts = tf_table.count_nonzero_columns() + np.count_nonzero(
+        tf_table.row_lengths() == 0
+    )
+
+    apply_idf(tf_table, df_counts)
 
-    # Count terms occurrences in document
-    unique_words, word_count = np.unique(document, return_counts=True)  # type: ignore
-    for [i, word] in enumerate(unique_words):
-        idx = np.where(words == word)[0][0]  # type: ignore
-        tf_array[idx] = word_count[i]
+    return tf_table
 
-    # Normalize counts
-    tf_array /= np.sum(tf_array)  # type: ignore
 
-    return tf_array  # type: ignore
+def calc_store_tf_idf(store: TermStore, positions: NDArray[np.int64]) -> CsrMatrix:
+    """
+    Calculates the row normalized tf-idf table of the stored articles at the given
+    rows, using the document frequencies kept by the store.
+    """
 
+    tf_table = store.term_frequency_table(positions)
+    apply_idf(
+        tf_table, np.asarray(store.document_frequencies) + store.empty_documents()
+    )
 
-def calc_idf(terms: List[str], documents: List[List[str]]) -> Dict[str, float]:
-    idf_table: Dict[str, float] = {}
+    return tf_table
 
-    # Count term occurrence over documents
-    for term in terms:
-        for document in documents:
-            if term in document:
-                idf_table[term] = idf_table.get(term, 0) + 1
 
-    # Normalize counts
-    for term in idf_table.keys():
-        idf_table[term] = math.log(len(documents) / idf_table[term], 2)
+def calc_hashed_tf_idf(
+    store: TermStore, positions: NDArray[np.int64], features: int
+) -> CsrMatrix:
+    """
+    Calculates the row normalized tf-idf table of the stored articles at the given
+    rows, with the terms hashed into `features` columns. The document frequencies are
+    counted per hashed column within the rows.
+    """
 
-    return idf_table
+    tf_table = store.hashed_term_frequency_table(positions, features)
+    df_counts = tf_table.count_nonzero_columns() + np.count_nonzero(
+        tf_table.row_lengths() == 0
+    )
 
+    apply_idf(tf_table, df_counts)
 
-def extract_tf_idf_values(
-    table: Dict[str, Tuple[List[float], float]], article_index: int
-) -> Dict[str, float]:
-    return {
-        term: tf_values[article_index] * idf
-        for [term, [tf_values, idf]] in table.items()
-    }
+    return tf_table
 
 
-def cos_similarity(lhs: Dict[str, float], rhs: Dict[str, float]):
-    assert lhs.keys() == rhs.keys()
+def apply_idf(tf_table: CsrMatrix, df_counts: NDArray[np.int64]):
+    # Terms that are only left in the vocabulary by removed articles have no documents,
+    # no stored value uses their weight
+    idf_counts = tf_table.shape[1] / np.maximum(df_counts, 1)
 
-    # Calculate dot product of both vectors along with the length
-    dot_product = 0
-    lhs_length_squared = 0
-    rhs_length_squared = 0
-    for [lhs_tf_idf, rhs_tf_idf] in zip(lhs.values(), rhs.values()):
-        dot_product += lhs_tf_idf * rhs_tf_idf
-        lhs_length_squared += pow(lhs_tf_idf, 2)
-        rhs_length_squared += pow(rhs_tf_idf, 2)
+    # Muliply every row element-wise with the idf_counts col vector
+    tf_table.scale_columns(idf_counts)
 
-    return dot_product / (math.sqrt(lhs_length_squared * rhs_length_squared))
+    # Normalize rows
+    tf_table.normalize_rows()
 
 
 if __name__ == "__main__":
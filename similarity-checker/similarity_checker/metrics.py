@@ -0,0 +1,234 @@
+"""
+Timings and counters of the similarity runs.
+
+The stages and counters of the run in progress are recorded on `registry.current`
+through `stage` and `count`. Finished runs are written as one JSON line and exposed,
+together with the run in progress, in the Prometheus text format by `serve_metrics`.
+"""
+
+from typing import Dict, Generator, List, Optional
+
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from progress import status
+
+# Counters that are also summed over all runs
+TOTAL_COUNTERS = ["candidate_pairs", "similar_pairs", "rows_written"]
+
+
+class RunMetrics:
+    """
+    Duration of every stage in seconds and the counters of a single run. Stages that
+    are entered more than once, like the blocks of the similarity tables, are summed.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.duration: Optional[float] = None
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        # Stages of the similar pairs are recorded by another thread than the writes
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Generator[None, None, None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            with self.lock:
+                self.stages[name] = self.stages.get(name, 0.0) + duration
+
+    def count(self, name: str, value: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "started": self.started,
+                "duration": self.duration,
+                "stages": self.stages,
+                "counters": self.counters,
+            }
+        )
+
+
+class MetricsRegistry:
+    """
+    Keeps the metrics of the run in progress and of the last finished run. Runs are
+    recorded by the checker while the metrics endpoint reads them from another thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = RunMetrics()
+        self.in_progress = False
+        self.last: Optional[RunMetrics] = None
+
+        self.runs = 0
+        self.totals: Dict[str, int] = {}
+        self.stage_totals: Dict[str, float] = {}
+
+    def start_run(self) -> RunMetrics:
+        with self.lock:
+            self.current = RunMetrics()
+            self.in_progress = True
+
+        return self.current
+
+    def finish_run(self, log_path: Optional[str] = None):
+        """
+        Records the run in progress as finished and writes it as a JSON line to the
+        log file, or to stderr without one. The line is written at every progress
+        level, including `quiet`.
+        """
+
+        with self.lock:
+            run = self.current
+            run.duration = time.time() - run.started
+
+            self.in_progress = False
+            self.last = run
+            self.runs += 1
+            for name in TOTAL_COUNTERS:
+                self.totals[name] = self.totals.get(name, 0) + run.counters.get(name, 0)
+            for [name, duration] in run.stages.items():
+                self.stage_totals[name] = self.stage_totals.get(name, 0.0) + duration
+
+        if log_path is None:
+            print(run.to_json(), file=sys.stderr)
+        else:
+            with open(log_path, "a") as log:
+                log.write(run.to_json() + "\n")
+
+    def render(self) -> str:
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, description: str, samples: Dict[str, float]):
+            lines.append(f"# HELP similarity_checker_{name} {description}")
+            lines.append(f"# TYPE similarity_checker_{name} {kind}")
+            lines.extend(
+                f"similarity_checker_{name}{labels} {value}"
+                for [labels, value] in samples.items()
+            )
+
+        with self.lock:
+            metric("runs_total", "counter", "Finished runs.", {"": self.runs})
+            metric(
+                "run_in_progress",
+                "gauge",
+                "Whether a run is in progress.",
+                {"": int(self.in_progress)},
+            )
+            if self.in_progress:
+                metric(
+                    "current_run_seconds",
+                    "gauge",
+                    "Seconds since the run in progress started.",
+                    {"": time.time() - self.current.started},
+                )
+            metric(
+                "stage_seconds_total",
+                "counter",
+                "Seconds spent in every stage over all runs.",
+                {
+                    f'{{stage="{name}"}}': duration
+                    for [name, duration] in self.stage_totals.items()
+                },
+            )
+            for [name, total] in self.totals.items():
+                metric(
+                    f"{name}_total",
+                    "counter",
+                    f"Sum of `{name}` of all runs.",
+                    {"": total},
+                )
+
+            if self.last is not None:
+                metric(
+                    "last_run_timestamp_seconds",
+                    "gauge",
+                    "Start of the last finished run.",
+                    {"": self.last.started},
+                )
+                metric(
+                    "last_run_seconds",
+                    "gauge",
+                    "Duration of the last finished run.",
+                    {"": self.last.duration or 0.0},
+                )
+                metric(
+                    "last_run_stage_seconds",
+                    "gauge",
+                    "Seconds spent in every stage of the last finished run.",
+                    {
+                        f'{{stage="{name}"}}': duration
+                        for [name, duration] in self.last.stages.items()
+                    },
+                )
+                for [name, value] in self.last.counters.items():
+                    metric(
+                        f"last_run_{name}",
+                        "gauge",
+                        f"`{name}` of the last finished run.",
+                        {"": value},
+                    )
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def stage(name: str):
+    """
+    Times the stage as part of the run in progress.
+    """
+
+    return registry.current.stage(name)
+
+
+def count(name: str, value: int = 1):
+    registry.current.count(name, value)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object):
+        # Scrapes are not logged
+        pass
+
+
+def serve_metrics(port: int) -> ThreadingHTTPServer:
+    """
+    Serves the metrics on `/metrics` from a background thread, so they can be scraped
+    while a run keeps the event loop busy.
+    """
+
+    server = ThreadingHTTPServer(("", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    status(f"Serving metrics on port `{port}`.")
+    return server
@@ -0,0 +1,77 @@
+"""
+Bounds the amount of neighbours of every article.
+
+A pair is kept when it is among the `SIMILARITY_TOP_K` most similar pairs of both of
+its articles, ranked by descending similarity and then by ascending index of the
+other article. The neighbours are ranked over all similar pairs of a partition before
+they are split into units, so the kept pairs do not depend on the unit size, and
+only the kept pairs are written.
+
+Articles that are not scored by an incremental run are ranked with their stored
+pairs as well, so they are also bounded when they gain new neighbours. Their stored
+pairs that drop out are pruned.
+"""
+
+from typing import Tuple
+
+from dataclasses import dataclass
+
+import numpy as np
+from numpy.typing import NDArray
+
+from pairs import SimilarPairs, select_mutual_top_k
+
+# Article indices of both sides of every stored pair and its similarity
+StoredPairs = Tuple[NDArray[np.int64], NDArray[np.int64], NDArray[np.float64]]
+
+
+@dataclass
+class PrunedPairs:
+    """
+    Article indices of both sides of the stored pairs that dropped out of the
+    neighbours of their articles.
+    """
+
+    lhs_indices: NDArray[np.int64]
+    rhs_indices: NDArray[np.int64]
+
+
+def select_neighbours(
+    similar_pairs: SimilarPairs, stored_pairs: StoredPairs, top_k: int
+) -> Tuple[SimilarPairs, PrunedPairs]:
+    """
+    Returns the similar pairs that are among the `top_k` neighbours of both of their
+    articles, every pair once with the lowest index first, and the stored pairs that
+    are not. Pairs found from both of their articles may be given twice.
+
+    The stored pairs should be the pairs of articles that are not scored. The
+    neighbours of a scored article are ranked among its similar pairs only, so they
+    should contain at least every pair ranked within the `top_k` of a scored article
+    and every pair with an article that is not scored.
+    """
+
+    lhs, rhs, similarities, via_title = similar_pairs
+
+    # Article indices of the tables fit in 32 bits
+    lhs, rhs = np.minimum(lhs, rhs), np.maximum(lhs, rhs)
+    _, first = np.unique((lhs << 32) | rhs, return_index=True)
+    lhs, rhs, similarities, via_title = (
+        lhs[first],
+        rhs[first],
+        similarities[first],
+        via_title[first],
+    )
+
+    stored_lhs, stored_rhs, stored_similarities = stored_pairs
+    kept = select_mutual_top_k(
+        np.concatenate([lhs, stored_lhs]),
+        np.concatenate([rhs, stored_rhs]),
+        np.concatenate([similarities.astype(np.float64), stored_similarities]),
+        top_k,
+    )
+    found, pruned = kept[: len(lhs)], ~kept[len(lhs) :]
+
+    return (
+        (lhs[found], rhs[found], similarities[found], via_title[found]),
+        PrunedPairs(stored_lhs[pruned], stored_rhs[pruned]),
+    )
@@ -0,0 +1,152 @@
+from typing import Iterable, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+# Article indices of both sides of every similar pair, their similarity and whether the
+# pair was matched on its title
+SimilarPairs = Tuple[
+    NDArray[np.int64], NDArray[np.int64], NDArray[np.float32], NDArray[np.bool_]
+]
+
+
+def match_similar(
+    title_similarities: NDArray[np.float32],
+    description_similarities: NDArray[np.float32],
+    lhs_has_description: NDArray[np.bool_],
+    rhs_has_description: NDArray[np.bool_],
+    threshold: float,
+) -> Tuple[NDArray[np.bool_], NDArray[np.bool_]]:
+    """
+    A pair is similar when its titles are similar, or when its titles share a term and
+    both articles have similar, non-empty descriptions. The arguments are broadcast
+    against each other.
+
+    Returns which pairs are similar and which of those are matched on their title.
+    """
+
+    title_match = title_similarities > threshold
+    description_match = (
+        ~title_match
+        & (title_similarities > np.finfo(float).eps)
+        & (description_similarities > threshold)
+        & lhs_has_description
+        & rhs_has_description
+    )
+
+    return title_match | description_match, title_match
+
+
+def select_top_k(
+    scores: NDArray[np.float32], similar: NDArray[np.bool_], top_k: int
+) -> NDArray[np.bool_]:
+    """
+    Returns which similar cells of every row score at least the `top_k`-th highest
+    score of the similar cells of the row. Cells tied with it are all kept, so the
+    selection does not depend on the order of the columns. A `top_k` of zero keeps
+    every row.
+    """
+
+    if top_k <= 0 or similar.shape[1] <= top_k:
+        return similar
+
+    crowded = np.flatnonzero(np.count_nonzero(similar, axis=1) > top_k)
+    if len(crowded) == 0:
+        return similar
+
+    # Partial selection of the cut of every row, the rest of the row is left unsorted
+    crowded_scores = np.where(similar[crowded], scores[crowded], -np.inf)
+    cuts = -np.partition(-crowded_scores, top_k - 1, axis=1)[:, top_k - 1]
+
+    limited = similar.copy()
+    limited[crowded] &= crowded_scores >= cuts[:, None]
+
+    return limited
+
+
+def select_pair_top_k(
+    lhs_indices: NDArray[np.int64], scores: NDArray[np.float32], top_k: int
+) -> NDArray[np.bool_]:
+    """
+    Returns which pairs score at least the `top_k`-th highest score of the pairs with
+    the same left article. Pairs tied with it are all kept, like `select_top_k`.
+    """
+
+    if top_k <= 0:
+        return np.ones(len(lhs_indices), dtype=bool)
+
+    order = np.lexsort((-scores, lhs_indices))
+    groups, ranks = calc_group_ranks(lhs_indices[order])
+
+    cuts = np.full(int(groups.max(initial=-1)) + 1, -np.inf)
+    at_cut = ranks == top_k - 1
+    cuts[groups[at_cut]] = scores[order][at_cut]
+
+    kept = np.zeros(len(lhs_indices), dtype=bool)
+    kept[order] = scores[order] >= cuts[groups]
+
+    return kept
+
+
+def select_mutual_top_k(
+    id1: NDArray[np.int64],
+    id2: NDArray[np.int64],
+    similarities: NDArray[np.float64],
+    top_k: int,
+) -> NDArray[np.bool_]:
+    """
+    Returns which pairs are among the `top_k` neighbours of both of their articles.
+    The neighbours of an article are ordered by descending similarity and then by
+    ascending id, so every article keeps at most `top_k` neighbours and the result
+    does not depend on the order of the pairs.
+    """
+
+    if top_k <= 0:
+        return np.ones(len(id1), dtype=bool)
+
+    # Every pair is ranked once from both of its articles
+    articles = np.concatenate([id1, id2])
+    neighbours = np.concatenate([id2, id1])
+    order = np.lexsort((neighbours, -np.concatenate([similarities] * 2), articles))
+    _, ranks = calc_group_ranks(articles[order])
+
+    kept = np.zeros(len(articles), dtype=bool)
+    kept[order] = ranks < top_k
+
+    return kept[: len(id1)] & kept[len(id1) :]
+
+
+def calc_group_ranks(
+    sorted_keys: NDArray[np.int64],
+) -> Tuple[NDArray[np.int64], NDArray[np.int64]]:
+    """
+    Returns the group of every element of the sorted keys and its position within
+    the group.
+    """
+
+    starts = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+    groups = np.cumsum(starts) - 1
+    ranks = np.arange(len(sorted_keys)) - np.flatnonzero(starts)[groups]
+
+    return groups, ranks
+
+
+def collect_similar_pairs(similar_pair_batches: Iterable[SimilarPairs]) -> SimilarPairs:
+    """
+    Returns the pairs of all batches at once.
+    """
+
+    collected = list(similar_pair_batches)
+    if len(collected) == 0:
+        return (
+            np.zeros(0, dtype=np.int64),
+            np.zeros(0, dtype=np.int64),
+            np.zeros(0, dtype=np.float32),
+            np.zeros(0, dtype=bool),
+        )
+
+    [lhs, rhs, similarities, via_title] = [
+        np.concatenate(values) for values in zip(*collected)
+    ]
+
+    return lhs, rhs, similarities, via_title
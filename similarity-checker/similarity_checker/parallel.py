@@ -0,0 +1,246 @@
+"""
+Parallel exhaustive mode: the normalised tf-idf tables are placed once in shared
+memory and the row blocks of the similarity tables are computed by a pool of worker
+processes. Workers only return the similar pairs of their blocks, which are yielded
+in block order.
+"""
+
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from numpy.typing import NDArray
+
+from sparse import CsrMatrix
+from pairs import SimilarPairs
+from blocks import calc_block_ranges, iter_block_similar_pairs, select_similar_pairs
+from metrics import count, stage
+from progress import update
+
+# Offsets in the shared memory segment are aligned for every dtype
+ALIGNMENT = 64
+
+
+@dataclass
+class SharedLayout:
+    """
+    Name of a shared memory segment and the offset, shape and dtype of every array
+    stored in it. The layout is sent to the workers instead of the arrays.
+    """
+
+    name: str
+    arrays: Dict[str, Tuple[int, Tuple[int, ...], str]]
+
+
+def share_arrays(
+    arrays: Dict[str, NDArray[np.generic]],
+) -> Tuple[SharedMemory, SharedLayout]:
+    """
+    Copies the arrays into a new shared memory segment. The caller owns the segment
+    and should unlink it when the workers are done.
+    """
+
+    offsets: Dict[str, int] = {}
+    size = 0
+    for [name, array] in arrays.items():
+        offsets[name] = size
+        size += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+    memory = SharedMemory(create=True, size=max(size, 1))
+    layout = SharedLayout(memory.name, {})
+
+    for [name, array] in arrays.items():
+        layout.arrays[name] = (offsets[name], array.shape, array.dtype.str)
+        shared: NDArray[np.generic] = np.ndarray(
+            array.shape, array.dtype, memory.buf, offsets[name]
+        )
+        shared[...] = array
+
+    return memory, layout
+
+
+def attach_arrays(
+    layout: SharedLayout,
+) -> Tuple[SharedMemory, Dict[str, NDArray[np.generic]]]:
+    # Workers share the resource tracker of the process that created the segment,
+    # which unlinks it once the workers are done
+    memory = SharedMemory(name=layout.name)
+
+    return memory, {
+        name: np.ndarray(shape, np.dtype(dtype), memory.buf, offset)
+        for [name, (offset, shape, dtype)] in layout.arrays.items()
+    }
+
+
+class BlockWorker:
+    """
+    State of a worker process: views of the shared tables of the scored rows and the
+    transposed tables of all articles.
+    """
+
+    def __init__(
+        self, layout: SharedLayout, columns: int, threshold: float, top_k: int
+    ):
+        self.memory, arrays = attach_arrays(layout)
+        self.threshold = threshold
+        self.top_k = top_k
+
+        def table(prefix: str, shape: Tuple[int, int]) -> CsrMatrix:
+            return CsrMatrix(
+                arrays[f"{prefix}_data"],  # type: ignore
+                arrays[f"{prefix}_indices"],  # type: ignore
+                arrays[f"{prefix}_indptr"],  # type: ignore
+                shape,
+            )
+
+        self.scored_indices: NDArray[np.int64] = arrays["scored_indices"]  # type: ignore
+        self.scored: NDArray[np.bool_] = arrays["scored"]  # type: ignore
+        self.has_description: NDArray[np.bool_] = arrays["has_description"]  # type: ignore
+        self.all_indices = np.arange(columns, dtype=np.int64)
+
+        self.lhs_tables: List[CsrMatrix] = []
+        self.transposed_tables: List[CsrMatrix] = []
+        for name in ["title", "description"]:
+            terms = len(arrays[f"{name}_transposed_indptr"]) - 1
+            self.lhs_tables.append(table(name, (len(self.scored_indices), terms)))
+            self.transposed_tables.append(table(f"{name}_transposed", (terms, columns)))
+
+    def calc_block(self, start: int, end: int) -> SimilarPairs:
+        [title_tile, description_tile] = [
+            lhs_table.multiply_transposed_rows(start, end, transposed_table)
+            for [lhs_table, transposed_table] in zip(
+                self.lhs_tables, self.transposed_tables
+            )
+        ]
+
+        return select_similar_pairs(
+            self.scored_indices[start:end],
+            self.all_indices,
+            title_tile,
+            description_tile,
+            self.scored,
+            self.has_description,
+            self.threshold,
+            self.top_k,
+        )
+
+
+worker: Optional[BlockWorker] = None
+
+
+def init_worker(layout: SharedLayout, columns: int, threshold: float, top_k: int):
+    global worker
+    worker = BlockWorker(layout, columns, threshold, top_k)
+
+
+def calc_worker_block(start: int, end: int) -> SimilarPairs:
+    assert worker is not None, "worker should be initialized"
+    return worker.calc_block(start, end)
+
+
+def iter_parallel_similar_pairs(
+    title_tf_idf_table: CsrMatrix,
+    description_tf_idf_table: CsrMatrix,
+    scored: NDArray[np.bool_],
+    has_description: NDArray[np.bool_],
+    threshold: float,
+    memory_budget: int,
+    workers: int,
+    top_k: int = 0,
+) -> Iterator[SimilarPairs]:
+    """
+    Yields the same similar pairs as `iter_block_similar_pairs`, computed by `workers`
+    processes. The memory budget is shared by the workers, so every worker computes
+    smaller blocks. At most two blocks per worker are in flight.
+    """
+
+    scored_indices = np.flatnonzero(scored)
+    rows, columns = len(scored_indices), title_tf_idf_table.shape[0]
+
+    lhs_tables: List[CsrMatrix] = []
+    transposed_tables: List[CsrMatrix] = []
+    block_ranges: List[Tuple[int, int]] = []
+    if workers > 1:
+        for table in [title_tf_idf_table, description_tf_idf_table]:
+            lhs_tables.append(table.take_rows(scored_indices))
+            transposed_tables.append(table.transpose())
+        block_ranges = calc_block_ranges(
+            lhs_tables, transposed_tables, memory_budget // workers
+        )
+
+    if len(block_ranges) <= 1:
+        yield from iter_block_similar_pairs(
+            title_tf_idf_table,
+            description_tf_idf_table,
+            scored,
+            has_description,
+            threshold,
+            memory_budget,
+            top_k=top_k,
+        )
+        return
+
+    arrays: Dict[str, NDArray[np.generic]] = {
+        "scored_indices": scored_indices,
+        "scored": scored,
+        "has_description": has_description,
+    }
+    for [index, name] in enumerate(["title", "description"]):
+        arrays.update(
+            {
+                f"{name}_data": lhs_tables[index].data,
+                f"{name}_indices": lhs_tables[index].indices,
+                f"{name}_indptr": lhs_tables[index].indptr,
+                f"{name}_transposed_data": transposed_tables[index].data,
+                f"{name}_transposed_indices": transposed_tables[index].indices,
+                f"{name}_transposed_indptr": transposed_tables[index].indptr,
+            }
+        )
+
+    # Only the shared copies are kept
+    memory, layout = share_arrays(arrays)
+    arrays.clear()
+    lhs_tables.clear()
+    transposed_tables.clear()
+
+    try:
+        # The pool is started from the thread computing the pairs, forking a process
+        # with other threads running can deadlock
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+            initializer=init_worker,
+            initargs=(layout, columns, threshold, top_k),
+        ) as executor:
+            blocks = iter(block_ranges)
+            pending: Deque[Tuple[int, int, "Future[SimilarPairs]"]] = deque()
+
+            def submit_next():
+                block = next(blocks, None)
+                if block is not None:
+                    start, end = block
+                    pending.append(
+                        (start, end, executor.submit(calc_worker_block, start, end))
+                    )
+
+            for _ in range(2 * workers):
+                submit_next()
+
+            while len(pending) > 0:
+                start, end, future = pending.popleft()
+                with stage("multiply"):
+                    similar_pairs = future.result()
+                submit_next()
+
+                count("candidate_pairs", (end - start) * columns)
+                update("Checked articles", end, rows)
+
+                yield similar_pairs
+    finally:
+        memory.close()
+        memory.unlink()
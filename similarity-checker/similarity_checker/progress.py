@@ -0,0 +1,88 @@
+"""
+Progress and status reporting of the similarity runs.
+
+- `quiet`: nothing is reported
+- `summary`: status messages and the progress of long stages, at most once per
+  interval
+- `verbose`: like `summary`, every similar pair is also logged at debug level
+
+All output goes to stderr as complete lines, so it stays readable in container logs.
+"""
+
+from typing import Dict
+
+import sys
+import time
+import logging
+
+LEVELS = ["quiet", "summary", "verbose"]
+
+# Logger of the per-pair details, enabled at the `verbose` level
+logger = logging.getLogger("similarity_checker")
+
+
+class ProgressReporter:
+    def __init__(self, level: str = "summary", interval: float = 10.0):
+        assert level in LEVELS, f"unknown progress level `{level}`"
+
+        self.level = level
+        self.interval = interval
+
+        # Task -> time its progress was last reported
+        self.last_reports: Dict[str, float] = {}
+
+    def status(self, message: str):
+        if self.level != "quiet":
+            print(message, file=sys.stderr)
+
+    def update(self, task: str, done: int, total: int):
+        """
+        Reports the progress of the task, unless it was reported less than an interval
+        ago. The first and last update of a task are always reported.
+        """
+
+        if self.level == "quiet":
+            return
+
+        now = time.monotonic()
+        last_report = self.last_reports.get(task)
+        finished = done >= total
+
+        if (
+            last_report is not None
+            and now - last_report < self.interval
+            and not finished
+        ):
+            return
+
+        if finished:
+            self.last_reports.pop(task, None)
+        else:
+            self.last_reports[task] = now
+
+        percentage = 100 * done / total if total > 0 else 100.0
+        print(f"{task}: `{done}` of `{total}` ({percentage:.0f}%)", file=sys.stderr)
+
+
+reporter = ProgressReporter()
+
+
+def configure(level: str, interval: float):
+    """
+    Sets the level of the shared reporter and enables the debug log of similar pairs
+    at the `verbose` level.
+    """
+
+    global reporter
+    reporter = ProgressReporter(level, interval)
+
+    logging.basicConfig(stream=sys.stderr, format="%(message)s")
+    logger.setLevel(logging.DEBUG if level == "verbose" else logging.INFO)
+
+
+def status(message: str):
+    reporter.status(message)
+
+
+def update(task: str, done: int, total: int):
+    reporter.update(task, done, total)
@@ -0,0 +1,268 @@
+from typing import List, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+def segment_positions(
+    starts: NDArray[np.int64], lengths: NDArray[np.int64]
+) -> Tuple[NDArray[np.int64], NDArray[np.int64]]:
+    """
+    Expands a list of contiguous segments (`starts[i]` up to `starts[i] + lengths[i]`)
+    into a flat array of positions.
+
+    Returns the index of the segment every position belongs to and the positions
+    themselves.
+    """
+
+    owners = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+    offsets = np.arange(len(owners), dtype=np.int64) - np.repeat(
+        np.cumsum(lengths) - lengths, lengths
+    )
+
+    return owners, starts[owners] + offsets
+
+
+class CsrMatrix:
+    """
+    Sparse matrix stored in compressed sparse row (CSR) format.
+
+    The column indices and values of row `i` are stored in
+    `indices[indptr[i]:indptr[i + 1]]` and `data[indptr[i]:indptr[i + 1]]`. Column
+    indices are sorted within each row.
+    """
+
+    def __init__(
+        self,
+        data: NDArray[np.float64],
+        indices: NDArray[np.int64],
+        indptr: NDArray[np.int64],
+        shape: Tuple[int, int],
+    ):
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.shape = shape
+
+    @staticmethod
+    def from_rows(
+        rows: List[Tuple[NDArray[np.int64], NDArray[np.float64]]], columns: int
+    ) -> "CsrMatrix":
+        """
+        Builds a matrix from a list of `(column indices, values)` pairs, one for every
+        row.
+        """
+
+        lengths = np.array([len(indices) for [indices, _] in rows], dtype=np.int64)
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+
+        matrix = CsrMatrix(
+            np.concatenate(
+                [np.zeros(0, dtype=np.float64), *[values for [_, values] in rows]]
+            ).astype(np.float64),
+            np.concatenate(
+                [np.zeros(0, dtype=np.int64), *[indices for [indices, _] in rows]]
+            ).astype(np.int64),
+            indptr,
+            (len(rows), columns),
+        )
+        matrix.sort_indices()
+
+        return matrix
+
+    @property
+    def nnz(self) -> int:
+        return len(self.data)
+
+    def row_lengths(self) -> NDArray[np.int64]:
+        return np.diff(self.indptr)
+
+    def row_owners(self) -> NDArray[np.int64]:
+        """
+        Returns the row index of every stored value.
+        """
+
+        return np.repeat(np.arange(self.shape[0], dtype=np.int64), self.row_lengths())
+
+    def row(self, i: int) -> Tuple[NDArray[np.int64], NDArray[np.float64]]:
+        """
+        Returns the column indices and values stored in row `i`.
+        """
+
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.indices[start:end], self.data[start:end]
+
+    def sort_indices(self):
+        """
+        Sorts the column indices within every row.
+        """
+
+        order = np.lexsort((self.indices, self.row_owners()))
+        self.indices = self.indices[order]
+        self.data = self.data[order]
+
+    def take_rows(self, rows: NDArray[np.int64]) -> "CsrMatrix":
+        """
+        Returns a matrix containing only the given rows, in the given order.
+        """
+
+        lengths = self.row_lengths()[rows]
+        _, positions = segment_positions(self.indptr[rows], lengths)
+
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+
+        return CsrMatrix(
+            self.data[positions],
+            self.indices[positions],
+            indptr,
+            (len(rows), self.shape[1]),
+        )
+
+    def compact_columns(self) -> Tuple["CsrMatrix", NDArray[np.int64]]:
+        """
+        Returns a matrix with only the columns that have a stored value, together with
+        the original index of every remaining column.
+        """
+
+        columns, indices = np.unique(self.indices, return_inverse=True)
+
+        return (
+            CsrMatrix(
+                self.data.copy(),
+                indices.reshape(-1).astype(np.int64),
+                self.indptr,
+                (self.shape[0], len(columns)),
+            ),
+            columns,
+        )
+
+    def get(self, i: int, j: int) -> float:
+        indices, values = self.row(i)
+        position = np.searchsorted(indices, j)
+
+        if position < len(indices) and indices[position] == j:
+            return float(values[position])
+        return 0.0
+
+    def count_nonzero_columns(self) -> NDArray[np.int64]:
+        """
+        Returns the amount of rows with a stored value for every column.
+        """
+
+        return np.bincount(self.indices, minlength=self.shape[1])
+
+    def scale_rows(self, factors: NDArray[np.float64]):
+        self.data *= np.repeat(factors, self.row_lengths())
+
+    def scale_columns(self, factors: NDArray[np.float64]):
+        self.data *= factors[self.indices]
+
+    def normalize_rows(self):
+        """
+        Scales every row to unit length. Empty rows are left empty.
+        """
+
+        owners = self.row_owners()
+        norms = np.sqrt(
+            np.bincount(owners, weights=self.data**2, minlength=self.shape[0])
+        )
+        self.data /= norms[owners]
+
+    def transpose(self) -> "CsrMatrix":
+        """
+        Returns the transposed matrix. The rows of the transposed matrix are the
+        columns of this matrix, which makes it usable as an inverted index.
+        """
+
+        order = np.argsort(self.indices, kind="stable")
+
+        indptr = np.zeros(self.shape[1] + 1, dtype=np.int64)
+        np.cumsum(self.count_nonzero_columns(), out=indptr[1:])
+
+        return CsrMatrix(
+            self.data[order],
+            self.row_owners()[order],
+            indptr,
+            (self.shape[1], self.shape[0]),
+        )
+
+    def multiply_transposed_rows(
+        self, start: int, end: int, other_transposed: "CsrMatrix"
+    ) -> NDArray[np.float32]:
+        """
+        Calculates rows `start` up to `end` of `self @ other.T` as a dense float32
+        tile. `other_transposed` is `other.transpose()`, so it can be computed once and
+        reused for every tile.
+
+        Every stored value of the rows is multiplied with the column of `other` it
+        belongs to and the products are accumulated per output cell. Only pairs of
+        rows sharing at least one column contribute any work.
+        """
+
+        assert (
+            self.shape[1] == other_transposed.shape[0]
+        ), "matrices should share their columns"
+
+        output_columns = other_transposed.shape[1]
+        lower, upper = self.indptr[start], self.indptr[end]
+
+        entry_rows = np.repeat(
+            np.arange(end - start, dtype=np.int64), self.row_lengths()[start:end]
+        )
+        entry_columns = self.indices[lower:upper]
+        entry_values = self.data[lower:upper]
+
+        # Expand every stored value into the column of `other` it multiplies with
+        owners, positions = segment_positions(
+            other_transposed.indptr[entry_columns],
+            other_transposed.row_lengths()[entry_columns],
+        )
+        cells = (
+            entry_rows[owners] * output_columns + other_transposed.indices[positions]
+        )
+        products = entry_values[owners] * other_transposed.data[positions]
+
+        tile = np.bincount(
+            cells, weights=products, minlength=(end - start) * output_columns
+        )
+
+        return tile.astype(np.float32).reshape(end - start, output_columns)
+
+    def multiply_row_pairs(
+        self,
+        other: "CsrMatrix",
+        lhs_rows: NDArray[np.int64],
+        rhs_rows: NDArray[np.int64],
+    ) -> NDArray[np.float32]:
+        """
+        Calculates the dot product of row `lhs_rows[k]` of this matrix with row
+        `rhs_rows[k]` of `other` for every `k`.
+        """
+
+        assert self.shape[1] == other.shape[1], "matrices should share their columns"
+
+        columns = max(self.shape[1], 1)
+
+        lhs_pairs, lhs_positions = segment_positions(
+            self.indptr[lhs_rows], self.row_lengths()[lhs_rows]
+        )
+        rhs_pairs, rhs_positions = segment_positions(
+            other.indptr[rhs_rows], other.row_lengths()[rhs_rows]
+        )
+
+        # Every column occurs at most once per row, so the keys of a side are unique
+        [shared_keys, lhs_shared, rhs_shared] = np.intersect1d(
+            lhs_pairs * columns + self.indices[lhs_positions],
+            rhs_pairs * columns + other.indices[rhs_positions],
+            assume_unique=True,
+            return_indices=True,
+        )
+
+        return np.bincount(
+            shared_keys // columns,
+            weights=self.data[lhs_positions[lhs_shared]]
+            * other.data[rhs_positions[rhs_shared]],
+            minlength=len(lhs_rows),
+        ).astype(np.float32)
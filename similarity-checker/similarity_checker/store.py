@@ -0,0 +1,462 @@
+"""
+Persistent store of the tokenized articles, so the vocabulary and document frequencies
+do not have to be derived from scratch on every run or restart.
+
+Every save writes a new generation directory `generation-<n>` containing a directory
+per field (titles and descriptions) and `state.json`, the state of the previous run.
+The file `generation` holds the number of the current generation and is only replaced
+once the whole generation is written, so an interrupted save leaves the previous
+generation in use. Every field directory contains:
+
+- `terms.txt`: the vocabulary, the line number of a term is its id
+- `document_frequencies.npy`: amount of stored articles containing every term
+- `article_ids.npy`: sorted ids of the stored articles
+- `indptr.npy`, `tokens.npy`: term ids of every article in token order (CSR layout)
+
+The arrays are memory-mapped when the store is opened. A store whose files do not
+match each other is discarded.
+"""
+
+from typing import BinaryIO, Callable, List, Optional, Tuple
+
+import os
+import json
+import shutil
+from dataclasses import asdict
+
+import numpy as np
+from numpy.typing import NDArray
+from prisma.enums import Language
+
+from sparse import CsrMatrix, segment_positions
+from vocabulary import Vocabulary
+from hashing import hash_columns, hash_terms
+from incremental import CorpusState
+from tokenizer import Tokenizer
+from progress import status
+
+
+class TermStore:
+    """
+    Term ids of every tokenized article of a single field, loaded from the directory
+    `path`. Without a path the store only lives in memory.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.clear()
+
+        if path is not None:
+            self.load()
+
+            status(
+                f"Loaded `{len(self.article_ids)}` articles and "
+                + f"`{len(self.vocabulary)}` terms from `{self.path}`."
+            )
+
+    def clear(self):
+        self.vocabulary = Vocabulary()
+        self.document_frequencies: NDArray[np.int64] = np.zeros(0, dtype=np.int64)
+        self.article_ids: NDArray[np.int64] = np.zeros(0, dtype=np.int64)
+        self.indptr: NDArray[np.int64] = np.zeros(1, dtype=np.int64)
+        self.tokens: NDArray[np.int32] = np.zeros(0, dtype=np.int32)
+        self.modified = True
+        # Hashed column and sign of every term id, extended as terms are added
+        self.term_features: Optional[
+            Tuple[int, NDArray[np.int64], NDArray[np.float64]]
+        ] = None
+
+    def load(self):
+        """
+        Memory-maps the files of the store, raises a `ValueError` if they do not match
+        each other.
+        """
+
+        assert self.path is not None
+
+        with open(os.path.join(self.path, "terms.txt"), "r", encoding="utf-8") as terms:
+            # Every term ends with a newline, terms never contain whitespace
+            self.vocabulary = Vocabulary(terms.read().split("\n")[:-1])
+
+        self.document_frequencies = np.load(
+            os.path.join(self.path, "document_frequencies.npy"), mmap_mode="r"
+        )
+        self.article_ids = np.load(
+            os.path.join(self.path, "article_ids.npy"), mmap_mode="r"
+        )
+        self.indptr = np.load(os.path.join(self.path, "indptr.npy"), mmap_mode="r")
+        self.tokens = np.load(os.path.join(self.path, "tokens.npy"), mmap_mode="r")
+        self.modified = False
+        self.term_features = None
+
+        if (
+            len(self.document_frequencies) != len(self.vocabulary)
+            or len(self.indptr) != len(self.article_ids) + 1
+            or self.indptr[0] != 0
+            or self.indptr[-1] != len(self.tokens)
+        ):
+            raise ValueError(f"The files in `{self.path}` do not match each other.")
+
+    def save(self, path: str):
+        """
+        Writes the store to the new directory `path` and memory-maps the written files.
+        The files of an unmodified store are linked instead of written again.
+        """
+
+        os.makedirs(path)
+
+        if self.path is not None and not self.modified:
+            for name in STORE_FILES:
+                link_file(os.path.join(self.path, name), os.path.join(path, name))
+        else:
+            write_file(
+                os.path.join(path, "terms.txt"),
+                lambda file: file.writelines(
+                    f"{term}\n".encode() for term in self.vocabulary.terms
+                ),
+            )
+            for [name, array] in [
+                ("document_frequencies.npy", np.asarray(self.document_frequencies)),
+                ("article_ids.npy", np.asarray(self.article_ids)),
+                ("indptr.npy", np.asarray(self.indptr)),
+                ("tokens.npy", np.asarray(self.tokens)),
+            ]:
+                write_file(
+                    os.path.join(path, name),
+                    lambda file, array=array: np.save(file, array),
+                )
+
+        self.path = path
+        self.load()
+
+    def sync(
+        self,
+        article_ids: List[int],
+        texts: List[str],
+        languages: List[Language],
+        tokenizer: Tokenizer,
+    ) -> bool:
+        """
+        Makes the store contain exactly the given articles. Articles that are no longer
+        given are removed and only articles that are not stored yet are tokenized.
+
+        Returns whether the store changed.
+        """
+
+        added = self.add(article_ids, texts, languages, tokenizer)
+        removed = self.retain(article_ids)
+
+        return added or removed
+
+    def add(
+        self,
+        article_ids: List[int],
+        texts: List[str],
+        languages: List[Language],
+        tokenizer: Tokenizer,
+    ) -> bool:
+        """
+        Tokenizes and adds the given articles that are not stored yet.
+
+        Returns whether the store changed.
+        """
+
+        ids = np.array(article_ids, dtype=np.int64)
+        added = np.flatnonzero(~np.isin(ids, self.article_ids))
+
+        if len(added) == 0:
+            return False
+
+        documents = tokenizer.tokenize(
+            [texts[i] for i in added.tolist()],
+            [languages[i] for i in added.tolist()],
+        )
+        added_tokens = np.array(
+            [self.vocabulary.add(term) for document in documents for term in document],
+            dtype=np.int32,
+        )
+        added_indptr = np.zeros(len(documents) + 1, dtype=np.int64)
+        np.cumsum([len(document) for document in documents], out=added_indptr[1:])
+
+        document_frequencies = np.zeros(len(self.vocabulary), dtype=np.int64)
+        document_frequencies[: len(self.document_frequencies)] = (
+            self.document_frequencies
+        )
+        document_frequencies += count_documents(
+            added_indptr, added_tokens, len(self.vocabulary)
+        )
+
+        all_ids = np.concatenate([self.article_ids, ids[added]])
+        all_tokens = np.concatenate([self.tokens, added_tokens])
+        all_indptr = np.concatenate([self.indptr, self.indptr[-1] + added_indptr[1:]])
+
+        # Articles usually arrive in order of their id, then they are simply appended
+        if np.all(all_ids[1:] > all_ids[:-1]):
+            self.indptr, self.tokens = all_indptr, all_tokens
+            self.article_ids = all_ids
+        else:
+            order = np.argsort(all_ids, kind="stable")
+            self.article_ids = all_ids[order]
+            [self.indptr, self.tokens] = take_sequences(all_indptr, all_tokens, order)
+
+        self.document_frequencies = document_frequencies
+        self.modified = True
+
+        return True
+
+    def retain(self, article_ids: List[int]) -> bool:
+        """
+        Removes the stored articles that are not given, for example because they were
+        deleted from the database.
+
+        Returns whether the store changed.
+        """
+
+        removed = ~np.isin(self.article_ids, np.array(article_ids, dtype=np.int64))
+
+        if not removed.any():
+            return False
+
+        self.document_frequencies = np.asarray(
+            self.document_frequencies
+        ) - count_documents(*self.rows(np.flatnonzero(removed)), len(self.vocabulary))
+
+        kept = np.flatnonzero(~removed)
+        [self.indptr, self.tokens] = self.rows(kept)
+        self.article_ids = self.article_ids[kept]
+        self.modified = True
+
+        return True
+
+    def empty_documents(self) -> int:
+        return int(np.count_nonzero(np.diff(self.indptr) == 0))
+
+    def positions(self, article_ids: List[int]) -> NDArray[np.int64]:
+        """
+        Returns the rows of the given stored articles.
+        """
+
+        return np.searchsorted(self.article_ids, np.array(article_ids, dtype=np.int64))
+
+    def rows(
+        self, positions: NDArray[np.int64]
+    ) -> Tuple[NDArray[np.int64], NDArray[np.int32]]:
+        return take_sequences(self.indptr, self.tokens, positions)
+
+    def term_frequency_table(self, positions: NDArray[np.int64]) -> CsrMatrix:
+        """
+        Returns the normalized term frequency table of the articles at the given rows.
+        The columns are the term ids of the vocabulary.
+        """
+
+        [indptr, tokens] = self.rows(positions)
+        lengths = np.diff(indptr)
+        owners = np.repeat(np.arange(len(positions), dtype=np.int64), lengths)
+
+        columns = max(len(self.vocabulary), 1)
+        [cells, counts] = np.unique(owners * columns + tokens, return_counts=True)
+        rows = cells // columns
+
+        table_indptr = np.zeros(len(positions) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(positions)), out=table_indptr[1:])
+
+        return CsrMatrix(
+            counts / lengths[rows],
+            cells % columns,
+            table_indptr,
+            (len(positions), len(self.vocabulary)),
+        )
+
+    def hashed_term_frequency_table(
+        self, positions: NDArray[np.int64], features: int
+    ) -> CsrMatrix:
+        """
+        Returns the normalized term frequency table of the articles at the given rows,
+        with the terms hashed into `features` signed columns, see `hashing.py`.
+
+        The store itself stays keyed on the vocabulary, and the hashed column and sign
+        of every term are kept next to it, so its memory still grows with every new
+        term.
+        """
+
+        if self.term_features is None or self.term_features[0] != features:
+            self.term_features = (
+                features,
+                *hash_terms(self.vocabulary.terms, features),
+            )
+        elif len(self.term_features[1]) < len(self.vocabulary):
+            [columns, signs] = hash_terms(
+                self.vocabulary.terms[len(self.term_features[1]) :], features
+            )
+            self.term_features = (
+                features,
+                np.concatenate([self.term_features[1], columns]),
+                np.concatenate([self.term_features[2], signs]),
+            )
+
+        return hash_columns(
+            self.term_frequency_table(positions),
+            self.term_features[1],
+            self.term_features[2],
+            features,
+        )
+
+    def documents(self, positions: NDArray[np.int64]) -> List[List[str]]:
+        """
+        Returns the terms of the articles at the given rows in token order.
+        """
+
+        [indptr, tokens] = self.rows(positions)
+        terms = self.vocabulary.terms
+        token_list = tokens.tolist()
+
+        return [
+            [terms[token] for token in token_list[start:end]]
+            for [start, end] in zip(indptr[:-1].tolist(), indptr[1:].tolist())
+        ]
+
+
+STORE_FILES = [
+    "terms.txt",
+    "document_frequencies.npy",
+    "article_ids.npy",
+    "indptr.npy",
+    "tokens.npy",
+]
+
+
+def write_file(path: str, write: Callable[[BinaryIO], object]):
+    """
+    Writes the file and flushes it to disk.
+    """
+
+    with open(path, "wb") as file:
+        write(file)
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def replace_file(path: str, write: Callable[[BinaryIO], object]):
+    """
+    Writes the file next to `path` first and then moves it over `path`, so an
+    interrupted write leaves either the previous or the new file at `path`, never a
+    partially written one. Only the single file is replaced atomically.
+    """
+
+    directory, name = os.path.split(path)
+    temporary_path = os.path.join(directory, f".{name}.tmp")
+
+    write_file(temporary_path, write)
+    os.replace(temporary_path, path)
+
+
+def link_file(source: str, destination: str):
+    try:
+        os.link(source, destination)
+    except OSError:
+        # The file system does not support hard links
+        shutil.copyfile(source, destination)
+
+
+def take_sequences(
+    indptr: NDArray[np.int64], tokens: NDArray[np.int32], positions: NDArray[np.int64]
+) -> Tuple[NDArray[np.int64], NDArray[np.int32]]:
+    """
+    Returns the CSR layout of the sequences at the given positions, in that order.
+    """
+
+    lengths = np.diff(indptr)[positions]
+    [_, token_positions] = segment_positions(indptr[positions], lengths)
+
+    taken_indptr = np.zeros(len(positions) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=taken_indptr[1:])
+
+    return taken_indptr, np.asarray(tokens)[token_positions]
+
+
+def count_documents(
+    indptr: NDArray[np.int64], tokens: NDArray[np.int32], terms: int
+) -> NDArray[np.int64]:
+    """
+    Returns the amount of sequences containing every term.
+    """
+
+    owners = np.repeat(np.arange(len(indptr) - 1, dtype=np.int64), np.diff(indptr))
+    cells = np.unique(owners * max(terms, 1) + tokens)
+
+    return np.bincount(cells % max(terms, 1), minlength=terms)
+
+
+class Corpus:
+    """
+    Term stores of the titles and descriptions together with the state of the previous
+    similarity run. Without a path the corpus only lives in memory.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.generation = 0
+        self.titles = TermStore()
+        self.descriptions = TermStore()
+        self.state = CorpusState()
+
+        if path is not None and os.path.exists(os.path.join(path, "generation")):
+            try:
+                self.load()
+            except (OSError, ValueError) as error:
+                status(f"Discarding the term store in `{path}`: {error}")
+                self.clear()
+
+    def generation_path(self, generation: int) -> str:
+        assert self.path is not None
+        return os.path.join(self.path, f"generation-{generation}")
+
+    def load(self):
+        assert self.path is not None
+
+        with open(os.path.join(self.path, "generation"), "r") as generation:
+            self.generation = int(generation.read())
+
+        directory = self.generation_path(self.generation)
+        self.titles = TermStore(os.path.join(directory, "title"))
+        self.descriptions = TermStore(os.path.join(directory, "description"))
+
+        with open(os.path.join(directory, "state.json"), "r") as state:
+            self.state = CorpusState(**json.load(state))
+
+    def clear(self):
+        self.titles.clear()
+        self.descriptions.clear()
+        self.state = CorpusState()
+
+    def save(self):
+        """
+        Writes the stores and the state as the next generation and then switches to
+        it, see the top of this file.
+        """
+
+        if self.path is None:
+            return
+
+        generation = self.generation + 1
+        directory = self.generation_path(generation)
+
+        # Left behind by an interrupted save
+        shutil.rmtree(directory, ignore_errors=True)
+
+        self.titles.save(os.path.join(directory, "title"))
+        self.descriptions.save(os.path.join(directory, "description"))
+        write_file(
+            os.path.join(directory, "state.json"),
+            lambda file: file.write(json.dumps(asdict(self.state)).encode()),
+        )
+
+        replace_file(
+            os.path.join(self.path, "generation"),
+            lambda file: file.write(str(generation).encode()),
+        )
+        self.generation = generation
+
+        for name in os.listdir(self.path):
+            if name.startswith("generation-") and name != os.path.basename(directory):
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
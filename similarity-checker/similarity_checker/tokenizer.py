@@ -0,0 +1,96 @@
+from typing import Dict, List, Optional, Set, Tuple
+from concurrent.futures import ProcessPoolExecutor
+
+import string
+import multiprocessing
+
+from prisma.enums import Language
+
+from utils import stop_words
+
+PUNCTUATION_TABLE = str.maketrans("", "", string.punctuation)
+
+stop_word_sets: Dict[Language, Set[str]] = {
+    language: set(words) for [language, words] in stop_words.items()
+}
+
+
+def tokenize(text: str, language: Language) -> List[str]:
+    """
+    Removes punctuation, converts the text to lowercase and splits it on whitespace.
+    Numbers and stop words of the language are left out.
+    """
+
+    language_stop_words = stop_word_sets[language]
+
+    return [
+        word
+        for word in text.translate(PUNCTUATION_TABLE).lower().split()
+        if not word.isdigit() and word not in language_stop_words
+    ]
+
+
+def tokenize_chunk(chunk: List[Tuple[str, Language]]) -> List[List[str]]:
+    return [tokenize(text, language) for [text, language] in chunk]
+
+
+class Tokenizer:
+    """
+    Tokenizes corpora, every text with the language at the same index. Corpora larger
+    than a single chunk are split into chunks that are tokenized by a pool of `workers`
+    processes. The pool is started when it is first needed and shared by every corpus
+    until the tokenizer is closed, so pages of articles do not start a pool each.
+    """
+
+    def __init__(self, workers: int, chunk_size: int):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> "Tokenizer":
+        return self
+
+    def __exit__(self, *_: object):
+        self.close()
+
+    def tokenize(self, texts: List[str], languages: List[Language]) -> List[List[str]]:
+        documents = list(zip(texts, languages))
+
+        if self.workers <= 1 or len(documents) <= self.chunk_size:
+            return tokenize_chunk(documents)
+
+        chunks = [
+            documents[offset : offset + self.chunk_size]
+            for offset in range(0, len(documents), self.chunk_size)
+        ]
+
+        if self.executor is None:
+            # The checker runs other threads, like the metrics server and the thread
+            # computing the pairs, and forking a process with other threads running can
+            # deadlock
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+
+        return [
+            tokens
+            for tokenized_chunk in self.executor.map(tokenize_chunk, chunks)
+            for tokens in tokenized_chunk
+        ]
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+def tokenize_corpus(
+    texts: List[str], languages: List[Language], workers: int, chunk_size: int
+) -> List[List[str]]:
+    """
+    Tokenizes a single corpus, see `Tokenizer`.
+    """
+
+    with Tokenizer(workers, chunk_size) as tokenizer:
+        return tokenizer.tokenize(texts, languages)
@@ -0,0 +1,98 @@
+from typing import Optional
+
+import asyncio
+
+import psycopg
+
+from progress import status
+
+# Channel notified by the database triggers on `NewsArticles` and `Flags`
+CHANNEL = "articles_modified"
+
+
+class ArticlesModifiedTrigger:
+    """
+    Wakes the similarity checker when articles are modified, using Postgres
+    LISTEN/NOTIFY.
+
+    Notifications are coalesced: all notifications received while waiting or while a
+    run is in progress result in a single wake up. After the first notification the
+    trigger waits until `debounce` seconds pass without another one, but at most
+    `max_delay` seconds, so a burst of inserts is scored in one run.
+
+    When no notification arrives within `poll_interval` seconds the caller should fall
+    back to checking the `articles_modified` flag, which also covers notifications
+    that were missed while the listening connection was down.
+    """
+
+    def __init__(
+        self,
+        conninfo: Optional[str],
+        debounce: float,
+        max_delay: float,
+        poll_interval: float,
+    ):
+        self.conninfo = conninfo
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+
+        self.notified = asyncio.Event()
+        self.listener: Optional["asyncio.Task[None]"] = None
+
+    def start(self):
+        if self.conninfo is None:
+            status("Not listening for notifications. Polling the flags instead.")
+            return
+
+        self.listener = asyncio.create_task(self.listen(self.conninfo))
+
+    async def listen(self, conninfo: str):
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(  # type: ignore
+                    conninfo, autocommit=True
+                ) as connection:
+                    await connection.execute(f"LISTEN {CHANNEL}")
+                    status(f"Listening for notifications on `{CHANNEL}`.")
+
+                    async for _ in connection.notifies():
+                        self.notified.set()
+            except (psycopg.Error, OSError) as error:
+                status(
+                    f"Listening for notifications failed: {error}. Retrying in "
+                    + f"`{self.poll_interval}` seconds."
+                )
+
+            await asyncio.sleep(self.poll_interval)
+
+    async def wait(self) -> bool:
+        """
+        Waits for the next (debounced) notification or until the poll interval passed.
+
+        Returns whether a notification was received.
+        """
+
+        try:
+            await asyncio.wait_for(self.notified.wait(), self.poll_interval)
+        except asyncio.TimeoutError:
+            return False
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_delay
+
+        while True:
+            self.notified.clear()
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+
+            try:
+                await asyncio.wait_for(
+                    self.notified.wait(), min(self.debounce, remaining)
+                )
+            except asyncio.TimeoutError:
+                break
+
+        return True
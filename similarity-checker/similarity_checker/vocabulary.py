@@ -0,0 +1,73 @@
+from typing import Dict, List, Optional
+from collections import Counter
+
+import numpy as np
+
+from sparse import CsrMatrix
+
+
+class Vocabulary:
+    """
+    Maps terms to stable integer ids. Ids are handed out in order of first occurrence
+    and never change once assigned, so looking up a term is a single hash lookup
+    instead of a scan over all known terms.
+    """
+
+    def __init__(self, terms: Optional[List[str]] = None):
+        self.terms: List[str] = []
+        self.term_ids: Dict[str, int] = {}
+
+        for term in terms or []:
+            self.add(term)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self.term_ids
+
+    def add(self, term: str) -> int:
+        """
+        Returns the id of the term, assigning the next free id to unknown terms.
+        """
+
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            term_id = len(self.terms)
+            self.term_ids[term] = term_id
+            self.terms.append(term)
+
+        return term_id
+
+    def get(self, term: str) -> Optional[int]:
+        return self.term_ids.get(term)
+
+
+def build_term_frequency_table(
+    documents: List[List[str]], vocabulary: Vocabulary
+) -> CsrMatrix:
+    """
+    Builds the normalized term frequency table of all documents in a single pass. Terms
+    that are not yet part of the vocabulary are added to it.
+    """
+
+    indices: List[int] = []
+    frequencies: List[float] = []
+    indptr: List[int] = [0]
+
+    for document in documents:
+        for [term, count] in Counter(document).items():
+            indices.append(vocabulary.add(term))
+            frequencies.append(count / len(document))
+
+        indptr.append(len(indices))
+
+    tf_table = CsrMatrix(
+        np.array(frequencies, dtype=np.float64),
+        np.array(indices, dtype=np.int64),
+        np.array(indptr, dtype=np.int64),
+        (len(documents), len(vocabulary)),
+    )
+    tf_table.sort_indices()
+
+    return tf_table
@@ -0,0 +1,242 @@
+"""
+Publication-date windowed comparison. Articles are only compared with articles
+published within a window around their own publication date, so the work grows with
+the amount of articles per window instead of with the size of the whole corpus.
+
+Articles without a publication date are handled according to the undated policy:
+
+- `compare`: undated articles are compared with every article
+- `skip`: undated articles are never compared
+"""
+
+from typing import Iterator, List, Optional
+from datetime import datetime
+
+import numpy as np
+from numpy.typing import NDArray
+
+from sparse import CsrMatrix
+from pairs import SimilarPairs
+from metrics import count, stage
+from progress import update
+from blocks import (
+    SELECTION_CELL_SIZE,
+    calc_block_bytes,
+    calc_row_products,
+    iter_block_similar_pairs,
+    select_similar_pairs,
+)
+
+UNDATED_POLICIES = ["compare", "skip"]
+
+# Bytes per cell while the window mask of a block is computed, measured
+WINDOW_MASK_CELL_SIZE = 17
+
+
+def calc_publication_times(
+    publication_dates: List[Optional[datetime]],
+) -> NDArray[np.float64]:
+    """
+    Returns the publication dates as POSIX timestamps, NaN for undated articles.
+    """
+
+    return np.array(
+        [np.nan if date is None else date.timestamp() for date in publication_dates],
+        dtype=np.float64,
+    )
+
+
+def calc_window_block_end(
+    start: int,
+    lower: NDArray[np.int64],
+    upper: NDArray[np.int64],
+    extra_columns: int,
+    cumulative_column_products: NDArray[np.float64],
+    memory_budget: int,
+) -> int:
+    """
+    Returns the end of the block of rows starting at `start`, so the block fits in the
+    memory budget (in bytes). The columns of the block are the union of the windows of
+    its rows plus `extra_columns`. The products of the block are estimated from the
+    running sum of the average products per column of every row. At least one row is
+    returned.
+    """
+
+    def calc_bytes(end: int) -> int:
+        columns = int(upper[end - 1] - lower[start]) + extra_columns
+        column_products = cumulative_column_products[end - 1] - (
+            cumulative_column_products[start - 1] if start > 0 else 0
+        )
+
+        return calc_block_bytes(
+            (end - start) * columns,
+            int(column_products * columns),
+            2,
+            SELECTION_CELL_SIZE + WINDOW_MASK_CELL_SIZE,
+        )
+
+    end = start + 1
+    while end < len(lower) and calc_bytes(end + 1) <= memory_budget:
+        end += 1
+
+    return end
+
+
+def filter_window_pairs(
+    similar_pairs: SimilarPairs,
+    publication_times: NDArray[np.float64],
+    window: float,
+    undated_policy: str,
+) -> SimilarPairs:
+    """
+    Drops the pairs published further than `window` seconds apart and the pairs that
+    are excluded by the undated policy.
+    """
+
+    [lhs, rhs, similarities, via_title] = similar_pairs
+
+    kept = calc_window_mask(
+        publication_times[lhs], publication_times[rhs], window, undated_policy
+    )
+    return lhs[kept], rhs[kept], similarities[kept], via_title[kept]
+
+
+def calc_window_mask(
+    lhs_times: NDArray[np.float64],
+    rhs_times: NDArray[np.float64],
+    window: float,
+    undated_policy: str,
+) -> NDArray[np.bool_]:
+    """
+    Returns which pairs of publication times are compared. The arguments are
+    broadcast against each other.
+    """
+
+    undated = np.isnan(lhs_times) | np.isnan(rhs_times)
+    with np.errstate(invalid="ignore"):
+        inside = np.abs(lhs_times - rhs_times) <= window
+
+    return inside | (undated & (undated_policy == "compare"))
+
+
+def iter_window_similar_pairs(
+    title_tf_idf_table: CsrMatrix,
+    description_tf_idf_table: CsrMatrix,
+    scored: NDArray[np.bool_],
+    has_description: NDArray[np.bool_],
+    publication_times: NDArray[np.float64],
+    window: float,
+    undated_policy: str,
+    threshold: float,
+    memory_budget: int,
+    top_k: int = 0,
+) -> Iterator[SimilarPairs]:
+    """
+    Checks every scored article against the articles published at most `window`
+    seconds before or after it and yields the similar pairs of one block at a time.
+    Every checked article keeps at most `top_k` neighbours when positive.
+
+    The dated articles are sorted by publication date, so the window of every article
+    is a contiguous range of that order. Blocks of scored articles are compared with
+    the union of their windows only.
+    """
+
+    assert undated_policy in UNDATED_POLICIES, f"unknown policy `{undated_policy}`"
+
+    dated = ~np.isnan(publication_times)
+    dated_indices = np.flatnonzero(dated)
+    order = dated_indices[np.argsort(publication_times[dated_indices], kind="stable")]
+    sorted_times = publication_times[order]
+
+    undated_indices = (
+        np.flatnonzero(~dated)
+        if undated_policy == "compare"
+        else np.zeros(0, dtype=np.int64)
+    )
+
+    # Scored dated articles in publication order and the range of their windows
+    lhs_indices = order[scored[order]]
+    lower = np.searchsorted(
+        sorted_times, publication_times[lhs_indices] - window, "left"
+    )
+    upper = np.searchsorted(
+        sorted_times, publication_times[lhs_indices] + window, "right"
+    )
+
+    # Products of every row against all articles, spread over the articles
+    cumulative_column_products = np.cumsum(
+        calc_row_products(
+            [
+                table.take_rows(lhs_indices)
+                for table in [title_tf_idf_table, description_tf_idf_table]
+            ],
+            [
+                table.transpose()
+                for table in [title_tf_idf_table, description_tf_idf_table]
+            ],
+        )
+        / max(title_tf_idf_table.shape[0], 1)
+    )
+
+    block_start = 0
+    while block_start < len(lhs_indices):
+        block_end = calc_window_block_end(
+            block_start,
+            lower,
+            upper,
+            len(undated_indices),
+            cumulative_column_products,
+            memory_budget,
+        )
+
+        block_indices = lhs_indices[block_start:block_end]
+        rhs_indices = np.concatenate(
+            [order[lower[block_start] : upper[block_end - 1]], undated_indices]
+        )
+
+        with stage("multiply"):
+            [title_tile, description_tile] = [
+                table.take_rows(block_indices).multiply_transposed_rows(
+                    0, len(block_indices), table.take_rows(rhs_indices).transpose()
+                )
+                for table in [title_tf_idf_table, description_tf_idf_table]
+            ]
+        count("candidate_pairs", len(block_indices) * len(rhs_indices))
+
+        update("Checked dated articles", block_end, len(lhs_indices))
+
+        with stage("extract_pairs"):
+            similar_pairs = select_similar_pairs(
+                block_indices,
+                rhs_indices,
+                title_tile,
+                description_tile,
+                scored,
+                has_description,
+                threshold,
+                top_k,
+                calc_window_mask(
+                    publication_times[block_indices][:, None],
+                    publication_times[rhs_indices][None, :],
+                    window,
+                    undated_policy,
+                ),
+            )
+
+        yield similar_pairs
+
+        block_start = block_end
+
+    # Undated articles are compared with all articles
+    undated_scored = undated_indices[scored[undated_indices]]
+    if len(undated_scored) > 0:
+        yield from iter_block_similar_pairs(
+            title_tf_idf_table,
+            description_tf_idf_table,
+            scored,
+            has_description,
+            threshold,
+            memory_budget,
+            undated_scored,
+            top_k,
+        )
@@ -0,0 +1,292 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import time
+
+import numpy as np
+from numpy.typing import NDArray
+
+from prisma import Prisma
+
+from loader import iter_similar_pair_pages
+from metrics import count, stage
+from progress import status
+
+# Postgres accepts at most 65535 parameters per statement, every upserted row uses
+# three and every deleted row two
+MAX_ROWS_PER_STATEMENT = 65535 // 3
+MAX_DELETED_ROWS_PER_STATEMENT = 65535 // 2
+
+
+class ExistingPairs:
+    """
+    Similar pairs stored in the database before the run, as sorted `id1 < id2` keys
+    with their similarity. Pairs found again by the run are marked as seen.
+    """
+
+    def __init__(
+        self,
+        id1: Optional[NDArray[np.int64]] = None,
+        id2: Optional[NDArray[np.int64]] = None,
+        similarities: Optional[NDArray[np.float64]] = None,
+    ):
+        id1 = np.zeros(0, dtype=np.int64) if id1 is None else id1
+        id2 = np.zeros(0, dtype=np.int64) if id2 is None else id2
+
+        keys = pair_keys(id1, id2)
+        order = np.argsort(keys, kind="stable")
+
+        self.keys = keys[order]
+        self.similarities = (
+            np.zeros(0, dtype=np.float64) if similarities is None else similarities
+        )[order]
+        self.seen = np.zeros(len(self.keys), dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def find(self, id1: int, id2: int) -> int:
+        """
+        Returns the index of the pair, or -1 if it is not stored.
+        """
+
+        if len(self.keys) == 0:
+            return -1
+
+        key = (min(id1, id2) << 32) | max(id1, id2)
+        index = int(np.searchsorted(self.keys, key))
+
+        if index < len(self.keys) and self.keys[index] == key:
+            return index
+        return -1
+
+    def ids(self) -> Tuple[NDArray[np.int64], NDArray[np.int64]]:
+        return self.keys >> 32, self.keys & 0xFFFFFFFF
+
+    def article_indices(
+        self, article_ids: NDArray[np.int64]
+    ) -> Tuple[NDArray[np.bool_], NDArray[np.int64], NDArray[np.int64]]:
+        """
+        Returns whether both articles of every pair are in `article_ids`, and the
+        indices of both articles in it. The indices of unknown articles are arbitrary.
+        """
+
+        id1, id2 = self.ids()
+        if len(article_ids) == 0:
+            return (
+                np.zeros(len(id1), dtype=bool),
+                np.zeros(len(id1), dtype=np.int64),
+                np.zeros(len(id1), dtype=np.int64),
+            )
+
+        order = np.argsort(article_ids, kind="stable")
+        sorted_ids = article_ids[order]
+
+        known = np.ones(len(id1), dtype=bool)
+        indices: List[NDArray[np.int64]] = []
+        for ids in [id1, id2]:
+            positions = np.minimum(
+                np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1
+            )
+            known &= sorted_ids[positions] == ids
+            indices.append(order[positions])
+
+        return known, indices[0], indices[1]
+
+
+def pair_keys(id1: NDArray[np.int64], id2: NDArray[np.int64]) -> NDArray[np.int64]:
+    # Article ids are Postgres integers, so both fit in 32 bits
+    return (np.minimum(id1, id2).astype(np.int64) << 32) | np.maximum(id1, id2)
+
+
+async def load_existing_pairs(client: Prisma, page_size: int) -> ExistingPairs:
+    id1: List[int] = []
+    id2: List[int] = []
+    similarities: List[float] = []
+
+    async for rows in iter_similar_pair_pages(client, page_size):
+        id1.extend(int(row["id1"]) for row in rows)
+        id2.extend(int(row["id2"]) for row in rows)
+        similarities.extend(float(row["similarity"]) for row in rows)
+
+    return ExistingPairs(
+        np.array(id1, dtype=np.int64),
+        np.array(id2, dtype=np.int64),
+        np.array(similarities, dtype=np.float64),
+    )
+
+
+class SimilarArticlesWriter:
+    """
+    Collects similar article pairs and writes the difference with the existing pairs
+    to the `SimilarArticles` table in batches. Every pair is stored as a single row
+    with `id1 < id2`.
+
+    New pairs and pairs whose similarity changed by more than `epsilon` are upserted,
+    unchanged pairs are skipped. Pending pairs are flushed in a single transaction
+    when `batch_size` pairs are collected or `flush_interval` seconds passed since the
+    previous flush. Existing pairs that were not found again are removed by
+    `delete_missing`.
+    """
+
+    def __init__(
+        self,
+        client: Prisma,
+        batch_size: int,
+        flush_interval: float,
+        existing: Optional[ExistingPairs] = None,
+        epsilon: float = 0.0,
+    ):
+        self.client = client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.existing = ExistingPairs() if existing is None else existing
+        self.epsilon = epsilon
+
+        # (id1, id2) with id1 < id2 -> similarity
+        self.pending: Dict[Tuple[int, int], float] = {}
+        self.last_flush = time.monotonic()
+
+        self.rows_written = 0
+        self.rows_deleted = 0
+        self.pairs_unchanged = 0
+        self.write_duration = 0.0
+
+    async def add(self, id1: int, id2: int, similarity: float):
+        index = self.existing.find(id1, id2)
+        if index >= 0:
+            self.existing.seen[index] = True
+
+            if abs(self.existing.similarities[index] - similarity) <= self.epsilon:
+                self.pairs_unchanged += 1
+                await self.flush_if_due()
+                return
+
+        self.pending[(min(id1, id2), max(id1, id2))] = similarity
+
+        if len(self.pending) >= self.batch_size:
+            await self.flush()
+        else:
+            await self.flush_if_due()
+
+    async def flush_if_due(self):
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            await self.flush()
+
+    def pending_rows(self) -> List[Tuple[int, int, float]]:
+        return [
+            (id1, id2, similarity) for [(id1, id2), similarity] in self.pending.items()
+        ]
+
+    async def flush(self):
+        rows = self.pending_rows()
+        self.pending = {}
+
+        start = time.monotonic()
+
+        if len(rows) > 0:
+            with stage("write"):
+                async with self.client.batch_() as batch:
+                    for offset in range(0, len(rows), MAX_ROWS_PER_STATEMENT):
+                        statement_rows = rows[offset : offset + MAX_ROWS_PER_STATEMENT]
+                        batch.execute_raw(
+                            build_upsert_query(len(statement_rows)),  # type: ignore
+                            *flatten_rows(statement_rows),
+                        )
+            count("rows_written", len(rows))
+
+        self.last_flush = time.monotonic()
+        self.write_duration += self.last_flush - start
+        self.rows_written += len(rows)
+
+    @property
+    def rows_per_second(self) -> float:
+        if self.write_duration == 0:
+            return 0.0
+
+        return (self.rows_written + self.rows_deleted) / self.write_duration
+
+    async def delete_missing(
+        self,
+        article_ids: NDArray[np.int64],
+        article_units: NDArray[np.int64],
+        unit: int,
+    ):
+        """
+        Deletes the existing pairs owned by the unit that were not found again. A pair
+        is owned by the earliest unit of its articles, see `checkpoint.py`. Pairs of
+        articles that are not scored were not checked and are kept.
+        """
+
+        if len(self.existing) == 0:
+            return
+
+        # Pairs of removed articles are deleted by the database
+        known, lhs, rhs = self.existing.article_indices(article_ids)
+        owners = np.minimum(article_units[lhs], article_units[rhs])
+
+        missing = np.flatnonzero(known & (owners == unit) & ~self.existing.seen)
+        id1, id2 = self.existing.ids()
+
+        await self.delete(list(zip(id1[missing].tolist(), id2[missing].tolist())))
+
+    async def delete(self, rows: List[Tuple[int, int]]):
+        """
+        Deletes the stored pairs of the `(id1, id2)` rows in a single transaction.
+        """
+
+        start = time.monotonic()
+
+        if len(rows) > 0:
+            with stage("write"):
+                async with self.client.batch_() as batch:
+                    for offset in range(0, len(rows), MAX_DELETED_ROWS_PER_STATEMENT):
+                        statement_rows = rows[
+                            offset : offset + MAX_DELETED_ROWS_PER_STATEMENT
+                        ]
+                        batch.execute_raw(
+                            build_delete_query(len(statement_rows)),  # type: ignore
+                            *[value for row in statement_rows for value in row],
+                        )
+            count("rows_deleted", len(rows))
+
+        self.write_duration += time.monotonic() - start
+        self.rows_deleted += len(rows)
+
+    async def close(self):
+        """
+        Flushes all pending pairs and reports the write throughput.
+        """
+
+        await self.flush()
+
+        status(
+            f"Wrote `{self.rows_written}` and deleted `{self.rows_deleted}` similar "
+            + f"article rows in `{self.write_duration:.2f}` seconds "
+            + f"(`{self.rows_per_second:.0f}` rows/s), "
+            + f"`{self.pairs_unchanged}` pairs were unchanged."
+        )
+
+
+def build_upsert_query(rows: int) -> str:
+    values = ", ".join(
+        f"(${3 * row + 1}, ${3 * row + 2}, ${3 * row + 3})" for row in range(rows)
+    )
+
+    return f"""
+        INSERT INTO "SimilarArticles" ("id1", "id2", "similarity")
+        VALUES {values}
+        ON CONFLICT ("id1", "id2") DO UPDATE SET "similarity" = EXCLUDED."similarity"
+    """
+
+
+def build_delete_query(rows: int) -> str:
+    values = ", ".join(f"(${2 * row + 1}, ${2 * row + 2})" for row in range(rows))
+
+    return f"""
+        DELETE FROM "SimilarArticles"
+        WHERE ("id1", "id2") IN (VALUES {values})
+    """
+
+
+def flatten_rows(rows: List[Tuple[int, int, float]]) -> List[Any]:
+    return [value for row in rows for value in row]
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from blocks import iter_block_similar_pairs
+
+from .utils import (
+    build_tables,
+    to_dense,
+    calc_dense_similar_pairs,
+    collect_similar_pairs,
+    assert_same_pairs,
+)
+
+THRESHOLD = 0.65
+
+
+def test_multiply_transposed_rows():
+    [title_table, _, _] = build_tables()
+
+    assert np.allclose(
+        title_table.multiply_transposed_rows(3, 9, title_table.transpose()),
+        to_dense(title_table)[3:9] @ to_dense(title_table).T,
+        atol=1e-6,
+    )
+
+
+@pytest.mark.parametrize("memory_budget", [1, 1 << 10, 1 << 30])
+def test_block_similar_pairs(memory_budget: int):
+    [title_table, description_table, has_description] = build_tables()
+    scored = np.ones(title_table.shape[0], dtype=bool)
+
+    expected = calc_dense_similar_pairs(
+        title_table, description_table, scored, has_description, THRESHOLD
+    )
+    # The corpus has pairs matching on their titles and on their descriptions
+    assert {title_match for [_, title_match] in expected.values()} == {True, False}
+
+    assert_same_pairs(
+        collect_similar_pairs(
+            iter_block_similar_pairs(
+                title_table,
+                description_table,
+                scored,
+                has_description,
+                THRESHOLD,
+                memory_budget,
+            )
+        ),
+        expected,
+    )
+
+
+@pytest.mark.parametrize("memory_budget", [1, 1 << 30])
+def test_block_similar_pairs_of_new_articles(memory_budget: int):
+    [title_table, description_table, has_description] = build_tables()
+    scored = np.zeros(title_table.shape[0], dtype=bool)
+    scored[[1, 4, 7, 11, 12]] = True
+
+    assert_same_pairs(
+        collect_similar_pairs(
+            iter_block_similar_pairs(
+                title_table,
+                description_table,
+                scored,
+                has_description,
+                THRESHOLD,
+                memory_budget,
+            )
+        ),
+        calc_dense_similar_pairs(
+            title_table, description_table, scored, has_description, THRESHOLD
+        ),
+    )
@@ -0,0 +1,85 @@
+from typing import List
+
+import os
+import json
+import asyncio
+from pathlib import Path
+
+import pytest
+
+import main
+import checkpoint
+from store import Corpus
+from checkpoint import RunCheckpoint, calc_run_fingerprint
+
+from .utils import FakePrisma, build_articles
+
+
+class Interrupted(Exception):
+    pass
+
+
+def test_resumed_run(monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
+    monkeypatch.setattr(main, "SIMILARITY_CHECKPOINT_ROWS", 2)
+
+    expected = FakePrisma()
+    corpus = Corpus(os.path.join(tmp_path, "expected"))
+    asyncio.run(
+        main.calc_article_similarity(build_articles(), expected, corpus)  # type: ignore
+    )
+
+    path = os.path.join(tmp_path, "store")
+    checkpoint_path = os.path.join(path, "checkpoint.json")
+    client = FakePrisma()
+
+    complete = RunCheckpoint.complete
+    completed: List[int] = []
+
+    def interrupt(self: RunCheckpoint, unit: int):
+        complete(self, unit)
+        completed.append(unit)
+        if len(completed) == 3:
+            raise Interrupted()
+
+    monkeypatch.setattr(checkpoint.RunCheckpoint, "complete", interrupt)
+    with pytest.raises(Interrupted):
+        asyncio.run(
+            main.calc_article_similarity(
+                build_articles(), client, Corpus(path)  # type: ignore
+            )
+        )
+
+    with open(checkpoint_path, "r") as file:
+        assert json.load(file)["completed_units"] == sorted(completed)
+
+    # The resumed run only checks the remaining units
+    asyncio.run(
+        main.calc_article_similarity(
+            build_articles(), client, Corpus(path)  # type: ignore
+        )
+    )
+    assert len(completed) == len(set(completed)) > 3
+
+    assert client.rows.keys() == expected.rows.keys()
+    for [pair, similarity] in expected.rows.items():
+        assert client.rows[pair] == pytest.approx(similarity)  # type: ignore
+    assert not os.path.exists(checkpoint_path)
+
+
+def test_checkpoint_of_another_run_is_discarded(tmp_path: Path):
+    path = os.path.join(tmp_path, "checkpoint.json")
+    fingerprint = calc_run_fingerprint((None, 15), 15, {"unit_size": 2})
+
+    run = RunCheckpoint(path, fingerprint, 15)
+    run.complete(0)
+    run.complete(1)
+
+    assert RunCheckpoint(path, fingerprint, 15).completed == {0, 1}
+
+    for other_fingerprint in [
+        calc_run_fingerprint((None, 16), 15, {"unit_size": 2}),
+        calc_run_fingerprint((None, 15), 14, {"unit_size": 2}),
+        calc_run_fingerprint((None, 15), 15, {"unit_size": 3}),
+    ]:
+        assert other_fingerprint != fingerprint
+        assert RunCheckpoint(path, other_fingerprint, 15).completed == set()
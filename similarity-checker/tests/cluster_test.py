@@ -0,0 +1,78 @@
+import asyncio
+
+import numpy as np
+
+from cluster import UnionFind, calc_latest_in_cluster, update_clusters
+
+from .utils import FakePrisma
+
+
+def test_union_find_chains():
+    sets = UnionFind(7)
+    for [lhs, rhs] in [(0, 1), (2, 3), (1, 2), (5, 6), (3, 0)]:
+        sets.union(lhs, rhs)
+
+    roots = sets.roots()
+    assert len(set(roots[[0, 1, 2, 3]].tolist())) == 1
+    assert roots[5] == roots[6]
+    assert len(set(roots.tolist())) == 3
+
+
+def test_latest_in_cluster():
+    cluster_ids = np.array([1, 1, 1, 1, 5, 5], dtype=np.int64)
+    source_ids = np.array([0, 0, 1, 0, 0, 0], dtype=np.int64)
+    publication_times = np.array([10.0, 20.0, 5.0, np.nan, 30.0, 30.0])
+
+    latest = calc_latest_in_cluster(cluster_ids, source_ids, publication_times)
+
+    # Undated articles and articles published at the same time are all the latest
+    assert latest.tolist() == [False, True, True, True, True, True]
+
+
+def test_update_clusters():
+    # The chain 7-3-9-5, a separate pair and a pair of the removed article 40
+    client = FakePrisma(
+        {(3, 7): 0.7, (3, 9): 0.8, (5, 9): 0.9, (4, 8): 0.7, (2, 40): 0.9}
+    )
+
+    article_ids = [9, 3, 7, 5, 4, 8, 2]
+    source_ids = [0, 0, 0, 1, 0, 0, 0]
+    publication_times = np.array([3.0, 2.0, 1.0, 4.0, 1.0, np.nan, 1.0])
+
+    updated = asyncio.run(
+        update_clusters(
+            client,  # type: ignore
+            article_ids,
+            source_ids,
+            publication_times,
+            [None] * len(article_ids),
+            [True] * len(article_ids),
+            2,
+        )
+    )
+
+    assert updated == len(article_ids)
+    assert client.clusters == {
+        9: (3, True),
+        3: (3, False),
+        7: (3, False),
+        5: (3, True),
+        4: (4, True),
+        8: (4, True),
+        2: (2, True),
+    }
+
+    # Only articles whose cluster or marker changed are written again
+    previous = [client.clusters[article_id] for article_id in article_ids]
+    updated = asyncio.run(
+        update_clusters(
+            client,  # type: ignore
+            article_ids,
+            source_ids,
+            publication_times,
+            [cluster_id for [cluster_id, _] in previous],
+            [latest for [_, latest] in previous],
+            2,
+        )
+    )
+    assert updated == 0
@@ -0,0 +1,12 @@
+import os
+import sys
+
+# The checker modules import each other as top-level modules
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../similarity_checker")
+)
+
+from progress import configure
+
+# The status messages and progress of the runs are not reported
+configure("quiet", 0.0)
@@ -0,0 +1,159 @@
+from typing import List
+
+import numpy as np
+from numpy.typing import NDArray
+import pytest
+
+from sparse import CsrMatrix
+from blocks import iter_block_similar_pairs
+from inverted import iter_inverted_similar_pairs
+from main import calc_tf_idf
+
+from .utils import (
+    TITLES,
+    DESCRIPTIONS,
+    DUTCH_ARTICLES,
+    SimilarPairDict,
+    build_tables,
+    calc_dense_similar_pairs,
+    collect_similar_pairs,
+    assert_same_pairs,
+)
+
+THRESHOLD = 0.65
+
+
+def calc_exhaustive_similar_pairs(
+    title_table: CsrMatrix,
+    description_table: CsrMatrix,
+    scored: NDArray[np.bool_],
+    threshold: float,
+    top_k: int = 0,
+) -> SimilarPairDict:
+    return collect_similar_pairs(
+        iter_block_similar_pairs(
+            title_table,
+            description_table,
+            scored,
+            description_table.row_lengths() > 0,
+            threshold,
+            1 << 30,
+            top_k=top_k,
+        )
+    )
+
+
+def calc_inverted_similar_pairs(
+    title_table: CsrMatrix,
+    description_table: CsrMatrix,
+    scored: NDArray[np.bool_],
+    threshold: float,
+    memory_budget: int,
+    top_k: int = 0,
+) -> SimilarPairDict:
+    return collect_similar_pairs(
+        iter_inverted_similar_pairs(
+            title_table,
+            description_table,
+            scored,
+            description_table.row_lengths() > 0,
+            threshold,
+            memory_budget,
+            top_k=top_k,
+        )
+    )
+
+
+def calc_observed_similarities(
+    title_table: CsrMatrix, description_table: CsrMatrix
+) -> List[float]:
+    """
+    Returns every distinct title and description similarity between two different
+    articles of the tables.
+    """
+
+    similarities: List[float] = []
+    for table in [title_table, description_table]:
+        tile = table.multiply_transposed_rows(0, table.shape[0], table.transpose())
+        similarities.extend(tile[~np.eye(len(tile), dtype=bool)].tolist())
+
+    return sorted({similarity for similarity in similarities if 0 < similarity < 1})
+
+
+@pytest.mark.parametrize("memory_budget", [1, 1 << 10, 1 << 30])
+def test_inverted_similar_pairs(memory_budget: int):
+    [title_table, description_table, has_description] = build_tables()
+    scored = np.ones(title_table.shape[0], dtype=bool)
+
+    assert_same_pairs(
+        calc_inverted_similar_pairs(
+            title_table, description_table, scored, THRESHOLD, memory_budget
+        ),
+        calc_dense_similar_pairs(
+            title_table, description_table, scored, has_description, THRESHOLD
+        ),
+    )
+
+
+def test_inverted_similar_pairs_at_threshold():
+    [title_table, description_table, _] = build_tables()
+    scored = np.ones(title_table.shape[0], dtype=bool)
+
+    # A threshold equal to the similarity of a pair leaves that pair out
+    for threshold in calc_observed_similarities(title_table, description_table):
+        assert calc_inverted_similar_pairs(
+            title_table, description_table, scored, threshold, 1 << 10
+        ) == calc_exhaustive_similar_pairs(
+            title_table, description_table, scored, threshold
+        )
+
+
+@pytest.mark.parametrize("top_k", [0, 1, 2])
+def test_inverted_similar_pairs_of_new_articles(top_k: int):
+    [title_table, description_table, _] = build_tables()
+    scored = np.zeros(title_table.shape[0], dtype=bool)
+    scored[[1, 4, 7, 11, 12]] = True
+
+    assert calc_inverted_similar_pairs(
+        title_table, description_table, scored, THRESHOLD, 1, top_k
+    ) == calc_exhaustive_similar_pairs(
+        title_table, description_table, scored, THRESHOLD, top_k
+    )
+
+
+def test_inverted_similar_pairs_across_languages():
+    [title_table, description_table, _] = build_tables()
+    scored = np.ones(title_table.shape[0], dtype=bool)
+
+    # The Dutch and English articles share names, so pairs across languages exist
+    # when all articles are compared at once
+    similar_pairs = calc_inverted_similar_pairs(
+        title_table, description_table, scored, THRESHOLD, 1 << 10
+    )
+    assert any(
+        (lhs in DUTCH_ARTICLES) != (rhs in DUTCH_ARTICLES)
+        for [lhs, rhs] in similar_pairs
+    )
+    assert similar_pairs == calc_exhaustive_similar_pairs(
+        title_table, description_table, scored, THRESHOLD
+    )
+
+
+def test_inverted_similar_pairs_within_languages():
+    for partition in [
+        DUTCH_ARTICLES,
+        [article for article in range(len(TITLES)) if article not in DUTCH_ARTICLES],
+    ]:
+        # Every language has its own tables, like the partitions of a run
+        title_table = calc_tf_idf([TITLES[article] for article in partition])
+        description_table = calc_tf_idf(
+            [DESCRIPTIONS[article] for article in partition]
+        )
+        scored = np.ones(len(partition), dtype=bool)
+
+        for threshold in calc_observed_similarities(title_table, description_table):
+            assert calc_inverted_similar_pairs(
+                title_table, description_table, scored, threshold, 1
+            ) == calc_exhaustive_similar_pairs(
+                title_table, description_table, scored, threshold
+            )
@@ -0,0 +1,91 @@
+from typing import Dict, List, Tuple
+
+import asyncio
+from collections import Counter
+
+import numpy as np
+import pytest
+
+import main
+from store import Corpus
+from neighbours import select_neighbours
+
+from .utils import FakePrisma, build_articles
+
+
+def run_incrementally(
+    monkeypatch: pytest.MonkeyPatch, candidates: str, unit_size: int, top_k: int
+) -> Tuple[Dict[Tuple[int, int], float], Dict[Tuple[int, int], float]]:
+    """
+    Returns the stored pairs after a first run over the first articles, and after an
+    incremental run that scores the remaining articles.
+    """
+
+    monkeypatch.setattr(main, "SIMILARITY_CANDIDATES", candidates)
+    monkeypatch.setattr(main, "SIMILARITY_CHECKPOINT_ROWS", unit_size)
+    monkeypatch.setattr(main, "SIMILARITY_TOP_K", top_k)
+    monkeypatch.setattr(main, "SIMILARITY_CROSS_LANGUAGE", True)
+    monkeypatch.setattr(main, "SIMILARITY_IDF_DRIFT_BOUND", np.inf)
+
+    articles = build_articles()
+    client = FakePrisma()
+    corpus = Corpus()
+
+    asyncio.run(
+        main.calc_article_similarity(articles[:12], client, corpus)  # type: ignore
+    )
+    first_rows = dict(client.rows)
+    asyncio.run(main.calc_article_similarity(articles, client, corpus))  # type: ignore
+
+    return first_rows, client.rows
+
+
+def count_neighbours(rows: Dict[Tuple[int, int], float]) -> List[int]:
+    return list(Counter(article for pair in rows for article in pair).values())
+
+
+def test_select_neighbours():
+    # Articles 0, 1 and 2 are all similar, 3 only to 0 and the stored pair of 4 and 5
+    # only to each other
+    [similar_pairs, pruned] = select_neighbours(
+        (
+            np.array([0, 1, 0, 2, 3], dtype=np.int64),
+            np.array([1, 0, 2, 1, 0], dtype=np.int64),
+            np.array([0.9, 0.9, 0.8, 0.7, 0.95], dtype=np.float32),
+            np.array([True, True, False, True, True]),
+        ),
+        (
+            np.array([1, 4], dtype=np.int64),
+            np.array([5, 5], dtype=np.int64),
+            np.array([0.99, 0.7], dtype=np.float64),
+        ),
+        1,
+    )
+
+    assert similar_pairs[0].tolist() == [0]
+    assert similar_pairs[1].tolist() == [3]
+    assert similar_pairs[2].tolist() == [np.float32(0.95)]
+    assert [pruned.lhs_indices.tolist(), pruned.rhs_indices.tolist()] == [[4], [5]]
+
+
+@pytest.mark.parametrize("candidates", ["exhaustive", "inverted", "lsh"])
+def test_neighbours_do_not_depend_on_unit_size(
+    monkeypatch: pytest.MonkeyPatch, candidates: str
+):
+    runs = [
+        run_incrementally(monkeypatch, candidates, unit_size, 1)
+        for unit_size in [0, 1, 2, 5]
+    ]
+
+    assert all(rows == runs[0] for rows in runs)
+    assert max(count_neighbours(runs[0][1])) == 1
+
+
+def test_neighbours_of_articles_that_are_not_scored(monkeypatch: pytest.MonkeyPatch):
+    [first_rows, rows] = run_incrementally(monkeypatch, "exhaustive", 2, 1)
+
+    # The duplicate of the first article is scored by the second run, so the stored
+    # neighbour of the first article is pruned
+    assert (1, 2) in first_rows
+    assert (1, 13) in rows and (1, 2) not in rows
+    assert max(count_neighbours(rows)) == 1
@@ -0,0 +1,120 @@
+from typing import List
+
+import os
+from pathlib import Path
+
+import numpy as np
+
+from store import Corpus, TermStore
+from incremental import CorpusState
+from tokenizer import Tokenizer
+
+from .utils import build_articles
+
+
+def add_articles(store: TermStore, articles: List[int]):
+    rows = build_articles()
+    store.add(
+        [rows[article].id for article in articles],
+        [rows[article].title for article in articles],
+        [rows[article].language for article in articles],
+        Tokenizer(1, 5000),
+    )
+
+
+def assert_same_store(actual: TermStore, expected: TermStore):
+    np.testing.assert_array_equal(actual.article_ids, expected.article_ids)
+    np.testing.assert_array_equal(
+        actual.document_frequencies, expected.document_frequencies
+    )
+
+    positions = np.arange(len(expected.article_ids), dtype=np.int64)
+    assert actual.documents(positions) == expected.documents(positions)
+
+
+def test_save_and_load(tmp_path: Path):
+    path = os.path.join(tmp_path, "store")
+
+    expected = TermStore()
+    add_articles(expected, [3, 0, 1, 2])
+    add_articles(expected, [8, 5, 4])
+    expected.retain([1, 4, 5, 6, 9])
+
+    corpus = Corpus(path)
+    add_articles(corpus.titles, [3, 0, 1, 2])
+    add_articles(corpus.titles, [8, 5, 4])
+    corpus.titles.retain([1, 4, 5, 6, 9])
+    corpus.state = CorpusState(last_article_id=9, documents=5)
+    corpus.save()
+
+    assert_same_store(corpus.titles, expected)
+
+    loaded = Corpus(path)
+    assert loaded.state == corpus.state
+    assert_same_store(loaded.titles, expected)
+    assert len(loaded.descriptions.article_ids) == 0
+
+    # Unmodified stores are linked into the next generation
+    add_articles(loaded.descriptions, [0, 1])
+    add_articles(expected, [10, 11])
+    add_articles(loaded.titles, [10, 11])
+    loaded.save()
+    loaded.save()
+
+    reloaded = Corpus(path)
+    assert reloaded.generation == 3
+    assert_same_store(reloaded.titles, expected)
+    np.testing.assert_array_equal(reloaded.descriptions.article_ids, [1, 2])
+    assert sorted(os.listdir(path)) == ["generation", "generation-3"]
+
+
+def test_interrupted_save(tmp_path: Path):
+    path = os.path.join(tmp_path, "store")
+
+    corpus = Corpus(path)
+    add_articles(corpus.titles, [0, 1, 2])
+    corpus.state = CorpusState(last_article_id=3)
+    corpus.save()
+
+    # A save that stopped before the generation was switched
+    os.makedirs(os.path.join(path, "generation-2", "title"))
+    with open(os.path.join(path, "generation-2", "title", "terms.txt"), "w") as terms:
+        terms.write("partial\n")
+
+    loaded = Corpus(path)
+    assert loaded.state == corpus.state
+    assert_same_store(loaded.titles, corpus.titles)
+
+    add_articles(loaded.titles, [3])
+    loaded.save()
+
+    reloaded = Corpus(path)
+    np.testing.assert_array_equal(reloaded.titles.article_ids, [1, 2, 3, 4])
+    assert sorted(os.listdir(path)) == ["generation", "generation-2"]
+
+
+def test_inconsistent_store_is_discarded(tmp_path: Path):
+    path = os.path.join(tmp_path, "store")
+
+    corpus = Corpus(path)
+    add_articles(corpus.titles, [0, 1, 2])
+    add_articles(corpus.descriptions, [0, 1, 2])
+    corpus.state = CorpusState(last_article_id=3)
+    corpus.save()
+
+    # Files of different generations
+    np.save(
+        os.path.join(path, "generation-1", "title", "article_ids.npy"),
+        np.array([1, 2], dtype=np.int64),
+    )
+
+    loaded = Corpus(path)
+    assert loaded.state == CorpusState()
+    assert len(loaded.titles.article_ids) == 0
+    assert len(loaded.descriptions.article_ids) == 0
+
+    add_articles(loaded.titles, [4])
+    loaded.save()
+
+    reloaded = Corpus(path)
+    np.testing.assert_array_equal(reloaded.titles.article_ids, [5])
@@ -0,0 +1,57 @@
+from typing import List
+
+import glob
+import string
+
+import pytest
+from prisma.enums import Language
+
+from tokenizer import Tokenizer, tokenize_corpus
+from utils import filter_numerics, filter_stop_words
+
+
+def baseline_tokenize(text: str, language: Language) -> List[str]:
+    """
+    Tokenizes the text in separate passes, like the checker did before the tokenizer
+    was fused.
+    """
+
+    words = text.translate(str.maketrans("", "", string.punctuation)).lower().split()
+    return filter_stop_words(filter_numerics(words), language)
+
+
+def load_example_articles() -> List[str]:
+    texts: List[str] = []
+    for path in sorted(glob.glob("articles/*.txt")):
+        with open(path, "r", encoding="utf-8") as article:
+            texts.append(article.read())
+
+    return texts
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_tokenize_corpus(workers: int):
+    articles = load_example_articles()
+    assert len(articles) > 0
+
+    # Every article is tokenized as English and as Dutch, whole and by line
+    texts = [text for article in articles for text in [article, *article.splitlines()]]
+    languages = [Language.English] * len(texts) + [Language.Dutch] * len(texts)
+    texts = texts * 2
+    expected = [
+        baseline_tokenize(text, language) for [text, language] in zip(texts, languages)
+    ]
+
+    assert tokenize_corpus(texts, languages, workers, 16) == expected
+
+    with Tokenizer(workers, 16) as tokenizer:
+        for offset in range(0, len(texts), 50):
+            assert (
+                tokenizer.tokenize(
+                    texts[offset : offset + 50], languages[offset : offset + 50]
+                )
+                == expected[offset : offset + 50]
+            )
+
+        # Larger corpora are tokenized by the pool
+        assert (tokenizer.executor is not None) == (workers > 1)
@@ -0,0 +1,221 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from prisma.enums import Language
+
+from sparse import CsrMatrix
+from pairs import SimilarPairs
+from loader import ArticleRow
+from main import calc_tf_idf
+
+# Tokenized titles and descriptions of a few stories, with duplicates, titles that
+# only match on their descriptions, empty texts and Dutch articles
+TITLES: List[List[str]] = [
+    ["storm", "hits", "coast", "thousands", "without", "power"],
+    ["storm", "hits", "coast", "thousands", "without", "power", "tonight"],
+    ["coast", "storm", "leaves", "thousands", "without", "power"],
+    ["parliament", "approves", "budget", "after", "long", "debate"],
+    ["budget", "approved", "parliament"],
+    ["parliament", "vote", "tonight"],
+    ["football", "club", "wins", "cup", "final"],
+    ["club", "wins", "cup"],
+    ["storm", "football", "final", "postponed"],
+    [],
+    ["storm", "treft", "kust", "duizenden", "zonder", "stroom"],
+    ["storm", "treft", "kust", "vannacht"],
+    ["storm", "hits", "coast", "thousands", "without", "power"],
+    ["ajax", "amsterdam", "wins", "cup"],
+    ["ajax", "amsterdam", "wint", "beker"],
+]
+
+DESCRIPTIONS: List[List[str]] = [
+    ["heavy", "winds", "damaged", "lines", "along", "coast"],
+    ["heavy", "winds", "damaged", "lines", "along", "coast"],
+    [],
+    ["members", "voted", "budget", "next", "year", "after", "debate"],
+    ["members", "voted", "budget", "next", "year"],
+    ["members", "voted", "budget", "next", "year", "after", "debate"],
+    ["club", "beat", "rivals", "final", "minute"],
+    [],
+    ["match", "moved", "because", "storm"],
+    ["nothing", "here"],
+    ["zware", "wind", "beschadigde", "leidingen"],
+    ["zware", "wind", "beschadigde", "leidingen", "kust"],
+    ["heavy", "winds", "damaged", "lines", "along", "coast"],
+    ["ajax", "beat", "psv", "amsterdam"],
+    ["ajax", "versloeg", "psv", "amsterdam"],
+]
+
+# Articles of the corpus written in Dutch, the others are written in English
+DUTCH_ARTICLES = [10, 11, 14]
+
+SimilarPairDict = Dict[Tuple[int, int], Tuple[float, bool]]
+
+
+def build_tables() -> Tuple[CsrMatrix, CsrMatrix, NDArray[np.bool_]]:
+    """
+    Returns the title and description tf-idf tables of the corpus and which articles
+    have a description.
+    """
+
+    description_table = calc_tf_idf(DESCRIPTIONS)
+
+    return calc_tf_idf(TITLES), description_table, description_table.row_lengths() > 0
+
+
+def to_dense(table: CsrMatrix) -> NDArray[np.float64]:
+    dense = np.zeros(table.shape, dtype=np.float64)
+    dense[table.row_owners(), table.indices] = table.data
+
+    return dense
+
+
+def calc_dense_similar_pairs(
+    title_table: CsrMatrix,
+    description_table: CsrMatrix,
+    scored: NDArray[np.bool_],
+    has_description: NDArray[np.bool_],
+    threshold: float,
+) -> SimilarPairDict:
+    """
+    Reference of the similar pairs, computed with dense tables and one pair at a time.
+    Every pair of a scored article is checked once, from the scored article with the
+    lowest index.
+    """
+
+    title_similarities = to_dense(title_table) @ to_dense(title_table).T
+    description_similarities = (
+        to_dense(description_table) @ to_dense(description_table).T
+    )
+
+    similar_pairs: SimilarPairDict = {}
+    for lhs in np.flatnonzero(scored).tolist():
+        for rhs in range(len(scored)):
+            if rhs == lhs or (scored[rhs] and rhs < lhs):
+                continue
+
+            title_similarity = float(np.float32(title_similarities[lhs, rhs]))
+            description_similarity = float(
+                np.float32(description_similarities[lhs, rhs])
+            )
+
+            if title_similarity > threshold:
+                similar_pairs[(lhs, rhs)] = (title_similarity, True)
+            elif (
+                title_similarity > np.finfo(float).eps
+                and description_similarity > threshold
+                and has_description[lhs]
+                and has_description[rhs]
+            ):
+                similar_pairs[(lhs, rhs)] = (description_similarity, False)
+
+    return similar_pairs
+
+
+def collect_similar_pairs(batches: Iterable[SimilarPairs]) -> SimilarPairDict:
+    similar_pairs: SimilarPairDict = {}
+    for [lhs_indices, rhs_indices, similarities, via_title] in batches:
+        for [lhs, rhs, similarity, title_match] in zip(
+            lhs_indices.tolist(),
+            rhs_indices.tolist(),
+            similarities.tolist(),
+            via_title.tolist(),
+        ):
+            similar_pairs[(lhs, rhs)] = (similarity, title_match)
+
+    return similar_pairs
+
+
+def assert_same_pairs(actual: SimilarPairDict, expected: SimilarPairDict):
+    assert actual.keys() == expected.keys()
+    for [pair, (similarity, title_match)] in expected.items():
+        assert actual[pair][0] == np.float32(similarity) or np.isclose(
+            actual[pair][0], similarity, rtol=1e-6
+        )
+        assert actual[pair][1] == title_match
+
+
+def build_articles() -> List[ArticleRow]:
+    """
+    Returns the corpus as articles with ids starting at 1. Every third article has no
+    description and the sources alternate.
+    """
+
+    return [
+        ArticleRow(
+            article + 1,
+            " ".join(title),
+            None if article % 3 == 2 else " ".join(description),
+            Language.Dutch if article in DUTCH_ARTICLES else Language.English,
+            article % 2,
+            None,
+        )
+        for [article, (title, description)] in enumerate(zip(TITLES, DESCRIPTIONS))
+    ]
+
+
+class FakeBatch:
+    def __init__(self, client: "FakePrisma"):
+        self.client = client
+
+    async def __aenter__(self) -> "FakeBatch":
+        return self
+
+    async def __aexit__(self, *_: Any):
+        self.client.transactions += 1
+
+    def execute_raw(self, query: str, *arguments: Any):
+        self.client.execute(query, list(arguments))
+
+
+class FakePrisma:
+    """
+    Stand-in for the Prisma client that keeps the `SimilarArticles` rows and the
+    clusters of the articles in memory and executes the statements of the checker.
+    """
+
+    def __init__(self, rows: Optional[Dict[Tuple[int, int], float]] = None):
+        self.rows = dict(rows or {})
+        # Article id -> cluster id and whether it is the latest in the cluster
+        self.clusters: Dict[int, Tuple[int, bool]] = {}
+        self.transactions = 0
+        self.written: List[Tuple[int, int]] = []
+        self.deleted: List[Tuple[int, int]] = []
+
+    def execute(self, query: str, arguments: List[Any]):
+        if "INSERT INTO" in query:
+            for offset in range(0, len(arguments), 3):
+                [id1, id2, similarity] = arguments[offset : offset + 3]
+                self.rows[(id1, id2)] = similarity
+                self.written.append((id1, id2))
+        elif "DELETE FROM" in query:
+            for offset in range(0, len(arguments), 2):
+                [id1, id2] = arguments[offset : offset + 2]
+                self.rows.pop((id1, id2), None)
+                self.deleted.append((id1, id2))
+        elif "UPDATE" in query:
+            for offset in range(0, len(arguments), 3):
+                [article_id, cluster_id, latest] = arguments[offset : offset + 3]
+                self.clusters[article_id] = (cluster_id, latest)
+
+    def batch_(self) -> FakeBatch:
+        return FakeBatch(self)
+
+    async def execute_raw(self, query: str, *arguments: Any) -> int:
+        self.execute(query, list(arguments))
+        self.transactions += 1
+        return 0
+
+    async def query_raw(self, query: str, *arguments: Any) -> List[Any]:
+        if '"SimilarArticles"' not in query:
+            return []
+
+        # Page of the similar pairs after the pair, up to the limit
+        [id1, id2, limit] = arguments
+        return [
+            {"id1": lhs, "id2": rhs, "similarity": self.rows[(lhs, rhs)]}
+            for [lhs, rhs] in sorted(self.rows)
+            if lhs < rhs and (lhs, rhs) > (id1, id2)
+        ][:limit]
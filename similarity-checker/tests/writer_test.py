@@ -0,0 +1,101 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import main
+from store import Corpus
+from checkpoint import NO_UNIT
+from writer import ExistingPairs, SimilarArticlesWriter
+
+from .utils import FakePrisma, build_articles
+
+
+def build_writer(client: FakePrisma) -> SimilarArticlesWriter:
+    existing = ExistingPairs(
+        np.array([1, 3, 1, 2, 6], dtype=np.int64),
+        np.array([2, 4, 5, 3, 1], dtype=np.int64),
+        np.array([0.8, 0.7, 0.9, 0.75, 0.85], dtype=np.float64),
+    )
+
+    return SimilarArticlesWriter(
+        client, 1000, 60.0, existing, epsilon=1e-4  # type: ignore
+    )
+
+
+def test_rerun_writes_nothing(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(main, "SIMILARITY_CHECKPOINT_ROWS", 2)
+
+    client = FakePrisma()
+    asyncio.run(main.calc_article_similarity(build_articles(), client))  # type: ignore
+    assert len(client.rows) > 0
+
+    rows = dict(client.rows)
+    client.written.clear()
+
+    # Without a stored corpus every article is scored again
+    asyncio.run(
+        main.calc_article_similarity(build_articles(), client, Corpus())  # type: ignore
+    )
+
+    assert client.rows == rows
+    assert client.written == []
+    assert client.deleted == []
+
+
+def test_changed_similarities_are_written():
+    client = FakePrisma()
+    writer = build_writer(client)
+
+    async def write():
+        await writer.add(2, 1, 0.8 + 1e-5)
+        await writer.add(3, 4, 0.7 + 1e-3)
+        await writer.add(7, 8, 0.9)
+        await writer.close()
+
+    asyncio.run(write())
+
+    assert sorted(client.written) == [(3, 4), (7, 8)]
+    assert writer.pairs_unchanged == 1
+    assert client.rows == {(3, 4): 0.7 + 1e-3, (7, 8): 0.9}
+
+
+def test_pairs_are_stored_once():
+    client = FakePrisma()
+    writer = build_writer(client)
+
+    async def write():
+        await writer.add(9, 7, 0.8)
+        await writer.add(7, 9, 0.85)
+        await writer.add(4, 3, 0.9)
+        await writer.close()
+
+    asyncio.run(write())
+
+    # The pair found from both articles is written once with the last similarity
+    assert sorted(client.written) == [(3, 4), (7, 9)]
+    assert client.rows == {(3, 4): 0.9, (7, 9): 0.85}
+    assert writer.existing.seen[writer.existing.find(4, 3)]
+
+    # Stored pairs are keyed on `id1 < id2`, whatever order they were given in
+    assert writer.existing.find(1, 6) == writer.existing.find(6, 1) >= 0
+
+
+def test_missing_pairs_of_the_unit_are_deleted():
+    client = FakePrisma()
+    writer = build_writer(client)
+
+    # Article 5 is not scored and article 6 was removed from the database
+    article_ids = np.array([1, 2, 3, 4, 5], dtype=np.int64)
+    article_units = np.array([0, 0, 1, 1, NO_UNIT], dtype=np.int64)
+
+    async def delete():
+        await writer.add(1, 2, 0.8)
+        await writer.delete_missing(article_ids, article_units, 0)
+        await writer.close()
+
+    asyncio.run(delete())
+
+    # (1, 2) was found again, (3, 4) is owned by unit 1 and (2, 3) by unit 0
+    assert sorted(client.deleted) == [(1, 5), (2, 3)]
+    assert writer.rows_deleted == 2